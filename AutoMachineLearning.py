@@ -1,19 +1,36 @@
 import os
+import copy
 import joblib
 import numpy as np
 import itertools
+import torch
 import pandas as pd
 import math
 from collections import defaultdict
 from abc import ABC, abstractmethod
 from sklearn.metrics import mean_squared_error,f1_score
 from sklearn.base import BaseEstimator
-from utlis.preprocessing import TimeSeriesPreprocessor
+from utlis.preprocessing import TimeSeriesPreprocessor, TimeSeriesWindows
 from sklearn.model_selection import KFold
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from model.models import param_grid
+from model.registry import ModelRegistry
 # Model Interface
 
 
+def stack_groups(data, label=None):
+    """Stack per-group windows into single (n_windows, look_back, n_features) / (n_windows, n_out) arrays.
+    Accepts a TimeSeriesWindows (already contiguous, no copy) or the legacy per-group dicts."""
+    if isinstance(data, TimeSeriesWindows):
+        return data.data, data.label if label is None else label
+    stacked_data = np.concatenate([np.asarray(data[key], dtype=np.float32) for key in data.keys()])
+    stacked_label = None
+    if label is not None:
+        stacked_label = np.concatenate([np.asarray(label[key]).reshape(len(label[key]), -1) for key in data.keys()])
+    return stacked_data, stacked_label
+
+
 
 # Tuner Interface: Abstract base class for tuning models
 class Tuner(ABC):
@@ -29,12 +46,25 @@ class Tuner(ABC):
         Use case: Useful in validating the model's performance to avoid overfitting on various datasets."""
         pass
 
+def fit_fold(model_class, params, X_train, y_train, X_test, y_test, seed=None):
+    """Train model_class with params on one fold and return its validation loss.
+    Seeding right before set_params makes the cell reproducible whichever process runs it."""
+    if seed is not None:
+        torch.manual_seed(seed)
+        np.random.seed(seed)
+    model_class.set_params(**params)
+    model_class.train(X_train, y_train)
+    return model_class.evaluate(X_test, y_test)
+
+
 # GridSearchTuner: Implements parameter tuning by grid search method
 class GridSearchTuner(Tuner):
-    def __init__(self, num_folds=5):
+    def __init__(self, num_folds=5, random_state=None):
         """Initialize the tuner with the number of folds for cross-validation.
+        random_state fixes the fold shuffling and the per-cell torch seeds, which makes runs repeatable.
         Use case: Typically used in scenarios where robust model evaluation is needed across multiple subsets of data."""
         self.num_folds = num_folds
+        self.random_state = random_state
         self.best_params = None
         self.best_score = float('inf')
 
@@ -42,36 +72,191 @@ class GridSearchTuner(Tuner):
         """Perform grid search optimization over a parameter grid for the given model.
         Use case: Ideal for optimizing models in settings where multiple hyperparameters need systematic evaluation."""
         keys, values = zip(*param_grid.items())
-        for v in itertools.product(*values):
-            params = dict(zip(keys, v))
-            avg_loss = self.cross_validation(model_class, params, X, y)
+        candidates = [dict(zip(keys, v)) for v in itertools.product(*values)]
+        scores = self.score_candidates(model_class, candidates, X, y)
+        for params, avg_loss in zip(candidates, scores):
             if avg_loss < self.best_score:
                 self.best_score = avg_loss
                 self.best_params = params
             print(f"Testing parameters:{params} loss:{avg_loss}")
         print("Best parameters:", self.best_params)
         print("Best score:", self.best_score)
+        if self.random_state is not None:
+            torch.manual_seed(self.random_state)
         model_class.set_params(**self.best_params)
         model_class.train(X, y)
         return model_class, self.best_score
 
-    def cross_validation(self, model_class, params, X, y):
+    def score_candidates(self, model_class, candidates, X, y):
+        """Return the average cross-validation loss of every candidate, in candidate order."""
+        splits = self.splits(X)
+        return [self.cross_validation(model_class, params, X, y, index, splits)
+                for index, params in enumerate(candidates)]
+
+    def splits(self, X):
+        kfold = KFold(n_splits=self.num_folds, shuffle=True, random_state=self.random_state)
+        return list(kfold.split(X))
+
+    def cell_seed(self, candidate_index, fold):
+        if self.random_state is None:
+            return None
+        return self.random_state + candidate_index * self.num_folds + fold
+
+    def cross_validation(self, model_class, params, X, y, candidate_index=0, splits=None):
         """Perform k-fold cross-validation and return the average loss across all folds.
         Use case: Essential for assessing the generalization capability of models in academic research or industrial applications."""
-        kfold = KFold(n_splits=self.num_folds, shuffle=True)
+        if splits is None:
+            splits = self.splits(X)
         losses = []
-        for train_index, test_index in kfold.split(X):
-            X_train, X_test = X[train_index], X[test_index]
-            y_train, y_test = y[train_index], y[test_index]
-            model_class.set_params(**params)
-            model_class.train(X_train, y_train)
-            loss = model_class.evaluate(X_test, y_test)
+        for fold, (train_index, test_index) in enumerate(splits):
+            loss = fit_fold(model_class, params, X[train_index], y[train_index], X[test_index], y[test_index],
+                            self.cell_seed(candidate_index, fold))
             losses.append(loss)
         return sum(losses) / len(losses)
     def reset(self):
         self.best_params = None
         self.best_score = float('inf')
 
+
+# Training data shared by every task of a worker process, set once by the pool initializer
+_worker_data = {}
+
+
+def _init_worker(X, y, torch_threads):
+    _worker_data['X'] = X
+    _worker_data['y'] = y
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+
+
+def _run_cell(model_class, params, train_index, test_index, seed):
+    X, y = _worker_data['X'], _worker_data['y']
+    return fit_fold(model_class, params, X[train_index], y[train_index], X[test_index], y[test_index], seed)
+
+
+# ParallelGridSearchTuner: Same search as GridSearchTuner, with every (params, fold) cell trained in a process pool
+class ParallelGridSearchTuner(GridSearchTuner):
+    def __init__(self, num_folds=5, random_state=None, n_workers=None, torch_threads=1, mp_context='spawn'):
+        """n_workers defaults to the number of CPUs, torch_threads limits the intra-op threads of each worker
+        so the workers do not oversubscribe the cores. 'spawn' keeps CUDA usable inside the workers.
+        With the same random_state the best parameters match the ones found by GridSearchTuner.
+        Use case: Grid search on multi-core CPU boxes, where a single training run leaves most cores idle."""
+        super().__init__(num_folds=num_folds, random_state=random_state)
+        self.n_workers = n_workers or os.cpu_count()
+        self.torch_threads = torch_threads
+        self.mp_context = mp_context
+
+    def score_candidates(self, model_class, candidates, X, y):
+        splits = self.splits(X)
+        # every cell gets its own untrained copy of the model, the trained network is not shipped to workers
+        template = copy.copy(model_class)
+        template.model = None
+        template.optimizer = None
+        with ProcessPoolExecutor(max_workers=self.n_workers, mp_context=get_context(self.mp_context),
+                                 initializer=_init_worker, initargs=(X, y, self.torch_threads)) as executor:
+            futures = [[executor.submit(_run_cell, template, params, train_index, test_index,
+                                        self.cell_seed(index, fold))
+                        for fold, (train_index, test_index) in enumerate(splits)]
+                       for index, params in enumerate(candidates)]
+            # gather in grid order so ties resolve exactly like the sequential search
+            losses = [[future.result() for future in row] for row in futures]
+        return [sum(row) / len(row) for row in losses]
+
+# SuccessiveHalvingTuner: Hyperband-style search that stops training losing configurations early
+class SuccessiveHalvingTuner(Tuner):
+    def __init__(self, num_folds=3, min_epochs=2, eta=3, max_epochs=100, random_state=None):
+        """Every configuration starts with min_epochs of training on each fold, then only the best 1/eta
+        keep going with an eta times larger epoch budget, until one is left or all reached their 'epochs'.
+        Models are trained incrementally, survivors continue from their weights instead of restarting.
+        max_epochs is the budget cap for grids that do not list 'epochs'. eta must be above 1 and min_epochs at
+        least 1, otherwise the budget would never grow and the search never end.
+        Use case: Large grids where most configurations are clearly worse after a few epochs."""
+        if not eta > 1:
+            raise ValueError(f'eta must be greater than 1, got {eta!r}')
+        if not min_epochs >= 1:
+            raise ValueError(f'min_epochs must be at least 1, got {min_epochs!r}')
+        self.num_folds = num_folds
+        self.min_epochs = min_epochs
+        self.eta = eta
+        self.max_epochs = max_epochs
+        self.random_state = random_state
+        self.best_params = None
+        self.best_score = float('inf')
+
+    def optimize(self, model_class, param_grid, X, y):
+        """Run successive halving over the grid, then retrain the winner on all data.
+        Use case: Cutting tuning time on CPU-only machines without shrinking the grid."""
+        keys, values = zip(*param_grid.items())
+        candidates = [dict(zip(keys, v)) for v in itertools.product(*values)]
+        kfold = KFold(n_splits=self.num_folds, shuffle=True, random_state=self.random_state)
+        splits = list(kfold.split(X))
+
+        template = copy.copy(model_class)
+        template.model = None
+        template.optimizer = None
+        models = {}
+        for index, params in enumerate(candidates):
+            models[index] = []
+            for fold in range(len(splits)):
+                if self.random_state is not None:
+                    torch.manual_seed(self.random_state + index * self.num_folds + fold)
+                model = copy.copy(template)
+                model.set_params(**params)
+                models[index].append(model)
+        trained = {index: 0 for index in models}
+        max_epochs = {index: params.get('epochs', self.max_epochs) for index, params in enumerate(candidates)}
+
+        survivors = list(models)
+        budget = self.min_epochs
+        while True:
+            scores = {}
+            for index in survivors:
+                extra = min(budget, max_epochs[index]) - trained[index]
+                losses = []
+                for model, (train_index, test_index) in zip(models[index], splits):
+                    if extra > 0:
+                        model.train(X[train_index], y[train_index], epochs=extra)
+                    losses.append(model.evaluate(X[test_index], y[test_index]))
+                trained[index] += max(extra, 0)
+                scores[index] = sum(losses) / len(losses)
+                print(f"Testing parameters:{candidates[index]} epochs:{trained[index]} loss:{scores[index]}")
+            # stable sort keeps grid order on ties
+            survivors = sorted(survivors, key=lambda index: scores[index])
+            if len(survivors) == 1 or all(trained[index] >= max_epochs[index] for index in survivors):
+                break
+            survivors = survivors[:max(1, math.ceil(len(survivors) / self.eta))]
+            for index in list(models):
+                if index not in survivors:
+                    del models[index]
+            # rounded up: a fractional eta still grows the budget by whole epochs
+            budget = math.ceil(budget * self.eta)
+
+        self.best_params = candidates[survivors[0]]
+        self.best_score = scores[survivors[0]]
+        print("Best parameters:", self.best_params)
+        print("Best score:", self.best_score)
+        if self.random_state is not None:
+            torch.manual_seed(self.random_state)
+        model_class.set_params(**self.best_params)
+        model_class.train(X, y)
+        return model_class, self.best_score
+
+    def cross_validation(self, model_class, params, X, y):
+        """Full-budget k-fold cross-validation of a single configuration.
+        Use case: Re-checking the winner of the halving rounds with a complete training run."""
+        kfold = KFold(n_splits=self.num_folds, shuffle=True, random_state=self.random_state)
+        losses = [fit_fold(model_class, params, X[train_index], y[train_index], X[test_index], y[test_index])
+                  for train_index, test_index in kfold.split(X)]
+        return sum(losses) / len(losses)
+
+    def reset(self):
+        self.best_params = None
+        self.best_score = float('inf')
+
 # Base AutoML Class: Abstract base class for automated machine learning workflows
 class AutoMLBase(ABC):
     def __init__(self,config):
@@ -88,6 +273,10 @@ class AutoMLBase(ABC):
         self.best_score = {}
         self.train_result = {}
         self.test_result = {}
+        # best_model maps each model name to its registry key
+        self.registry = ModelRegistry(getattr(config, 'registry_root', 'static/registry'))
+        # model name -> registry key whose network the model currently holds, so it is only rebuilt on change
+        self.loaded = {}
     def add_model(self, name, model):
         """Add a model to the AutoML system.
         Use case: Allows dynamic addition of models to the system for experimentation or deployment."""
@@ -115,37 +304,37 @@ class TimeSeriesAutoML(AutoMLBase):
     def run_experiments(self,train_data,train_label):
         """
         Run experiments on time series data using the specified models and tuners.
-        Save the best model path for each kind of model
+        Save the best model of each kind in the registry and keep its key
         Use case: Ideal for applications in financial markets, weather forecasting, and demand forecasting
         where time series analysis is crucial."""
-        data = []
-        label = []
-        for key in train_data.keys():
-            data.extend(np.array(train_data[key]))
-            label.extend(train_label[key])
-        train_data = np.array(data)
-        train_label = np.vstack(label)
+        train_data, train_label = stack_groups(train_data, train_label)
         print(train_label.shape)
         self.train_data = train_data
         self.train_label = train_label
+        data_fingerprint = ModelRegistry.data_fingerprint(self.train_data, self.train_label)
         for name, model in self.models.items():
             best_score = float('inf')
             param = param_grid[name]
             for name_tuner, tuner in self.tuners.items():
-                if os.path.exists(f'static/checkpoint/{self.config.task}_{name}_{name_tuner}_best.pth'):
-                    print(f'model exists, loading the best model for from checkpoint')
-                    model.load(f'static/checkpoint/{self.config.task}_{name}_{name_tuner}_best.pth')
+                key = ModelRegistry.key(self.config.task, name, name_tuner, ModelRegistry.param_hash(param),
+                                        data_fingerprint)
+                if self.registry.exists(key):
+                    print(f'model exists, loading the best model for from registry')
+                    self.registry.load(key, model)
+                    self.loaded[name] = key
                     train_loss = model.evaluate(self.train_data, self.train_label)
                     self.best_score[name] = train_loss
-                    self.best_model[name] = f'static/checkpoint/{self.config.task}_{name}_{name_tuner}_best.pth'
+                    self.best_model[name] = key
                 else:
                     model_class, score = tuner.optimize(model, param, self.train_data, self.train_label)
+                    # tuning rebuilt and trained the network, it no longer holds any registry entry
+                    self.loaded.pop(name, None)
+                    self.registry.save(key, model_class, tuner.best_params, score=float(score))
                     tuner.reset()
-                    model_class.save(f'static/checkpoint/{self.config.task}_{name}_{name_tuner}_best.pth')
                     if score < best_score:
                         best_score = score
                         self.best_score[name] = score
-                        self.best_model[name] = f'static/checkpoint/{self.config.task}_{name}_{name_tuner}_best.pth'
+                        self.best_model[name] = key
 
                 train_prediction = model.predict(self.train_data)
                 self.train_result[name] = {
@@ -157,23 +346,14 @@ class TimeSeriesAutoML(AutoMLBase):
         """Evaluation on train data and test data to give a result of the model,
         can be the best model or the best model in each kind of model.
         Use case: Provides a method to assess the effectiveness of models in making accurate predictions."""
-        data = []
-        label = []
-
-        for key in test_data.keys():
-            data.extend(np.array(test_data[key]))
-            if test_label is not None:
-                label.extend(np.array(test_label[key]))
-
-        test_data = np.array(data)
+        test_data, test_label = stack_groups(test_data, test_label)
         self.test_data = test_data
 
         if test_label is not None:
-            test_label = np.array(label)
             self.test_label = test_label
 
         for name, model in self.models.items():
-            model.load(self.best_model[name])
+            self.load_best(name)
             test_prediction = model.predict(self.test_data)
 
             if test_label is not None:
@@ -186,4 +366,22 @@ class TimeSeriesAutoML(AutoMLBase):
                 'test_prediction': test_prediction
             }
 
-        return self.test_result
\ No newline at end of file
+        return self.test_result
+
+    def forecast(self, windows):
+        """Predict an already stacked (n, look_back, n_features) batch with the best model of each kind.
+        Each best model is built once, repeated calls only run the forward pass.
+        Use case: Streaming or day-by-day backtesting where a few new windows are scored per step."""
+        result = {}
+        for name, model in self.models.items():
+            self.load_best(name)
+            result[name] = model.predict(windows)
+        return result
+
+    def load_best(self, name):
+        """Load the best network of a kind into its model, unless the model already holds that registry key."""
+        key = self.best_model[name]
+        if self.loaded.get(name) != key:
+            self.registry.load(key, self.models[name])
+            self.loaded[name] = key
+        return self.models[name]
@@ -0,0 +1,120 @@
+"""
+ValueSequence encoding cost: create_serialized_value_sequence (as used by the publishers, including its
+logging, sent to /dev/null here) against the columnar ValueSequenceEncoder.
+With --stock, the payloads of a stock CSV (warehouse_name, date, storage: one payload per date, as the
+publishers send it) are encoded with every value as dblVal and with the storage typed as Integer (intVal).
+Run from the directory containing the mqttauto checkout:
+
+    python -m mqttauto.benchmarks.bench_encoder --tags 58 1000 100000
+    python -m mqttauto.benchmarks.bench_encoder --tags --stock mqttauto/train_data.csv
+
+Prints one JSON line per tag count, and one for the stock data.
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from mqttauto.mqtt import metatag_pb2
+from mqttauto.mqtt.realdatatransfer import create_serialized_value_sequence, ValueSequenceEncoder
+
+
+def timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(n_tags, repeat):
+    rng = np.random.default_rng(0)
+    names = [f'SC{i:05d}' for i in range(n_tags)]
+    values = rng.integers(0, 50000, n_tags).astype(np.float64)
+    qualities = np.ones(n_tags, dtype=np.int64)
+    timestamp = 1717545600000
+    rows = [{'name': name, 'dblVal': float(value), 'quality': 1, 'timeStamp': timestamp}
+            for name, value in zip(names, values)]
+    encoder = ValueSequenceEncoder()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        legacy_time, legacy = timed(lambda: create_serialized_value_sequence(rows), repeat)
+    # first call fills the name cache, the steady state of a publisher is what is timed
+    encoder.encode(names, values, qualities, timestamp)
+    columnar_time, columnar = timed(lambda: encoder.encode(names, values, qualities, timestamp), repeat)
+    assert legacy == columnar
+    return {
+        'tags': n_tags,
+        'payload_bytes': len(columnar),
+        'legacy_ms': legacy_time * 1e3,
+        'columnar_ms': columnar_time * 1e3,
+        'speedup': legacy_time / columnar_time,
+        'columnar_tags_per_sec': n_tags / columnar_time,
+    }
+
+
+def bench_stock(path, repeat):
+    frame = pd.read_csv(path)
+    timestamp = 1717545600000
+    payloads = []
+    for date, group in frame.groupby('date', sort=True):
+        names = group['warehouse_name'].tolist() + ['date']
+        values = group['storage'].tolist() + [date]
+        payloads.append((names, values))
+    types = {name: metatag_pb2.Integer for name in frame['warehouse_name'].unique()}
+    types['date'] = metatag_pb2.String
+    double_rows = [[{'name': name, 'dblVal': value, 'quality': 8, 'timeStamp': timestamp}
+                    for name, value in zip(names[:-1], values[:-1])]
+                   + [{'name': 'date', 'strVal': values[-1], 'quality': 8, 'timeStamp': timestamp}]
+                   for names, values in payloads]
+    encoder = ValueSequenceEncoder()
+    typed_lists = [[types[name] for name in names] for names, _ in payloads]
+
+    def legacy(typed):
+        return [create_serialized_value_sequence(rows, types if typed else None) for rows in double_rows]
+
+    def columnar(typed):
+        return [encoder.encode(names, values, 8, timestamp, typed_list if typed else None)
+                for (names, values), typed_list in zip(payloads, typed_lists)]
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        legacy_double_time, legacy_double = timed(lambda: legacy(False), repeat)
+        legacy_typed_time, legacy_typed = timed(lambda: legacy(True), repeat)
+    columnar(False)
+    columnar_double_time, columnar_double = timed(lambda: columnar(False), repeat)
+    columnar_typed_time, columnar_typed = timed(lambda: columnar(True), repeat)
+    assert legacy_double == columnar_double and legacy_typed == columnar_typed
+    double_bytes = sum(len(payload) for payload in columnar_double)
+    typed_bytes = sum(len(payload) for payload in columnar_typed)
+    n = len(payloads)
+    return {
+        'stock': path,
+        'payloads': n,
+        'values': int(len(frame) + n),
+        'double_payload_bytes': double_bytes / n,
+        'typed_payload_bytes': typed_bytes / n,
+        'size_ratio': typed_bytes / double_bytes,
+        'legacy_double_ms': legacy_double_time / n * 1e3,
+        'legacy_typed_ms': legacy_typed_time / n * 1e3,
+        'columnar_double_ms': columnar_double_time / n * 1e3,
+        'columnar_typed_ms': columnar_typed_time / n * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tags', type=int, nargs='*', default=[58, 1000, 100000])
+    parser.add_argument('--stock', default=None, help='stock CSV to compare dblVal and typed payloads on')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    for n_tags in args.tags:
+        print(json.dumps(bench(n_tags, args.repeat)))
+    if args.stock:
+        print(json.dumps(bench_stock(args.stock, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Subscriber ingest of JSON against protobuf ValueSequence payloads: getdata.Subscriber (queue, batched decode)
+applying into a FrameStore, fed at a fixed message rate. Each message carries --tags materials, as a JSON list
+of {'material', 'quantity'} or as a ValueSequence with a 'date' tag, like the publishers send.
+The payloads are published to a local broker and go through a subscribing paho client: a MiniBroker
+(benchmarks/mini_broker.py) started in-process by default, or the broker given with --broker (e.g. a local
+mosquitto). --in-process hands them to Subscriber.on_message directly, leaving the network out.
+Run from the directory containing the mqttauto checkout:
+
+    python -m mqttauto.benchmarks.bench_ingest --rate 10000 --messages 50000
+    python -m mqttauto.benchmarks.bench_ingest --broker 127.0.0.1:1883
+    python -m mqttauto.benchmarks.bench_ingest --in-process
+
+Prints one JSON line per payload format.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+import paho.mqtt.client as mqtt
+from mqttauto.benchmarks.mini_broker import start_broker_in_thread
+from mqttauto.mqtt.getdata import FrameStore, Subscriber
+from mqttauto.mqtt.realdatatransfer import encode_value_sequence
+
+DATE = '6/5/2024'
+TOPIC = 'bench/ingest/stock'
+
+
+class Message:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+def make_payloads(fmt, materials, n_messages, seed=0):
+    rng = np.random.default_rng(seed)
+    quantities = rng.integers(0, 50000, (n_messages, len(materials))).tolist()
+    if fmt == 'json':
+        return [json.dumps([{'material': m, 'quantity': q} for m, q in zip(materials, row)]).encode('utf-8')
+                for row in quantities]
+    names = materials + ['date']
+    return [encode_value_sequence(names, row + [DATE], 8) for row in quantities]
+
+
+def paced(payloads, rate, send):
+    start = time.perf_counter()
+    for i, payload in enumerate(payloads):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        send(payload)
+    return time.perf_counter() - start
+
+
+def wait_processed(subscriber, n, timeout):
+    deadline = time.perf_counter() + timeout
+    while subscriber.processed < n and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    return time.perf_counter()
+
+
+def bench(fmt, args, path):
+    materials = [f'M{i:04d}' for i in range(args.tags)]
+    pd.DataFrame({'warehouse_name': materials, 'date': DATE, 'storage': 0}).to_csv(path, index=False)
+    payloads = make_payloads(fmt, materials, args.messages)
+    store = FrameStore(path)
+    store.start()
+    subscriber = Subscriber(store)
+    subscriber.start()
+    clients = []
+    if not args.in_process:
+        host, port = args.broker.rsplit(':', 1)
+        receiver = mqtt.Client(f'bench-ingest-sub-{fmt}')
+        receiver.on_message = subscriber.on_message
+        subscribed = threading.Event()
+        receiver.on_subscribe = lambda *a: subscribed.set()
+        receiver.connect(host, int(port))
+        receiver.subscribe(TOPIC, qos=0)
+        receiver.loop_start()
+        subscribed.wait(10)
+        sender = mqtt.Client(f'bench-ingest-pub-{fmt}')
+        sender.max_queued_messages_set(0)
+        sender.connect(host, int(port))
+        sender.loop_start()
+        clients = [receiver, sender]
+        send = lambda payload: sender.publish(TOPIC, payload, qos=0)
+    else:
+        send = lambda payload: subscriber.on_message(None, None, Message(payload))
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    send_seconds = paced(payloads, args.rate, send)
+    done = wait_processed(subscriber, len(payloads), args.timeout)
+    cpu = time.process_time() - cpu
+    for client in clients:
+        client.loop_stop()
+        client.disconnect()
+    subscriber.close()
+    store.close()
+    assert subscriber.failed == 0
+    return {
+        'format': fmt,
+        'transport': 'in-process' if args.in_process else args.transport,
+        'messages': len(payloads),
+        'tags_per_message': args.tags,
+        'payload_bytes': int(np.mean([len(payload) for payload in payloads])),
+        'target_rate': args.rate,
+        'send_rate': len(payloads) / send_seconds,
+        'processed': subscriber.processed,
+        'ingest_rate': subscriber.processed / (done - start),
+        'drain_ms': (done - start - send_seconds) * 1e3,
+        'cpu_us_per_message': cpu / max(subscriber.processed, 1) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=10000)
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--tags', type=int, default=57)
+    parser.add_argument('--broker', default=None, help='host:port of an MQTT broker, default an in-process one')
+    parser.add_argument('--in-process', action='store_true', help='call Subscriber.on_message without a broker')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+    args.transport = 'broker' if args.broker else 'mini_broker'
+    if args.broker is None and not args.in_process:
+        _, port, _ = start_broker_in_thread()
+        args.broker = f'127.0.0.1:{port}'
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in ('json', 'protobuf'):
+            print(json.dumps(bench(fmt, args, os.path.join(directory, f'{fmt}.csv'))))
+
+
+if __name__ == '__main__':
+    main()
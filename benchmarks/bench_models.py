@@ -0,0 +1,87 @@
+"""
+Train / predict throughput of the forecasting models on a given device.
+Run from the repository root:
+
+    python -m benchmarks.bench_models --device cpu --threads 4 --rows 20000
+
+Prints one JSON line per model with rows/sec, so runs can be compared across machines and commits.
+"""
+import argparse
+import json
+import time
+import numpy as np
+import torch
+from model.models import LSTMModel, GRUModel, BaseTCNModel, FreTS, configure_threads
+
+# small, fixed configurations so the numbers measure execution speed rather than model size
+BENCH_PARAMS = {
+    'LSTM': {'hidden_dim': 50, 'num_layers': 2, 'lr': 0.01, 'batch_size': 256, 'epochs': 1},
+    'GRU': {'hidden_dim': 50, 'num_layers': 1, 'lr': 0.01, 'batch_size': 256, 'epochs': 1},
+    'TCN': {'kernel_size': 5, 'num_channels': [32, 64, 128], 'lr': 0.0001, 'batch_size': 256, 'epochs': 1},
+    'FreTS': {'channel_independence': '1', 'hidden_size': 256, 'embed_size': 128, 'lr': 0.001,
+              'batch_size': 256, 'epochs': 1},
+}
+
+
+def build_model(name, look_back, num_features, output_dim, device):
+    if name == 'LSTM':
+        return LSTMModel(num_features, output_dim, device)
+    if name == 'GRU':
+        return GRUModel(num_features, output_dim, device)
+    if name == 'TCN':
+        return BaseTCNModel(num_features, output_dim, device)
+    return FreTS(look_back, num_features, output_dim, device)
+
+
+def bench(name, X, y, device, repeat):
+    model = build_model(name, X.shape[1], X.shape[2], y.shape[1], device)
+    model.set_params(**BENCH_PARAMS[name])
+    # warm-up so lazy initialisation is not timed
+    model.train(X[:512], y[:512])
+    model.predict(X[:512])
+
+    start = time.perf_counter()
+    model.train(X, y)
+    train_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model.predict(X)
+    predict_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    model.evaluate(X, y)
+    evaluate_time = time.perf_counter() - start
+    return {
+        'model': name,
+        'device': str(model.device),
+        'threads': torch.get_num_threads(),
+        'rows': len(X),
+        'train_rows_per_sec': len(X) / train_time,
+        'predict_rows_per_sec': len(X) / predict_time,
+        'evaluate_rows_per_sec': len(X) / evaluate_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--device', default=None, help='cpu, cuda, ... (default: automatic)')
+    parser.add_argument('--threads', type=int, default=None, help='intra-op threads (default: all cores)')
+    parser.add_argument('--interop-threads', type=int, default=None)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--look-back', type=int, default=3)
+    parser.add_argument('--features', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--models', nargs='+', default=list(BENCH_PARAMS))
+    args = parser.parse_args()
+
+    configure_threads(args.threads, args.interop_threads)
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((args.rows, args.look_back, args.features), dtype=np.float32)
+    y = rng.standard_normal((args.rows, 1), dtype=np.float32)
+    for name in args.models:
+        print(json.dumps(bench(name, X, y, args.device, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+End-to-end MQTT throughput and latency: rows are serialized by the publishers' path
+(create_serialized_value_sequence, its logging sent to /dev/null, or the columnar encoder), published by a
+paho client at a fixed rate, and received by getdata.Subscriber, which decodes them and applies them to a
+FrameStore. Latency is taken from publish() to the message being applied to the store, using a 'bench_seq'
+tag carried in every payload.
+By default a MiniBroker (benchmarks/mini_broker.py) is started in-process; use --broker for a real one,
+e.g. a local mosquitto. Run from the directory containing the mqttauto checkout:
+
+    python -m mqttauto.benchmarks.bench_mqtt --tags 57 1000 --rate 200 1000 --messages 5000
+    python -m mqttauto.benchmarks.bench_mqtt --broker 127.0.0.1:1883 --qos 1 --output results.jsonl
+
+Prints one JSON line per (serializer, tag count, rate); --output also appends them to a file, so runs
+can be compared over time.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+import paho.mqtt.client as mqtt
+from mqttauto.benchmarks.mini_broker import start_broker_in_thread
+from mqttauto.mqtt.clocksync import now_ms
+from mqttauto.mqtt.getdata import FrameStore, Subscriber
+from mqttauto.mqtt.publisher import serialize_rows
+from mqttauto.mqtt.realdatatransfer import create_serialized_value_sequence
+
+DATE = '6/5/2024'
+SEQUENCE_TAG = 'bench_seq'
+SERIALIZERS = {'create': create_serialized_value_sequence, 'columnar': serialize_rows}
+
+
+class TimedStore:
+    '''FrameStore stand-in for the Subscriber: stamps each message as it is applied, then passes it on.'''
+    def __init__(self, store, n_messages):
+        self.store = store
+        self.received_at = np.full(n_messages, np.nan)
+        self.received = 0
+
+    def update_many(self, batch):
+        now = time.perf_counter()
+        for _, names, values in batch:
+            self.received_at[int(values[names.index(SEQUENCE_TAG)])] = now
+        self.received += len(batch)
+        return self.store.update_many(batch)
+
+
+def make_rows(materials, n_messages, seed=0):
+    rng = np.random.default_rng(seed)
+    quantities = rng.integers(0, 50000, (n_messages, len(materials))).tolist()
+    # all stamped in the same millisecond, like a fast publisher: only repeated (stamp, value) pairs are dropped
+    timestamp = now_ms()
+    return [[{'name': m, 'dblVal': q, 'quality': 8, 'timeStamp': timestamp} for m, q in zip(materials, row)]
+            + [{'name': 'date', 'strVal': DATE, 'quality': 8, 'timeStamp': timestamp},
+               {'name': SEQUENCE_TAG, 'dblVal': i, 'quality': 8, 'timeStamp': timestamp}]
+            for i, row in enumerate(quantities)]
+
+
+def connect(client, host, port):
+    connected = threading.Event()
+    client.on_connect = lambda *a: connected.set()
+    client.connect(host, port)
+    client.loop_start()
+    if not connected.wait(10):
+        raise ConnectionError(f'no CONNACK from {host}:{port}')
+
+
+def bench(serializer, n_tags, rate, args, host, port, directory):
+    materials = [f'SC{i:05d}' for i in range(n_tags)]
+    path = os.path.join(directory, f'{serializer}-{n_tags}-{rate}.csv')
+    pd.DataFrame({'warehouse_name': materials, 'date': DATE, 'storage': 0}).to_csv(path, index=False)
+    topic = f'bench/mqtt/{serializer}/{n_tags}/{rate}'
+    all_rows = make_rows(materials, args.messages)
+    serialize = SERIALIZERS[serializer]
+
+    store = FrameStore(path)
+    store.start()
+    timed_store = TimedStore(store, args.messages)
+    subscriber = Subscriber(timed_store)
+    subscriber.start()
+    receiver = mqtt.Client(f'bench-mqtt-sub-{os.getpid()}')
+    subscribed = threading.Event()
+    receiver.on_subscribe = lambda *a: subscribed.set()
+    receiver.on_message = subscriber.on_message
+    connect(receiver, host, port)
+    receiver.subscribe(topic, qos=args.qos)
+    subscribed.wait(10)
+    sender = mqtt.Client(f'bench-mqtt-pub-{os.getpid()}')
+    sender.max_inflight_messages_set(args.window)
+    connect(sender, host, port)
+
+    sent_at = np.empty(args.messages)
+    sent_bytes = 0
+    cpu = time.process_time()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i, rows in enumerate(all_rows):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent_at[i] = time.perf_counter()
+            payload = serialize(rows)
+            sent_bytes += len(payload)
+            sender.publish(topic, payload, qos=args.qos)
+    send_seconds = time.perf_counter() - start
+
+    deadline = time.perf_counter() + args.timeout
+    while timed_store.received < args.messages and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    cpu = time.process_time() - cpu
+    for client in (sender, receiver):
+        client.disconnect()
+        client.loop_stop()
+    subscriber.close()
+    store.close()
+
+    received = ~np.isnan(timed_store.received_at)
+    latencies = (timed_store.received_at[received] - sent_at[received]) * 1e3
+    elapsed = np.nanmax(timed_store.received_at) - start if received.any() else send_seconds
+    payload_bytes = sent_bytes / args.messages
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'serializer': serializer,
+        'transport': args.broker or 'mini_broker',
+        'qos': args.qos,
+        'tags': n_tags,
+        'target_rate': rate,
+        'messages': args.messages,
+        'received': int(received.sum()),
+        'decode_failures': subscriber.failed,
+        'stale_values': subscriber.stale,
+        'payload_bytes': int(payload_bytes),
+        'send_msgs_per_sec': args.messages / send_seconds,
+        'msgs_per_sec': received.sum() / elapsed,
+        'bytes_per_sec': received.sum() * payload_bytes / elapsed,
+        'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'latency_max_ms': float(latencies.max()) if len(latencies) else None,
+        'cpu_ms_per_message': cpu / args.messages * 1e3,
+        'python': platform.python_version(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tags', type=int, nargs='+', default=[57, 1000])
+    parser.add_argument('--rate', type=float, nargs='+', default=[100, 1000], help='messages per second')
+    parser.add_argument('--messages', type=int, default=2000, help='messages per run')
+    parser.add_argument('--serializer', choices=sorted(SERIALIZERS), nargs='+', default=['create', 'columnar'])
+    parser.add_argument('--qos', type=int, choices=[0, 1], default=0)
+    parser.add_argument('--window', type=int, default=100, help='QoS 1 messages in flight')
+    parser.add_argument('--broker', default=None, help='host:port of an MQTT broker, default an in-process one')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for the last messages')
+    parser.add_argument('--output', default=None, help='also append the JSON lines to this file')
+    args = parser.parse_args()
+
+    if args.broker:
+        host, port = args.broker.rsplit(':', 1)
+        port = int(port)
+    else:
+        host = '127.0.0.1'
+        _, port, _ = start_broker_in_thread(host)
+    with tempfile.TemporaryDirectory() as directory:
+        for serializer in args.serializer:
+            for n_tags in args.tags:
+                for rate in args.rate:
+                    line = json.dumps(bench(serializer, n_tags, rate, args, host, port, directory))
+                    print(line)
+                    if args.output:
+                        with open(args.output, 'a') as file:
+                            file.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
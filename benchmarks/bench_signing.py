@@ -0,0 +1,81 @@
+"""
+Per-request signing cost: the original SignRequest signing (string concatenation, hmac.new keyed on every call)
+against the Signer used now, cold (cache miss: copy of the pre-keyed HMAC) and warm (cached signature).
+Run from the directory containing the mqttauto checkout:
+
+    python -m mqttauto.benchmarks.bench_signing --requests 100000
+
+Prints one JSON line per request shape.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from mqttauto.mqtt import akskg
+from mqttauto.mqtt.akskg import Signer
+
+CONTENT_TYPE = 'application/json;charset=utf-8'
+SHAPES = {
+    'post_current': ("POST", "/open-api/supos/oodm/v2/attribute/current", None),
+    'get_with_query': ("GET", "/open-api/supos/oodm/v2/attribute/history",
+                       {'startTime': '2023-11-08T00:00:00Z', 'endTime': '2023-11-09T00:00:00Z', 'pageSize': 500}),
+}
+
+
+def legacy_sign(method_name, uri, content_type, query):
+    # SignRequest.__build_sign_str / __sorted_query / __sign_header before the Signer
+    res = ''
+    if query is not None:
+        for i in sorted(query):
+            if isinstance(query[i], str):
+                res = res + i.lower() + '=' + query[i] + '&'
+            else:
+                res = res + i.lower() + '=' + str(query[i]) + '&'
+        res = res.rstrip('&')
+    sign_str = ''
+    sign_str = sign_str + method_name + "\n"
+    sign_str = sign_str + uri + "\n"
+    sign_str = sign_str + content_type + "\n"
+    sign_str = sign_str + res + "\n" + "\n"
+    signature = hmac.new(akskg.app_sk.encode('utf-8'), sign_str.encode('utf-8'), digestmod=hashlib.sha256).hexdigest()
+    return sign_str, "Sign " + akskg.app_ak + "-" + signature
+
+
+def per_request_us(function, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        function()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench(shape, n):
+    method_name, uri, query = SHAPES[shape]
+    signer = Signer()
+    assert signer.sign(method_name, uri, CONTENT_TYPE, query) == legacy_sign(method_name, uri, CONTENT_TYPE, query)
+
+    def cold():
+        signer._cache.clear()
+        signer.sign(method_name, uri, CONTENT_TYPE, query)
+
+    return {
+        'shape': shape,
+        'requests': n,
+        'legacy_us': per_request_us(lambda: legacy_sign(method_name, uri, CONTENT_TYPE, query), n),
+        'cold_us': per_request_us(cold, n),
+        'cached_us': per_request_us(lambda: signer.sign(method_name, uri, CONTENT_TYPE, query), n),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+    for shape in SHAPES:
+        result = bench(shape, args.requests)
+        result['speedup'] = result['legacy_us'] / result['cached_us']
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Attribute polling throughput against the local mock SupOS (tests/mock_supos.py), which runs in a background thread.
+Compares the asyncio client (AsyncSignRequest.fetch_current) with the blocking SignRequest driven by a thread pool,
+the way yibu.py used to poll.
+
+    python -m mqttauto.benchmarks.bench_supos --attributes 57 1000 5000 --latency-ms 20 --concurrency 64
+
+Prints one JSON line per (client, attribute count).
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from mqttauto.mqtt import akskg
+from mqttauto.mqtt.akskg import SignRequest
+from mqttauto.mqtt.aioakskg import AsyncSignRequest, current_uri
+from mqttauto.tests.mock_supos import MockSupOS, start_mock_supos
+
+
+def run_mock_in_thread(mock):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    result = {}
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        result['runner'], result['url'] = loop.run_until_complete(start_mock_supos(mock))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait()
+    return result['url']
+
+
+def attribute_list(n):
+    return [f"system.Collect Template.mltest.system.SC{i:05d}" for i in range(n)]
+
+
+async def bench_async(attributes, concurrency):
+    async with AsyncSignRequest(limit=concurrency) as client:
+        start = time.perf_counter()
+        values = await client.fetch_current(attributes, concurrency)
+        elapsed = time.perf_counter() - start
+    assert all(value != 'Error' for value in values.values())
+    return elapsed
+
+
+def bench_threads(attributes, workers):
+    client = SignRequest(session=akskg.create_session(pool_size=workers), verbose=False)
+
+    def fetch(attribute):
+        return client.post(current_uri, {"inputs": [attribute]}).json()['data'][attribute]['value']
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, attributes))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attributes', type=int, nargs='+', default=[57, 1000, 5000])
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None, help='thread pool size (default: executor default)')
+    args = parser.parse_args()
+
+    mock = MockSupOS(latency_ms=args.latency_ms)
+    akskg.supos_url = run_mock_in_thread(mock)
+    threads = args.threads or min(32, (os.cpu_count() or 1) + 4)
+    for n in args.attributes:
+        attributes = attribute_list(n)
+        for client, elapsed in (('asyncio', asyncio.run(bench_async(attributes, args.concurrency))),
+                                ('threads', bench_threads(attributes, threads))):
+            print(json.dumps({
+                'client': client,
+                'attributes': n,
+                'latency_ms': args.latency_ms,
+                'concurrency': args.concurrency if client == 'asyncio' else threads,
+                'seconds': elapsed,
+                'attributes_per_sec': n / elapsed,
+                'rejected_signatures': mock.rejected,
+            }))
+
+
+if __name__ == '__main__':
+    main()
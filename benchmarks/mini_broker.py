@@ -0,0 +1,231 @@
+"""
+Minimal MQTT 3.1.1 broker on asyncio, a stand-in for mosquitto when benchmarking or testing locally.
+Supports CONNECT (clean and persistent sessions), PUBLISH at QoS 0 and 1, SUBSCRIBE / UNSUBSCRIBE with
+'+' and '#' wildcards, retained messages, PINGREQ and DISCONNECT. QoS 1 messages for a disconnected
+persistent session are queued and delivered on reconnect. No authentication (credentials are accepted),
+no QoS 2, no will messages.
+
+    python -m mqttauto.benchmarks.mini_broker --port 1883
+
+In-process: start_broker_in_thread() returns the running MiniBroker and its port.
+"""
+import argparse
+import asyncio
+import struct
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def encode_remaining_length(length):
+    out = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(out)
+
+
+def packet(packet_type, body, flags=0):
+    return bytes(((packet_type << 4) | flags,)) + encode_remaining_length(len(body)) + body
+
+
+def utf8(text):
+    raw = text.encode('utf-8')
+    return struct.pack('!H', len(raw)) + raw
+
+
+def topic_matches(pattern, topic):
+    pattern_levels = pattern.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(pattern_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+class Session:
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.subscriptions = {}
+        self.pending = []  # (topic, payload, qos) queued while offline
+        self.writer = None
+        self.next_id = 0
+
+    def packet_id(self):
+        self.next_id = self.next_id % 65535 + 1
+        return self.next_id
+
+
+class MiniBroker:
+    def __init__(self):
+        self.sessions = {}
+        self.retained = {}
+        self.server = None
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def read_packet(self, reader):
+        header = await reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7f) * multiplier
+            if byte < 0x80:
+                break
+            multiplier *= 128
+        return header[0] >> 4, header[0] & 0x0f, await reader.readexactly(length)
+
+    async def handle(self, reader, writer):
+        session = None
+        try:
+            packet_type, _, body = await self.read_packet(reader)
+            if packet_type != CONNECT:
+                return
+            session, present = self.connect(body, writer)
+            writer.write(packet(CONNACK, bytes((1 if present else 0, 0))))
+            for topic, payload, qos in session.pending:
+                self.send(session, topic, payload, qos)
+            session.pending = []
+            while True:
+                packet_type, flags, body = await self.read_packet(reader)
+                if packet_type == PUBLISH:
+                    self.on_publish(writer, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self.on_subscribe(session, writer, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.on_unsubscribe(session, writer, body)
+                elif packet_type == PINGREQ:
+                    writer.write(packet(PINGRESP, b''))
+                elif packet_type == DISCONNECT:
+                    break
+                # PUBACK from subscribers: delivery is fire-and-forget here
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None and session.writer is writer:
+                session.writer = None
+                if session.clean:
+                    self.sessions.pop(session.client_id, None)
+            writer.close()
+
+    def connect(self, body, writer):
+        name_length = struct.unpack('!H', body[:2])[0]
+        flags = body[2 + name_length + 1]
+        offset = 2 + name_length + 4
+        id_length = struct.unpack('!H', body[offset:offset + 2])[0]
+        client_id = body[offset + 2:offset + 2 + id_length].decode('utf-8') or f'anonymous-{id(writer)}'
+        clean = bool(flags & 0x02)
+        session = self.sessions.get(client_id)
+        present = session is not None and not clean
+        if session is not None and session.writer is not None:
+            # a client id can only be connected once: the older connection is dropped
+            session.writer.close()
+        if session is None or clean:
+            session = self.sessions[client_id] = Session(client_id)
+        session.clean = clean
+        session.writer = writer
+        return session, present
+
+    def on_publish(self, writer, flags, body):
+        qos = (flags >> 1) & 0x03
+        topic_length = struct.unpack('!H', body[:2])[0]
+        topic = body[2:2 + topic_length].decode('utf-8')
+        offset = 2 + topic_length
+        if qos:
+            writer.write(packet(PUBACK, body[offset:offset + 2]))
+            offset += 2
+        payload = body[offset:]
+        self.messages_in += 1
+        self.bytes_in += len(payload)
+        if flags & 0x01:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for session in list(self.sessions.values()):
+            for pattern, granted in session.subscriptions.items():
+                if topic_matches(pattern, topic):
+                    self.send(session, topic, payload, min(qos, granted))
+                    break
+
+    def send(self, session, topic, payload, qos, retain=False):
+        if session.writer is None:
+            if qos:
+                session.pending.append((topic, payload, qos))
+            return
+        body = utf8(topic) + (struct.pack('!H', session.packet_id()) if qos else b'') + payload
+        session.writer.write(packet(PUBLISH, body, (qos << 1) | (1 if retain else 0)))
+        self.messages_out += 1
+
+    def on_subscribe(self, session, writer, body):
+        packet_id = body[:2]
+        offset, granted = 2, []
+        while offset < len(body):
+            length = struct.unpack('!H', body[offset:offset + 2])[0]
+            pattern = body[offset + 2:offset + 2 + length].decode('utf-8')
+            qos = min(body[offset + 2 + length], 1)
+            offset += 3 + length
+            session.subscriptions[pattern] = qos
+            granted.append(qos)
+            for topic, (payload, retained_qos) in self.retained.items():
+                if topic_matches(pattern, topic):
+                    self.send(session, topic, payload, min(qos, retained_qos), retain=True)
+        writer.write(packet(SUBACK, packet_id + bytes(granted)))
+
+    def on_unsubscribe(self, session, writer, body):
+        offset = 2
+        while offset < len(body):
+            length = struct.unpack('!H', body[offset:offset + 2])[0]
+            session.subscriptions.pop(body[offset + 2:offset + 2 + length].decode('utf-8'), None)
+            offset += 2 + length
+        writer.write(packet(UNSUBACK, body[:2]))
+
+    def drop(self, client_id):
+        """Close a client's connection as if the network failed (its persistent session stays)."""
+        session = self.sessions.get(client_id)
+        if session is not None and session.writer is not None:
+            session.writer.transport.abort()
+
+
+def start_broker_in_thread(host='127.0.0.1', port=0):
+    """Run a MiniBroker on its own event loop thread; returns (broker, port, loop)."""
+    broker = MiniBroker()
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    result = {}
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        result['port'] = loop.run_until_complete(broker.start(host, port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, name='mini-broker', daemon=True).start()
+    started.wait()
+    return broker, result['port'], loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    args = parser.parse_args()
+    loop = asyncio.new_event_loop()
+    broker = MiniBroker()
+    print(f"Listening on {args.host}:{loop.run_until_complete(broker.start(args.host, args.port))}")
+    loop.run_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""
+pytest setup: the modules import each other as the mqttauto package (mqttauto.mqtt.*, mqttauto.model.*), so
+the checkout is registered under that name whatever its directory is called. The checkout itself is put on
+sys.path too, for the top-level modules (AutoMachineLearning.py imports model.registry).
+"""
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+if importlib.util.find_spec('mqttauto') is None:
+    # a namespace package over the checkout, like the one python finds next to a directory named mqttauto
+    package = types.ModuleType('mqttauto')
+    package.__path__ = [ROOT]
+    sys.modules['mqttauto'] = package
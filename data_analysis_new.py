@@ -10,9 +10,10 @@ from abc import ABC, abstractmethod
 from copy import deepcopy
 from statsmodels.tsa.seasonal import seasonal_decompose
 from utlis.plot import TimeSeriesPlot,plot_grouped_time_series
-from utlis.preprocessing import TimeSeriesPreprocessor
+from utlis.preprocessing import TimeSeriesPreprocessor, StreamingWindowBuffer
+from mqtt.sinks import read_sink
 from AutoMachineLearning import TimeSeriesAutoML,GridSearchTuner
-from model.models import LSTMModel,GRUModel,BaseTCNModel
+from model.models import LSTMModel,GRUModel,BaseTCNModel,configure_threads
 from matplotlib.dates import DateFormatter, MonthLocator
 from datetime import datetime, timedelta
 import torch
@@ -29,7 +30,8 @@ class BaseConfig:
     def update_excluded_features(self, new_excluded_features):
         self.excluded_features.update(new_excluded_features)
 class TimeSeriesConfig(BaseConfig):
-    def __init__(self, timestamp_column, resample_rule=None,start=None,start_test=None,end=None,include_label=True, **kwargs):
+    def __init__(self, timestamp_column, resample_rule=None,start=None,start_test=None,end=None,include_label=True,
+                 device=None, intra_op_threads=None, inter_op_threads=None, registry_root='static/registry', **kwargs):
         super().__init__(**kwargs)
         self.timestamp_column = timestamp_column
         self.resample_rule = resample_rule  # 可选，用于定义重采样规则
@@ -37,6 +39,11 @@ class TimeSeriesConfig(BaseConfig):
         self.start_test = start_test
         self.end = end
         self.include_label = include_label
+        # None picks the GPU when available; thread counts only matter on CPU
+        self.device = device
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.registry_root = registry_root
 class DataAnalysisInterface(ABC):
     def __init__(self,config):
         self.config = config
@@ -48,7 +55,8 @@ class DataAnalysisInterface(ABC):
             filepath = self.config.dataset_path
         else:
             filepath = path
-        self.dataframe = pd.read_csv(filepath) if filepath.endswith('.csv') else pd.read_excel(filepath)
+        # whatever the poller sinks (mqtt/sinks.py) wrote, or a CSV / Parquet / Excel file
+        self.dataframe = read_sink(filepath)
         self.processed_dataframe = deepcopy(self.dataframe)
         print(f'Loading data from {filepath}')
 
@@ -127,6 +135,7 @@ if __name__ == '__main__':
     #     group_by='engine_no',
     #     excluded_features=['op_setting_3','sensor_16','sensor_19'],
     # )
+    configure_threads(time_series_config.intra_op_threads, time_series_config.inter_op_threads)
     start_date = time_series_config.start
     start_test_date = time_series_config.start_test
     end_date = time_series_config.end
@@ -164,9 +173,10 @@ if __name__ == '__main__':
 
     auto_ml = TimeSeriesAutoML(time_series_config)
 
-    auto_ml.add_model('LSTM',LSTMModel(input_dimension,output_dimension))
-    # auto_ml.add_model('GRU', GRUModel(input_dimension, output_dimension))
-    # auto_ml.add_model('TCN',BaseTCNModel(input_dimension,output_dimension))
+    device = time_series_config.device
+    auto_ml.add_model('LSTM',LSTMModel(input_dimension,output_dimension,device))
+    # auto_ml.add_model('GRU', GRUModel(input_dimension, output_dimension, device))
+    # auto_ml.add_model('TCN',BaseTCNModel(input_dimension,output_dimension,device))
     auto_ml.add_tuner('GridSearch', GridSearchTuner(num_folds=2))
 
     auto_ml.run_experiments(preprocessed_training_data, preprocessed_training_label)
@@ -214,33 +224,31 @@ if __name__ == '__main__':
     end_date = datetime.strptime(end_date, '%Y-%m-%d')
 
 
+    # Incremental forecasting: the per-group ring buffers are primed with the last look_back days before
+    # the test period, then every simulated day only appends that day's rows and scores all groups in one batch
+    stream = StreamingWindowBuffer(preprocessor)
+    history_start = (cur_date - timedelta(days=look_back)).strftime('%Y-%m-%d')
+    history_end = (cur_date - timedelta(days=1)).strftime('%Y-%m-%d')
+    stream.append(analysis.get_partial_data(history_start, history_end))
+    # split the test period by day once, so each step is a dict lookup instead of a scan of the whole frame
+    test_rows = analysis.get_partial_data(cur_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    test_days = {day: rows for day, rows in test_rows.groupby(level=0)}
+
     while cur_date<end_date:
-        # read and process again, since new data is coming
-        analysis.load_data()
-        analysis.preprocess_data()
-
-        cur_start_test_date = cur_date + timedelta(days=1) - timedelta(days=look_back)
-        cur_start_test_date = cur_start_test_date.strftime('%Y-%m-%d')
-        cur_end_test_date = (cur_date+ timedelta(days=1)).strftime('%Y-%m-%d')
-
-        test_data = analysis.get_partial_data(cur_start_test_date, cur_end_test_date)
-        preprocessed_test_data, preprocessed_test_label = preprocessor.transform(test_data)
-        auto_ml.evaluate(preprocessed_test_data, preprocessed_test_label)
-        test_result = auto_ml.test_result['LSTM']['test_prediction']
-
-        test_result = preprocessor.inverse_transform_labels(test_result)
-        test_result = [int(i) for i in test_result]
-        start_index_test = 0
-        for i, (name, truth) in enumerate(preprocessed_test_label.items()):
-            test_truth = preprocessor.inverse_transform_labels(np.array(truth))
-            num_train = len(test_truth)
-            test_truth = np.squeeze(test_truth,axis=-1)
-            test_truth = test_truth.tolist()
-            test_truth = [int(i) for i in test_truth]
-
-            result['test'][name]['prediction'].extend(test_result[start_index_test:start_index_test + num_train])
-            result['test'][name]['truth'].extend(test_truth)
-            start_index_test += num_train
+        new_rows = test_days.get(pd.Timestamp(cur_date))
+        if new_rows is not None:
+            stream.append(new_rows)
+            groups, windows = stream.windows()
+            if not groups:
+                cur_date += timedelta(days=1)
+                continue
+            test_result = auto_ml.forecast(windows)['LSTM']
+            test_result = preprocessor.inverse_transform_labels(test_result)
+            test_truth = dict(zip(new_rows[time_series_config.group_by], new_rows[time_series_config.label]))
+            for name, prediction in zip(groups, test_result):
+                if name in test_truth and name in result['test']:
+                    result['test'][name]['prediction'].append(int(prediction[0]))
+                    result['test'][name]['truth'].append(int(test_truth[name]))
         # Move to the next day
         cur_date += timedelta(days=1)
     os.makedirs(f'static/results/{time_series_config.task}', exist_ok=True)
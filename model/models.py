@@ -1,3 +1,4 @@
+import os
 import torch
 import torch.nn as nn
 import pickle
@@ -9,17 +10,41 @@ from torch.optim import Adam
 from torch.utils.data import DataLoader, TensorDataset
 
 
+def resolve_device(device=None):
+    """Device for a model: an explicit 'cpu'/'cuda'/'cuda:1'/torch.device, else the MQTTAUTO_DEVICE
+    environment variable, else the GPU when one is available and the CPU otherwise."""
+    if device is None:
+        device = os.getenv('MQTTAUTO_DEVICE') or ('cuda' if torch.cuda.is_available() else 'cpu')
+    return torch.device(device)
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """CPU threading policy. intra_op_threads bounds the threads of a single op (default: all usable cores),
+    inter_op_threads the ops run concurrently. Call once at start-up, before any model runs."""
+    if intra_op_threads is None:
+        intra_op_threads = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    torch.set_num_threads(intra_op_threads)
+    if inter_op_threads is not None:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # torch only allows this before the inter-op pool has started
+            print(f'inter-op threads already fixed at {torch.get_num_interop_threads()}')
+
+
 class Model(ABC):
+    # train continues from the current weights and optimizer state; epochs overrides the configured
+    # number of epochs, so a tuner can train in increments without restarting
     @abstractmethod
-    def train(self, X, y):
+    def train(self, X, y, epochs=None):
         pass
 
     @abstractmethod
-    def predict(self, X):
+    def predict(self, X, batch_size=None):
         pass
 
     @abstractmethod
-    def evaluate(self,X,y):
+    def evaluate(self, X, y, batch_size=None):
         pass
     @abstractmethod
     def save(self, path):
@@ -29,6 +54,35 @@ class Model(ABC):
     def load(self, path):
         pass
 
+    # rows per forward pass in predict/evaluate when no batch_size is given
+    inference_batch_size = 1024
+
+    def _batched_predict(self, X, batch_size=None):
+        """Shared inference path: X is wrapped once with torch.from_numpy (no copy for contiguous float32
+        input), fed to the model in large batches under inference_mode, and every batch is written into a
+        preallocated output array. Cached device memory is released once, at the end."""
+        batch_size = batch_size or self.inference_batch_size
+        X = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32))
+        self.model.eval()
+        predictions = None
+        with torch.inference_mode():
+            for i in range(0, len(X), batch_size):
+                outputs = self.model(X[i:i + batch_size].to(self.device, non_blocking=True))
+                if predictions is None:
+                    predictions = np.empty((len(X),) + tuple(outputs.shape[1:]), dtype=np.float32)
+                predictions[i:i + len(outputs)] = outputs.cpu().numpy()
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+        return predictions if predictions is not None else np.empty((0,), dtype=np.float32)
+
+    def _batched_mse(self, X, y, batch_size=None):
+        """Mean squared error over all rows; unlike an average of per-batch means it does not depend on batch_size."""
+        predictions = self._batched_predict(X, batch_size)
+        if len(predictions) == 0:
+            return 0
+        y = np.asarray(y, dtype=np.float32).reshape(predictions.shape)
+        return float(np.mean(np.square(predictions - y)))
+
 
 class BaseRNNModel(Model):
     class RNNNet(nn.Module):
@@ -47,7 +101,8 @@ class BaseRNNModel(Model):
             output = self.fc(rnn_out[:, -1, :])  # Get the last time step's output
             return output
 
-    def __init__(self, input_dim, output_dim, rnn_type):
+    def __init__(self, input_dim, output_dim, rnn_type, device=None):
+        self.device = resolve_device(device)
         self.input_dim = input_dim
         self.output_dim = output_dim
         self.rnn_type = rnn_type
@@ -58,18 +113,18 @@ class BaseRNNModel(Model):
         self.criterion = nn.L1Loss()
 
     def set_params(self, hidden_dim=30, num_layers=1, lr=0.001, epochs=100, batch_size=32):
-        self.model = self.RNNNet(self.input_dim, hidden_dim, self.output_dim, num_layers, self.rnn_type).cuda()
+        self.model = self.RNNNet(self.input_dim, hidden_dim, self.output_dim, num_layers, self.rnn_type).to(self.device)
         self.epochs = epochs
         self.batch_size = batch_size
         self.optimizer = Adam(self.model.parameters(), lr=lr)
 
-    def train(self, X, y):
+    def train(self, X, y, epochs=None):
         self.model.train()
-        X = torch.tensor(X, dtype=torch.float32).cuda()
-        y = torch.tensor(y, dtype=torch.float32).cuda()
+        X = torch.tensor(X, dtype=torch.float32).to(self.device)
+        y = torch.tensor(y, dtype=torch.float32).to(self.device)
         dataset = TensorDataset(X, y)
         dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
-        for epoch in range(self.epochs):
+        for epoch in range(self.epochs if epochs is None else epochs):
             for inputs, labels in dataloader:
                 self.optimizer.zero_grad()
                 outputs = self.model(inputs)
@@ -82,69 +137,27 @@ class BaseRNNModel(Model):
                 loss.backward()
                 self.optimizer.step()
 
-    def predict(self, X, batch_size=32):
-        self.model.eval()
-        predictions = []
-
-        # Avoid converting the entire array to a GPU tensor at once
-        with torch.no_grad():
-            for i in range(0, len(X), batch_size):
-                # Convert slices of arrays to tensors directly and move to GPU
-                X_batch = torch.tensor(X[i:i + batch_size], dtype=torch.float32).cuda()
+    def predict(self, X, batch_size=None):
+        return self._batched_predict(X, batch_size)
 
-                # Process each batch
-                outputs = self.model(X_batch).detach().cpu().numpy()
-                predictions.append(outputs)
-
-                # Explicitly delete tensors to free up GPU memory
-                del X_batch, outputs
-                torch.cuda.empty_cache()  # Clear memory cache to prevent CUDA out of memory errors
-
-        # Concatenate all batch outputs
-        return np.concatenate(predictions, axis=0)
-
-    def evaluate(self, X, y, batch_size=32):
-        self.model.eval()
-        total_loss = 0.0
-        n_batches = 0
-
-        # Assuming X and y are numpy arrays or similar, batch processing is done without prior conversion
-        with torch.no_grad():
-            for i in range(0, len(X), batch_size):
-                # Convert slices of arrays to tensors directly and move to GPU
-                X_batch = torch.tensor(X[i:i + batch_size], dtype=torch.float32).cuda()
-                y_batch = torch.tensor(y[i:i + batch_size], dtype=torch.float32).cuda()
-
-                # Forward pass
-                outputs = self.model(X_batch)
-                loss = nn.MSELoss()(outputs,
-                                    y_batch).item()  # Use .item() to get the Python number from a tensor with one element
-                total_loss += loss
-                n_batches += 1
-
-                # Explicitly delete tensors to free up GPU memory
-                del X_batch, y_batch, outputs
-                torch.cuda.empty_cache()  # Clear memory cache to prevent CUDA out of memory error
-
-        # Calculate average loss over all batches
-        average_loss = total_loss / n_batches if n_batches > 0 else 0
-        return average_loss
+    def evaluate(self, X, y, batch_size=None):
+        return self._batched_mse(X, y, batch_size)
 
     def save(self, path):
         torch.save(self.model, path)
 
     def load(self, path):
-        self.model = torch.load(path)
-        self.model.cuda()
+        self.model = torch.load(path, map_location=self.device, weights_only=False)
+        self.model.to(self.device)
         self.model.eval()
 
 class LSTMModel(BaseRNNModel):
-    def __init__(self, input_dim, output_dim):
-        super().__init__(input_dim, output_dim, 'LSTM')
+    def __init__(self, input_dim, output_dim, device=None):
+        super().__init__(input_dim, output_dim, 'LSTM', device)
 
 class GRUModel(BaseRNNModel):
-    def __init__(self, input_dim, output_dim):
-        super().__init__(input_dim, output_dim, 'GRU')
+    def __init__(self, input_dim, output_dim, device=None):
+        super().__init__(input_dim, output_dim, 'GRU', device)
 
 class TCNBlock(nn.Module):
     def __init__(self, input_dim, output_dim, kernel_size, dilation, padding):
@@ -183,7 +196,11 @@ class TemporalConvNet(nn.Module):
         return self.linear(out)
 
 class BaseTCNModel(Model):
-    def __init__(self, input_dim, output_dim):
+    # the padded conv activations of larger batches fall out of the CPU caches
+    inference_batch_size = 512
+
+    def __init__(self, input_dim, output_dim, device=None):
+        self.device = resolve_device(device)
         self.input_dim = input_dim
         self.output_dim = output_dim
         self.criterion = nn.L1Loss()
@@ -197,18 +214,18 @@ class BaseTCNModel(Model):
     def set_params(self, lr=0.001, epochs=100, batch_size=32,num_channels=[16,32,64],kernel_size=3):
         self.num_channels = num_channels
         self.kernel_size = kernel_size
-        self.model = TemporalConvNet(self.input_dim,self.output_dim,self.num_channels, self.kernel_size).cuda()
+        self.model = TemporalConvNet(self.input_dim,self.output_dim,self.num_channels, self.kernel_size).to(self.device)
         self.epochs = epochs
         self.batch_size = batch_size
         self.optimizer = Adam(self.model.parameters(), lr=lr)
 
-    def train(self, X, y):
+    def train(self, X, y, epochs=None):
         self.model.train()
-        X = torch.tensor(X, dtype=torch.float32).cuda()
-        y = torch.tensor(y, dtype=torch.float32).cuda()
+        X = torch.tensor(X, dtype=torch.float32).to(self.device)
+        y = torch.tensor(y, dtype=torch.float32).to(self.device)
         dataset = TensorDataset(X, y)
         dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
-        for epoch in range(self.epochs):
+        for epoch in range(self.epochs if epochs is None else epochs):
             for inputs, labels in dataloader:
                 self.optimizer.zero_grad()
                 outputs = self.model(inputs)
@@ -219,60 +236,22 @@ class BaseTCNModel(Model):
                                                                                                     labels.unsqueeze(-1))
                 loss.backward()
                 self.optimizer.step()
-        del dataset,X,y,loss,outputs
-        torch.cuda.empty_cache()
-    def predict(self, X, batch_size=32):
-        self.model.eval()
-        predictions = []
-
-        # Convert the entire array to a tensor first to avoid multiple GPU transfers
-        X_tensor = torch.tensor(X, dtype=torch.float32).cuda()
-
-        with torch.no_grad():
-            for i in range(0, len(X_tensor), batch_size):
-                # Process each batch
-                X_batch = X_tensor[i:i + batch_size]
-                outputs = self.model(X_batch).detach().cpu().numpy()
-                predictions.append(outputs)
-        del X_tensor,outputs
-        torch.cuda.empty_cache()
+        del dataset,X,y
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
 
-        # Concatenate all batch outputs
-        return np.concatenate(predictions, axis=0)
+    def predict(self, X, batch_size=None):
+        return self._batched_predict(X, batch_size)
 
-    def evaluate(self, X, y, batch_size=32):
-        self.model.eval()
-        total_loss = 0.0
-        n_batches = 0
-
-        # Assuming X and y are numpy arrays or similar, batch processing is done without prior conversion
-        with torch.no_grad():
-            for i in range(0, len(X), batch_size):
-                # Convert slices of arrays to tensors directly and move to GPU
-                X_batch = torch.tensor(X[i:i + batch_size], dtype=torch.float32).cuda()
-                y_batch = torch.tensor(y[i:i + batch_size], dtype=torch.float32).cuda()
-
-                # Forward pass
-                outputs = self.model(X_batch)
-                loss = nn.MSELoss()(outputs,
-                                    y_batch).item()  # Use .item() to get the Python number from a tensor with one element
-                total_loss += loss
-                n_batches += 1
-
-                # Explicitly delete tensors to free up GPU memory
-                del X_batch, y_batch, outputs
-                torch.cuda.empty_cache()  # Clear memory cache to prevent CUDA out of memory error
-
-        # Calculate average loss over all batches
-        average_loss = total_loss / n_batches if n_batches > 0 else 0
-        return average_loss
+    def evaluate(self, X, y, batch_size=None):
+        return self._batched_mse(X, y, batch_size)
 
     def save(self, path):
         torch.save(self.model, path)
 
     def load(self, path):
-        self.model = torch.load(path)
-        self.model.cuda()
+        self.model = torch.load(path, map_location=self.device, weights_only=False)
+        self.model.to(self.device)
         self.model.eval()
 
 
@@ -373,7 +352,8 @@ class FreTS(Model):
             x = x[:,:,-1]
             return x
 
-    def __init__(self,input_length,input_size,output_size):
+    def __init__(self,input_length,input_size,output_size,device=None):
+        self.device = resolve_device(device)
         self.input_length = input_length
         self.input_size = input_size
         self.output_size = output_size
@@ -390,18 +370,18 @@ class FreTS(Model):
         self.hidden_size = hidden_size
         self.channel_independence = channel_independence
         self.model = self.FresTSModel(self.input_length, self.input_size, self.output_size,self.embed_size,
-                                      self.hidden_size,self.channel_independence).cuda()
+                                      self.hidden_size,self.channel_independence).to(self.device)
         self.epochs = epochs
         self.batch_size = batch_size
         self.optimizer = Adam(self.model.parameters(), lr=lr)
 
-    def train(self, X, y):
+    def train(self, X, y, epochs=None):
         self.model.train()
-        X = torch.tensor(X, dtype=torch.float32).cuda()
-        y = torch.tensor(y, dtype=torch.float32).cuda()
+        X = torch.tensor(X, dtype=torch.float32).to(self.device)
+        y = torch.tensor(y, dtype=torch.float32).to(self.device)
         dataset = TensorDataset(X, y)
         dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
-        for epoch in range(self.epochs):
+        for epoch in range(self.epochs if epochs is None else epochs):
             for inputs, labels in dataloader:
                 self.optimizer.zero_grad()
                 outputs = self.model(inputs)
@@ -414,59 +394,18 @@ class FreTS(Model):
                 loss.backward()
                 self.optimizer.step()
 
-    def predict(self, X, batch_size=32):
-        self.model.eval()
-        predictions = []
-
-        # Avoid converting the entire array to a GPU tensor at once
-        with torch.no_grad():
-            for i in range(0, len(X), batch_size):
-                # Convert slices of arrays to tensors directly and move to GPU
-                X_batch = torch.tensor(X[i:i + batch_size], dtype=torch.float32).cuda()
-
-                # Process each batch
-                outputs = self.model(X_batch).detach().cpu().numpy()
-                predictions.append(outputs)
-
-                # Explicitly delete tensors to free up GPU memory
-                del X_batch, outputs
-                torch.cuda.empty_cache()  # Clear memory cache to prevent CUDA out of memory errors
-
-        # Concatenate all batch outputs
-        return np.concatenate(predictions, axis=0)
-
-    def evaluate(self, X, y, batch_size=32):
-        self.model.eval()
-        total_loss = 0.0
-        n_batches = 0
-
-        # Assuming X and y are numpy arrays or similar, batch processing is done without prior conversion
-        with torch.no_grad():
-            for i in range(0, len(X), batch_size):
-                # Convert slices of arrays to tensors directly and move to GPU
-                X_batch = torch.tensor(X[i:i + batch_size], dtype=torch.float32).cuda()
-                y_batch = torch.tensor(y[i:i + batch_size], dtype=torch.float32).cuda()
-
-                # Forward pass
-                outputs = self.model(X_batch)
-                loss = nn.MSELoss()(outputs,
-                                      y_batch).item()  # Use .item() to get the Python number from a tensor with one element
-                total_loss += loss
-                n_batches += 1
-
-                # Explicitly delete tensors to free up GPU memory
-                del X_batch, y_batch, outputs
-                torch.cuda.empty_cache()  # Clear memory cache to prevent CUDA out of memory error
+    def predict(self, X, batch_size=None):
+        return self._batched_predict(X, batch_size)
 
-        # Calculate average loss over all batches
-        average_loss = total_loss / n_batches if n_batches > 0 else 0
-        return average_loss
+    def evaluate(self, X, y, batch_size=None):
+        return self._batched_mse(X, y, batch_size)
 
     def save(self, path):
         torch.save(self.model, path)
 
     def load(self, path):
-        self.model = torch.load(path)
+        self.model = torch.load(path, map_location=self.device, weights_only=False)
+        self.model.to(self.device)
         self.model.eval()
 
 param_grid = {
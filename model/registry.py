@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import torch
+from collections import OrderedDict
+
+
+class ModelRegistry:
+    '''
+    Checkpoint store keyed by (task, model, tuner, param hash, data fingerprint).
+    Every entry lives at {root}/{task}/{model}/{tuner}/{param_hash}/{data_fingerprint}.pt and holds the
+    state_dict of the network, the parameters to rebuild it with set_params and some metadata.
+    Loaded entries are kept in an in-process LRU cache as a CPU copy of the state_dict, so repeated loads of
+    the same key skip torch.load. A warm load rebuilds the network like a cold one (set_params, then
+    load_state_dict), so the model gets a fresh optimizer and training it never changes the cached weights.
+    '''
+    def __init__(self, root='static/registry', max_cached=8):
+        self.root = root
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+
+    @staticmethod
+    def param_hash(params):
+        """Stable short hash of a parameter dict or parameter grid."""
+        encoded = json.dumps(params, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha1(encoded).hexdigest()[:12]
+
+    @staticmethod
+    def data_fingerprint(*arrays):
+        """Short hash of the shape, dtype and content of the training arrays."""
+        digest = hashlib.blake2b(digest_size=8)
+        for array in arrays:
+            if array is None:
+                continue
+            array = np.ascontiguousarray(array)
+            digest.update(f'{array.shape}{array.dtype}'.encode('utf-8'))
+            digest.update(memoryview(array).cast('B'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(task, model_name, tuner_name, param_hash, data_fingerprint):
+        return task, model_name, tuner_name, param_hash, data_fingerprint
+
+    def path(self, key):
+        task, model_name, tuner_name, param_hash, data_fingerprint = key
+        return os.path.join(self.root, task, model_name, tuner_name, param_hash, f'{data_fingerprint}.pt')
+
+    def exists(self, key):
+        return key in self.cache or os.path.exists(self.path(key))
+
+    def save(self, key, model, params, **metadata):
+        """Save the network of a trained Model with the params it was built with."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        metadata.update({'key': list(key), 'params_hash': self.param_hash(params), 'saved_at': time.time()})
+        state_dict = model.model.state_dict()
+        torch.save({'state_dict': state_dict, 'params': params, 'metadata': metadata}, path)
+        self._remember(key, state_dict, params, metadata)
+
+    def load(self, key, model):
+        """Rebuild model's network with the params stored under key and load its weights."""
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            state_dict, params, _ = self.cache[key]
+        else:
+            checkpoint = torch.load(self.path(key), map_location='cpu', weights_only=True)
+            state_dict, params = checkpoint['state_dict'], checkpoint['params']
+            self._remember(key, state_dict, params, checkpoint['metadata'])
+        model.set_params(**params)
+        # load_state_dict copies the tensors into the new module, the cached ones stay untouched
+        model.model.load_state_dict(state_dict)
+        model.model.eval()
+        return model
+
+    def metadata(self, key):
+        if key in self.cache:
+            return self.cache[key][2]
+        return torch.load(self.path(key), map_location='cpu', weights_only=True)['metadata']
+
+    def _remember(self, key, state_dict, params, metadata):
+        state_dict = {name: tensor.detach().to('cpu', copy=True) for name, tensor in state_dict.items()}
+        self.cache[key] = (state_dict, params, metadata)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import aiohttp
+from mqttauto.mqtt import akskg
+from mqttauto.mqtt.akskg import canonical_query, default_signer
+
+current_uri = "/open-api/supos/oodm/v2/attribute/current"
+
+
+def attribute_path(attribute_name):
+    return f"system.Collect Template.mltest.system.{attribute_name}"
+
+
+class AsyncSignRequest:
+    """
+    asyncio counterpart of SignRequest: requests are signed by the same Signer and go through one aiohttp
+    session whose connector keeps at most `limit` connections open. Methods return the decoded JSON body and
+    raise aiohttp.ClientResponseError for HTTP errors. A session passed in is left open by close(), only the
+    one created here is closed. Use it as an async context manager:
+
+        async with AsyncSignRequest() as client:
+            values = await client.fetch_current(attributes, concurrency=64)
+    """
+
+    def __init__(self, session=None, limit=100, timeout=10, verbose=False, signer=None):
+        self.signer = signer if signer is not None else default_signer
+        self.session = session
+        self.owns_session = session is None
+        self.limit = limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.verbose = verbose
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self.owns_session and (self.session is None or self.session.closed):
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit),
+                                                 timeout=self.timeout)
+
+    async def close(self):
+        if self.owns_session and self.session is not None:
+            await self.session.close()
+
+    async def get(self, open_api_uri, query_params):
+        return await self.request(open_api_uri, "GET", query_params, None)
+
+    async def post(self, open_api_uri, request_body):
+        return await self.request(open_api_uri, "POST", None, request_body)
+
+    async def put(self, open_api_uri, request_body):
+        return await self.request(open_api_uri, "PUT", None, request_body)
+
+    async def delete(self, open_api_uri, query_params):
+        return await self.request(open_api_uri, "DELETE", query_params, None)
+
+    async def request(self, api_url, method_name, query_dict, request_dict):
+        headers = {"Content-Type": 'application/json;charset=utf-8'}
+        sign_str, headers['Authorization'] = self.signer.sign(method_name, api_url, headers['Content-Type'],
+                                                              query_dict)
+        if self.verbose:
+            print("签名源内容：========开始======>>\n" + sign_str)
+            print("签名源内容：<<========结束======")
+            print('签名结果：' + headers['Authorization'])
+        whole_url = akskg.supos_url + api_url
+        if "GET" == method_name and query_dict:
+            whole_url = whole_url + "?" + canonical_query(query_dict, lower_keys=False)
+        data = None
+        if request_dict is not None:
+            data = json.dumps(request_dict, ensure_ascii=False).encode('utf-8')
+        await self.open()
+        async with self.session.request(method_name, whole_url, data=data, headers=headers) as response:
+            text = await response.text(encoding='utf-8')
+            if self.verbose:
+                print("请求返回结果：" + text)
+            response.raise_for_status()
+            return json.loads(text) if text else None
+
+    async def fetch_current(self, attributes, concurrency=64, retries=3):
+        """Current value of every attribute, one /attribute/current request each, at most `concurrency` in flight.
+        Returns {attribute: value}; attributes without data map to 'No Storage Data', failed ones to 'Error'."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_one(attribute):
+            async with semaphore:
+                for attempt in range(retries):
+                    try:
+                        response_data = await self.post(current_uri, {"inputs": [attribute]})
+                        return attribute, response_data['data'].get(attribute, {}).get('value', 'No Storage Data')
+                    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError, AttributeError) as e:
+                        print(f"Error on attempt {attempt + 1} for {attribute}: {e}")
+                return attribute, 'Error'
+
+        results = await asyncio.gather(*(fetch_one(attribute) for attribute in attributes))
+        return dict(results)
@@ -3,6 +3,8 @@ import hmac
 import json
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # supOS地址
 env_supos_url = os.getenv("SDK_ADDRESS")
@@ -16,10 +18,115 @@ app_ak = env_ak if env_ak is not None else "89421a8a5fa871a49c68a849f7afea87"
 app_sk = env_sk if env_sk is not None else "cc560e6a276083d453b1f1b42ce9cbed"
 
 
+# 连接池配置，可通过环境变量调整
+pool_size = int(os.getenv("SUPOS_POOL_SIZE", "16"))
+request_timeout = (3.05, 10)  # (connect, read) seconds
+max_retries = 3
+read_methods = frozenset(['GET', 'HEAD', 'OPTIONS'])
+backoff_factor = 0.3
+
+
+def create_session(pool_size=pool_size, retries=max_retries, backoff_factor=backoff_factor,
+                   status_forcelist=(500, 502, 503, 504)):
+    """A keep-alive session with a connection pool and retry/backoff policy.
+    Read timeouts and error statuses are only retried for reads (GET, HEAD, OPTIONS): a POST, PUT or DELETE
+    may have been carried out already, e.g. the single-use code exchange of access_token.
+    Connection errors happen before the request is sent and are retried for every method."""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=status_forcelist,
+                  allowed_methods=read_methods, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_shared_session = None
+
+
+def shared_session():
+    """Session shared by every SignRequest that does not bring its own, so all fetchers reuse warm connections."""
+    global _shared_session
+    if _shared_session is None:
+        _shared_session = create_session()
+    return _shared_session
+
+
+def canonical_query(query, lower_keys=True):
+    """k=v pairs sorted by key and joined with '&'; keys lower-cased for the signature source."""
+    if not query:
+        return ''
+    return '&'.join((key.lower() if lower_keys else key) + '=' + (value if isinstance(value, str) else str(value))
+                    for key, value in sorted(query.items()))
+
+
+class Signer:
+    """
+    Open-API request signer. The HMAC-SHA256 object keyed with the secret key is created once and copied for
+    every signature, and (sign source, Authorization header) is cached per (method, uri, content type, query):
+    the pollers sign the same few requests over and over. The credentials are read from app_ak/app_sk unless
+    given explicitly; when they change (set_credentials, or the module globals being reassigned) the key and
+    the cache are rebuilt.
+    """
+
+    def __init__(self, ak=None, sk=None, max_cached=1024):
+        self.ak = ak
+        self.sk = sk
+        self.max_cached = max_cached
+        self._credentials = None
+        self._mac = None
+        self._cache = {}
+
+    def set_credentials(self, ak, sk):
+        self.ak = ak
+        self.sk = sk
+
+    def _refresh(self):
+        credentials = (self.ak if self.ak is not None else app_ak, self.sk if self.sk is not None else app_sk)
+        if credentials != self._credentials:
+            self._mac = hmac.new(credentials[1].encode('utf-8'), digestmod=hashlib.sha256)
+            self._cache.clear()
+            self._credentials = credentials
+        return credentials[0]
+
+    def sign(self, method_name, uri, content_type, query_params=None):
+        """Returns (sign_str, authorization header value)."""
+        ak = self._refresh()
+        query = canonical_query(query_params)
+        key = (method_name, uri, content_type, query)
+        signed = self._cache.get(key)
+        if signed is None:
+            sign_str = method_name + "\n" + uri + "\n" + content_type + "\n" + query + "\n\n"
+            mac = self._mac.copy()
+            mac.update(sign_str.encode('utf-8'))
+            signed = (sign_str, "Sign " + ak + "-" + mac.hexdigest())
+            if len(self._cache) >= self.max_cached:
+                # query strings with changing values would grow the cache without bound
+                self._cache.clear()
+            self._cache[key] = signed
+        return signed
+
+
+default_signer = Signer()
+
+
+def set_credentials(ak, sk):
+    """Switch the ak/sk used by every SignRequest sharing the default signer."""
+    global app_ak, app_sk
+    app_ak, app_sk = ak, sk
+
+
 class SignRequest:
     __authorize_uri = "/inter-api/auth/v1/oauth2/authorize"
     __token_uri = "/open-api/auth/v2/oauth2/token"
 
+    def __init__(self, session=None, timeout=None, verbose=True, signer=None):
+        # verbose=False keeps the sign string, signature and response bodies out of the polling hot path
+        self.session = session if session is not None else shared_session()
+        self.timeout = timeout if timeout is not None else request_timeout
+        self.verbose = verbose
+        self.signer = signer if signer is not None else default_signer
+
     def authorize(self, redirect_uri, state):
         auth_url = self.__authorize_uri + "?responseType=code&state=" + state + "&redirectUri=" + redirect_uri
         return supos_url + auth_url
@@ -46,66 +153,33 @@ class SignRequest:
         self.__sign_header(api_url, method_name, query_dict, headers)
         response = None
         if "GET" == method_name:
-            response = requests.get(url=whole_url, params=self.__dict_to_query(query_dict), headers=headers)
+            response = self.session.get(url=whole_url, params=self.__dict_to_query(query_dict), headers=headers,
+                                        timeout=self.timeout)
         elif "POST" == method_name:
-            response = requests.post(url=whole_url, data=json.dumps(request_dict, ensure_ascii=False).encode('utf-8'),
-                                     headers=headers)
+            response = self.session.post(url=whole_url,
+                                         data=json.dumps(request_dict, ensure_ascii=False).encode('utf-8'),
+                                         headers=headers, timeout=self.timeout)
         elif "PUT" == method_name:
-            response = requests.put(url=whole_url, data=json.dumps(request_dict, ensure_ascii=False).encode('utf-8'),
-                                    headers=headers)
+            response = self.session.put(url=whole_url,
+                                        data=json.dumps(request_dict, ensure_ascii=False).encode('utf-8'),
+                                        headers=headers, timeout=self.timeout)
         elif "DELETE" == method_name:
-            response = requests.delete(url=whole_url, headers=headers)
+            response = self.session.delete(url=whole_url, headers=headers, timeout=self.timeout)
         response.encoding = 'utf-8'
-        print("请求返回结果：" + response.text)
+        if self.verbose:
+            print("请求返回结果：" + response.text)
         return response
 
-    # 查询参数 将K进行字母小写处理，并按照字母序（ASCLL码序）进行排序。
-    @staticmethod
-    def __sorted_query(query):
-        if query is not None:
-            res = ''
-            for i in sorted(query):
-                if isinstance(query[i], str):
-                    res = res + i.lower() + '=' + query[i] + '&'
-                else:
-                    res = res + i.lower() + '=' + str(query[i]) + '&'
-            return res.rstrip('&')
-        return ''
-
     # dict 转成 查询参数串
     @staticmethod
     def __dict_to_query(query):
-        if query is not None:
-            res = ''
-            for i in sorted(query):
-                if isinstance(query[i], str):
-                    res = res + i + '=' + query[i] + '&'
-                else:
-                    res = res + i + '=' + str(query[i]) + '&'
-            return res.rstrip('&')
-        return ''
+        return canonical_query(query, lower_keys=False) if query is not None else ''
 
-    # 拼接签名源
-    def __build_sign_str(self, uri, method_name, query_params, header_map):
-        sign_str = ''
-        # HTTP Schema
-        sign_str = sign_str + method_name + "\n"
-        # HTTP URI
-        sign_str = sign_str + uri + "\n"
-        # HTTP ContentType
-        sign_str = sign_str + header_map['Content-Type'] + "\n"
-        # CanonicalQueryString
-        sign_str = sign_str + self.__sorted_query(query_params) + "\n" + "\n"
-        return sign_str
-
-    # 生成签名并写入请求头
+    # 生成签名并写入请求头，签名源的查询参数 K 小写并按字母序排序；签名按 (method, uri, content type, query) 缓存
     def __sign_header(self, uri, method_name, query_params, header_map):
-        sign_str = self.__build_sign_str(uri, method_name, query_params, header_map)
-        print("签名源内容：========开始======>>\n" + sign_str)
-        signature = hmac.new(app_sk.encode('utf-8'), sign_str.encode('utf-8'), digestmod=hashlib.sha256).hexdigest()
-        final_signature = "Sign " + app_ak + "-" + signature
-        print("签名源内容：<<========结束======")
-        print('签名结果：' + final_signature)
+        sign_str, final_signature = self.signer.sign(method_name, uri, header_map['Content-Type'], query_params)
+        if self.verbose:
+            print("签名源内容：========开始======>>\n" + sign_str)
+            print("签名源内容：<<========结束======")
+            print('签名结果：' + final_signature)
         header_map['Authorization'] = final_signature
-
-
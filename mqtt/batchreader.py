@@ -0,0 +1,121 @@
+import asyncio
+import time
+import aiohttp
+from mqttauto.mqtt.aioakskg import AsyncSignRequest, current_uri
+
+# the server was not reached or did not answer in time, every other request of the read would fare the same
+TRANSPORT_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def rejected(error):
+    """Whether a chunk failed because of what it asked for (4xx other than auth/rate limits, malformed body),
+    so that smaller chunks may succeed."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return 400 <= error.status < 500 and error.status not in (401, 403, 429)
+    return isinstance(error, (AttributeError, ValueError))
+
+
+class BatchReader:
+    '''
+    Reads /attribute/current for any number of attributes: the list is split into chunks that are sent
+    concurrently (at most `concurrency` in flight) and the responses are merged into {attribute: value}.
+    The chunk size adapts to the observed latency: it grows while chunks answer faster than target_latency
+    and halves when they are slower, but not below the size that sends the whole list in one round of
+    `concurrency` requests, since smaller chunks would only queue behind each other.
+    A chunk rejected on its own (a 4xx answer such as a request-size limit, or a malformed body) is split in
+    halves and retried, so a bad attribute only costs the affected attributes their value ('Error'). Server
+    errors are retried as they are. A connection error or timeout fails the whole read at once: with SupOS
+    down, splitting would only multiply the requests waiting for their timeout.
+    read_sync() keeps one event loop and one client across calls; close() releases them.
+    '''
+    def __init__(self, client=None, chunk_size=50, min_chunk_size=1, max_chunk_size=1000, target_latency=0.5,
+                 concurrency=8, retries=2):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_latency = target_latency
+        self.concurrency = concurrency
+        self.retries = retries
+        self.floor = min_chunk_size
+        self.loop = None
+        self.sync_client = None
+
+    async def read(self, attributes):
+        attributes = list(dict.fromkeys(attributes))
+        if self.client is None:
+            async with AsyncSignRequest(limit=self.concurrency) as client:
+                return await self._read(client, attributes)
+        return await self._read(self.client, attributes)
+
+    def read_sync(self, attributes):
+        """Blocking wrapper for callers without an event loop (from one thread at a time)."""
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        if self.client is not None:
+            return self.loop.run_until_complete(self.read(attributes))
+        if self.sync_client is None:
+            self.sync_client = AsyncSignRequest(limit=self.concurrency)
+        attributes = list(dict.fromkeys(attributes))
+        return self.loop.run_until_complete(self._read(self.sync_client, attributes))
+
+    def close(self):
+        """Close the client and event loop kept by read_sync()."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        if self.sync_client is not None:
+            self.loop.run_until_complete(self.sync_client.close())
+            self.sync_client = None
+        self.loop.close()
+
+    async def _read(self, client, attributes):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self.floor = max(self.min_chunk_size, -(-len(attributes) // self.concurrency))
+        size = self.chunk_size
+        chunks = [attributes[i:i + size] for i in range(0, len(attributes), size)]
+        tasks = [asyncio.ensure_future(self._read_chunk(client, semaphore, chunk)) for chunk in chunks]
+        try:
+            parts = await asyncio.gather(*tasks)
+        except TRANSPORT_ERRORS as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(f"Failed to reach SupOS, {len(attributes)} attributes unread: {e!r}")
+            return {attribute: 'Error' for attribute in attributes}
+        results = {}
+        for part in parts:
+            results.update(part)
+        return results
+
+    async def _read_chunk(self, client, semaphore, chunk, attempt=0):
+        try:
+            async with semaphore:
+                start = time.monotonic()
+                response_data = await client.post(current_uri, {"inputs": chunk})
+                self._adapt(time.monotonic() - start, len(chunk))
+            data = response_data.get('data') or {}
+            return {attribute: (data.get(attribute) or {}).get('value', 'No Storage Data') for attribute in chunk}
+        except TRANSPORT_ERRORS:
+            raise
+        except (aiohttp.ClientError, AttributeError, ValueError) as e:
+            if len(chunk) > 1 and rejected(e):
+                # isolate the failure: the halves succeed or fail on their own
+                self.chunk_size = max(self.min_chunk_size, min(self.chunk_size, len(chunk) // 2))
+                middle = len(chunk) // 2
+                left, right = await asyncio.gather(self._read_chunk(client, semaphore, chunk[:middle], attempt),
+                                                   self._read_chunk(client, semaphore, chunk[middle:], attempt))
+                return {**left, **right}
+            if attempt < self.retries:
+                return await self._read_chunk(client, semaphore, chunk, attempt + 1)
+            print(f"Failed to fetch {len(chunk)} attributes from {chunk[0]}: {e}")
+            return {attribute: 'Error' for attribute in chunk}
+
+    def _adapt(self, latency, size):
+        # additive increase / multiplicative decrease around the latency target; the last, shorter chunk
+        # of a read says nothing about the current size
+        if size < self.chunk_size:
+            return
+        if latency > self.target_latency:
+            self.chunk_size = max(self.min_chunk_size, min(self.floor, self.chunk_size), self.chunk_size // 2)
+        else:
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size + max(1, self.chunk_size // 4))
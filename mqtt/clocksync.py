@@ -0,0 +1,123 @@
+import argparse
+import time
+import threading
+import collections
+import paho.mqtt.client as mqtt
+from mqttauto.mqtt import metatag_pb2
+
+
+def local_ms():
+    """UTC milliseconds of this machine's clock."""
+    return time.time_ns() // 1_000_000
+
+
+class ClockSync:
+    '''
+    Aligns this gateway's clock to the server's with the GatewayCoordinate / ServerCoordinate messages of
+    metatag.proto, NTP style: request() stamps a GatewayCoordinate with the local time t0, the server answers
+    with a ServerCoordinate echoing t0 as localTimeStamp plus its own time ts, and on_response() takes the
+    arrival time t1. Then rtt = t1 - t0 and offset = ts - (t0 + t1) / 2. Of the last `samples` exchanges the
+    one with the smallest round trip gives the offset, as its midpoint is the least uncertain.
+    Responses to requests this instance did not send (other gateways share the topic) are ignored.
+    '''
+    def __init__(self, samples=8, max_outstanding=64):
+        self.samples = collections.deque(maxlen=samples)
+        self.outstanding = collections.OrderedDict()
+        self.max_outstanding = max_outstanding
+        self.lock = threading.Lock()
+        self.offset_ms = 0
+        self.rtt_ms = None
+
+    @property
+    def synced(self):
+        return self.rtt_ms is not None
+
+    def now_ms(self):
+        """UTC milliseconds on the server's clock (the local clock until the first exchange)."""
+        return local_ms() + self.offset_ms
+
+    def request(self):
+        """Serialized GatewayCoordinate to publish on the request topic."""
+        t0 = local_ms()
+        with self.lock:
+            # two requests in the same millisecond share one entry, the later send time is the safe one
+            self.outstanding[t0] = time.monotonic()
+            while len(self.outstanding) > self.max_outstanding:
+                self.outstanding.popitem(last=False)
+        return metatag_pb2.GatewayCoordinate(localTimeStamp=t0).SerializeToString()
+
+    def on_response(self, payload):
+        """Take a serialized ServerCoordinate; returns (offset_ms, rtt_ms) of this exchange, or None when it
+        answers a request of someone else."""
+        coordinate = metatag_pb2.ServerCoordinate.FromString(payload)
+        arrived = time.monotonic()
+        with self.lock:
+            sent = self.outstanding.pop(coordinate.localTimeStamp, None)
+            if sent is None:
+                return None
+            # the round trip comes from the monotonic clock, a wall clock step mid-exchange can't distort it
+            rtt = (arrived - sent) * 1e3
+            offset = coordinate.serverTimeStamp - (coordinate.localTimeStamp + rtt / 2)
+            self.samples.append((rtt, offset))
+            best_rtt, best_offset = min(self.samples)
+            self.offset_ms = int(round(best_offset))
+            self.rtt_ms = best_rtt
+        return offset, rtt
+
+    def on_message(self, client, userdata, message):
+        """paho callback for the response topic."""
+        self.on_response(message.payload)
+
+    def attach(self, client, request_topic, response_topic, qos=0):
+        """Route the responses of a paho client to this instance; returns a function publishing one request.
+        Subscribe again in on_connect if the session is clean."""
+        client.message_callback_add(response_topic, self.on_message)
+        client.subscribe(response_topic, qos)
+        return lambda: client.publish(request_topic, self.request(), qos=qos)
+
+
+def respond(payload, server_ms=None):
+    """Server side of the exchange: the ServerCoordinate answering a serialized GatewayCoordinate."""
+    request = metatag_pb2.GatewayCoordinate.FromString(payload)
+    return metatag_pb2.ServerCoordinate(localTimeStamp=request.localTimeStamp,
+                                        serverTimeStamp=local_ms() if server_ms is None else server_ms
+                                        ).SerializeToString()
+
+
+# Shared by the publish path, so every publisher in the process stamps values on the same aligned clock
+default_clock = ClockSync()
+
+
+def now_ms():
+    return default_clock.now_ms()
+
+
+def serve(broker, port, request_topic, response_topic, qos=0):
+    """Answer every GatewayCoordinate on request_topic with a ServerCoordinate on response_topic, for setups
+    where the server side does not do it."""
+    def on_connect(client, userdata, flags, rc):
+        print("Connected with result code " + str(rc))
+        client.subscribe(request_topic, qos)
+
+    def on_message(client, userdata, message):
+        client.publish(response_topic, respond(message.payload), qos=qos)
+
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(broker, port, 60)
+    client.loop_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Answer clock-sync requests (GatewayCoordinate -> ServerCoordinate).')
+    parser.add_argument('--broker', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--request-topic', required=True)
+    parser.add_argument('--response-topic', required=True)
+    args = parser.parse_args(argv)
+    serve(args.broker, args.port, args.request_topic, args.response_topic)
+
+
+if __name__ == '__main__':
+    main()
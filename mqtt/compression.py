@@ -0,0 +1,112 @@
+import threading
+import paho.mqtt.client as mqtt
+from mqttauto.mqtt import metatag_pb2
+from mqttauto.mqtt.clocksync import now_ms
+from mqttauto.mqtt.realdatatransfer import row_value
+
+
+class DeadbandFilter:
+    '''
+    Publisher-side compression that follows the CompressSpec of every tag (see metatag.proto):
+    a numeric value is only published when it moved more than spec.value away from the last published one,
+    a string value when it differs, and any tag is published again once spec.maxElapse ms passed since its
+    last publish. Tags whose spec has enable=False are always published.
+    Filtering does not record anything: call mark_published() once the publish went through, so a failed
+    publish doesn't hold the values back until maxElapse.
+    '''
+    def __init__(self, default_spec=None, specs=None):
+        self.default_spec = default_spec if default_spec is not None else metatag_pb2.CompressSpec(enable=False)
+        self.specs = dict(specs or {})
+        self.last_value = {}
+        self.last_time = {}
+        # reset() may come from the MQTT network thread while a publish cycle is filtering
+        self.lock = threading.Lock()
+
+    def set_spec(self, name, spec):
+        self.specs[name] = spec
+
+    def should_publish(self, name, value, timestamp):
+        spec = self.specs.get(name, self.default_spec)
+        if not spec.enable or name not in self.last_value:
+            return True
+        if spec.maxElapse > 0 and timestamp - self.last_time[name] >= spec.maxElapse:
+            return True
+        last = self.last_value[name]
+        if isinstance(value, (str, bytes)) or isinstance(last, (str, bytes)):
+            return value != last
+        return abs(value - last) > spec.value
+
+    def changed(self, names, values, timestamp=None):
+        """Indices of the tags that pass the filter at timestamp (UTC ms)."""
+        timestamp = now_ms() if timestamp is None else timestamp
+        with self.lock:
+            return [i for i, (name, value) in enumerate(zip(names, values))
+                    if self.should_publish(name, value, timestamp)]
+
+    def mark(self, names, values, timestamp=None):
+        """Record the values as published at timestamp (UTC ms)."""
+        timestamp = now_ms() if timestamp is None else timestamp
+        with self.lock:
+            for name, value in zip(names, values):
+                self.last_value[name] = value
+                self.last_time[name] = timestamp
+
+    def select(self, rows, timestamp=None):
+        """Filter rows in the dict format of create_serialized_value_sequence ('name', a value field, 'quality')."""
+        values = [row_value(row) for row in rows]
+        return [rows[i] for i in self.changed([row['name'] for row in rows], values, timestamp)]
+
+    def mark_published(self, rows, timestamp=None):
+        """mark() for rows in the format of select()."""
+        self.mark([row['name'] for row in rows], [row_value(row) for row in rows], timestamp)
+
+    def reset(self, name=None):
+        """Forget the last published values, so the next cycle publishes everything (e.g. after a reconnect)."""
+        with self.lock:
+            if name is None:
+                self.last_value.clear()
+                self.last_time.clear()
+            else:
+                self.last_value.pop(name, None)
+                self.last_time.pop(name, None)
+
+
+class DeadbandPublisher:
+    '''
+    Publishes rows through a DeadbandFilter to one state topic. Deltas (the tags outside their deadband) are
+    not retained, since a retained delta would replace the full state with the last cycle's changes. Instead
+    a full snapshot of all rows is published, retained, on the first publish, after reset() (call it from
+    on_connect) and every snapshot_interval_ms, so the retained message always holds every tag.
+    Works with a paho client or a ShardedPublisher (deltas split over the shards, the snapshot whole).
+    '''
+    def __init__(self, deadband, snapshot_interval_ms):
+        self.deadband = deadband
+        self.snapshot_interval_ms = snapshot_interval_ms
+        self.last_snapshot = None
+
+    def reset(self):
+        self.deadband.reset()
+        self.last_snapshot = None
+
+    def publish(self, client, topic, rows, serialize_function, qos=0, retain=True):
+        """Returns True once something was published, False when nothing changed or the publish failed."""
+        timestamp = now_ms()
+        snapshot = self.last_snapshot is None or timestamp - self.last_snapshot >= self.snapshot_interval_ms
+        if not snapshot:
+            rows = self.deadband.select(rows, timestamp)
+            if not rows:
+                return False
+        if hasattr(client, 'publish_rows'):
+            if snapshot:
+                published = client.publish(topic, serialize_function(rows), retain=retain)
+            else:
+                published = client.publish_rows(rows, serialize_function, topic)
+        else:
+            info = client.publish(topic, payload=serialize_function(rows), qos=qos, retain=retain and snapshot)
+            published = info.rc == mqtt.MQTT_ERR_SUCCESS
+        if published:
+            # only now, a failed publish leaves the values pending for the next cycle
+            self.deadband.mark_published(rows, timestamp)
+            if snapshot:
+                self.last_snapshot = timestamp
+        return published
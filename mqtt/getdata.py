@@ -1,10 +1,24 @@
+import os
+import time
+import threading
 import paho.mqtt.client as mqtt
 import pandas as pd
 import json
+from google.protobuf.message import DecodeError
+from mqttauto.mqtt.realdatatransfer import ValueSequenceDecoder
+from mqttauto.mqtt.ingest import IngestPipeline
+from mqttauto.mqtt.clocksync import default_clock
 
 # Load your initial dataset from a file
 file_path = './modified_file.csv'  # Specify the file path here
-df = pd.read_csv(file_path)
+target_date = '6/5/2024'  # Only the rows of this date take the received quantities
+
+# Ingest queue between the MQTT network thread and the worker: size and overflow policy
+# ('block', 'drop-oldest' or 'spill' to spill_path)
+queue_size = 100000
+overflow_policy = 'block'
+put_timeout = 10.0  # longest a full queue may hold up the network thread (keepalive is 60 s)
+spill_path = './ingest_spill.bin'
 
 # MQTT setup
 broker_address = "121.7.36.93"  # Add your broker address here
@@ -14,33 +28,236 @@ mqtt_username = "admin"  # Add your MQTT username here
 mqtt_password = "public"  # Add your MQTT password here
 
 
-def on_message(client, userdata, message):
-    print("Received message: ", str(message.payload.decode("utf-8")))
-    incoming_data = json.loads(message.payload)
-    update_needed = False
-
-    for item in incoming_data:
-        # Check if the material exists in the DataFrame and the date is 2024-06-05
-        condition = (df['warehouse_name'] == item['material']) & (df['date'] == '6/5/2024')
-        if condition.any():
-            # Update the DataFrame
-            df.loc[condition, 'storage'] = item['quantity']
-            update_needed = True
-            print(f"Updated {item['material']} storage on 2024-06-05 to {item['quantity']}")
-
-    # Save the DataFrame to a file if there were any updates
-    if update_needed:
-        df.to_csv(file_path, index=False)
-        print(f"DataFrame updated and saved to {file_path}")
-
-# MQTT client setup
-client = mqtt.Client("ClientName")  # Create new instance with a unique client name
-client.username_pw_set(mqtt_username, mqtt_password)  # Set username and password
-client.on_message = on_message  # Attach the message function
-client.connect(broker_address, port, 60)
-client.subscribe(topic)  # Subscribe to the topic
-client.loop_start()  # Start the loop
-
-input("Press Enter to stop the script...")  # Keeps the script running
-client.loop_stop()  # Stops the loop
-client.disconnect()  # Disconnect the client
\ No newline at end of file
+class FrameStore:
+    '''
+    The stock CSV in memory, with a (warehouse_name, date) -> row positions index so an update is a dict lookup
+    instead of a mask over the whole frame. Updates only mark the store dirty; a background thread writes the
+    file once no update came for `debounce` seconds, and at the latest `max_latency` seconds after the first
+    unsaved update, so a burst of messages costs one write. The file is written to a temporary name and
+    renamed over the original.
+    '''
+    def __init__(self, path, debounce=1.0, max_latency=10.0):
+        self.path = path
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.df = pd.read_csv(path)
+        self.index = self.df.groupby(['warehouse_name', 'date'], sort=False).indices
+        # values as received (int or float), so rewriting the file doesn't change untouched rows
+        self.storage = self.df['storage'].astype(object).to_numpy(copy=True)
+        self.first_dirty = None
+        self.last_update = None
+        self.updates = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def apply(self, items, date):
+        """Set storage of (item['material'], date) to item['quantity']; returns the number of matched items."""
+        return self.update([item['material'] for item in items], [item['quantity'] for item in items], date)
+
+    def update(self, materials, quantities, date):
+        """Columnar form of apply: storage of (materials[i], date) becomes quantities[i]."""
+        return self.update_many([(date, materials, quantities)])
+
+    def update_many(self, batch):
+        """Apply a batch of (date, materials, quantities) under one lock; returns the number of matches."""
+        matched = 0
+        with self.condition:
+            for date, materials, quantities in batch:
+                for material, quantity in zip(materials, quantities):
+                    positions = self.index.get((material, date))
+                    if positions is not None:
+                        self.storage[positions] = quantity
+                        matched += 1
+            if matched:
+                now = time.monotonic()
+                self.first_dirty = self.first_dirty or now
+                self.last_update = now
+                self.updates += matched
+                self.condition.notify()
+        return matched
+
+    def flush(self):
+        with self.condition:
+            if self.first_dirty is None:
+                return
+            frame = self.df.assign(storage=self.storage.copy())
+            updates, self.updates = self.updates, 0
+            self.first_dirty = self.last_update = None
+        # the file is written outside the lock, messages keep being applied meanwhile
+        temporary = self.path + '.tmp'
+        frame.to_csv(temporary, index=False)
+        os.replace(temporary, self.path)
+        print(f"DataFrame saved to {self.path} ({updates} updates)")
+
+    def _due(self):
+        # seconds until the next flush is due, None while clean
+        if self.first_dirty is None:
+            return None
+        now = time.monotonic()
+        return max(0.0, min(self.last_update + self.debounce, self.first_dirty + self.max_latency) - now)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self._due() != 0.0:
+                    self.condition.wait(self._due())
+                if not self.running:
+                    break
+            self.flush()
+        self.flush()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='frame-store-flusher', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stop the flusher; pending updates are written before it exits."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        else:
+            self.flush()
+
+
+_JSON_FIRST_BYTES = (b'[', b'{', b' ', b'\t', b'\r')
+
+
+def decode_json(payload, default_date=target_date):
+    items = json.loads(payload)
+    return default_date, [item['material'] for item in items], [item['quantity'] for item in items], None
+
+
+def decode_payload(payload, decoder, default_date=target_date):
+    """
+    (date, materials, quantities, timestamps) of a message: a JSON list of {'material', 'quantity'} items
+    (timestamps None), or a protobuf ValueSequence as sent by the publishers (realdatatransfer.py), whose tags
+    are the materials, whose 'date' tag, when present, gives the date, and whose values carry UTC ms timestamps.
+    """
+    # a ValueSequence starts with 0x0a ('\n', the key of its first value), so the raw first byte is checked:
+    # stripping it as whitespace could expose a length byte of 0x5b '[' or 0x7b '{'
+    if payload[:1] in _JSON_FIRST_BYTES:
+        return decode_json(payload, default_date)
+    try:
+        names, values, timestamps = decoder.decode_timed(payload)
+    except DecodeError:
+        # JSON with a leading newline
+        if payload.lstrip()[:1] in (b'[', b'{'):
+            return decode_json(payload, default_date)
+        raise
+    date = default_date
+    if 'date' in names:
+        i = names.index('date')
+        date = values[i]
+        names, values, timestamps = names[:i] + names[i + 1:], values[:i] + values[i + 1:], \
+            timestamps[:i] + timestamps[i + 1:]
+    return date, names, values, timestamps
+
+
+class Subscriber:
+    '''
+    MQTT side of the FrameStore. on_message only queues the raw payload (IngestPipeline, bounded, with the
+    given overflow policy); the worker takes micro-batches of up to max_batch messages, decodes them and
+    applies them to the store in one update_many call.
+    Timestamped values (UTC ms) older than the last one applied for their material are dropped before they
+    reach the store (replays, out-of-order messages), and so is the same value again at the same timestamp
+    (a QoS 1 redelivery); a different value in the same millisecond is applied. With max_age_ms, values older
+    than that on the server-aligned clock are dropped as well. Values without a timestamp are always applied.
+    '''
+    def __init__(self, store, max_batch=1024, maxsize=100000, policy='block', spill_path=None, put_timeout=None,
+                 max_age_ms=None, clock=default_clock):
+        self.store = store
+        self.failed = 0
+        self.stale = 0
+        self.max_age_ms = max_age_ms
+        self.clock = clock
+        # material -> (timestamp, value) of the last value applied; only the worker thread touches it
+        self.last_applied = {}
+        self.local = threading.local()
+        self.pipeline = IngestPipeline(self.apply, max_batch=max_batch, maxsize=maxsize, policy=policy,
+                                       spill_path=spill_path, put_timeout=put_timeout)
+
+    @property
+    def processed(self):
+        return self.pipeline.processed
+
+    def on_message(self, client, userdata, message):
+        self.pipeline.on_message(client, userdata, message)
+
+    def apply(self, payloads):
+        # a decoder per worker thread, it reuses one message object
+        decoder = getattr(self.local, 'decoder', None)
+        if decoder is None:
+            decoder = self.local.decoder = ValueSequenceDecoder()
+        batch = []
+        for payload in payloads:
+            try:
+                date, materials, quantities, timestamps = decode_payload(payload, decoder)
+            except Exception as e:
+                self.failed += 1
+                print(f"Failed to decode message: {e}")
+                continue
+            if timestamps is not None:
+                materials, quantities = self.fresh(materials, quantities, timestamps)
+            if materials:
+                batch.append((date, materials, quantities))
+        self.store.update_many(batch)
+
+    def fresh(self, materials, quantities, timestamps):
+        """The values not older than the last applied one of their material, nor a repeat of it at the same
+        timestamp (and within max_age_ms)."""
+        last_applied = self.last_applied
+        oldest = self.clock.now_ms() - self.max_age_ms if self.max_age_ms is not None else 0
+        kept_materials, kept_quantities = [], []
+        for material, quantity, timestamp in zip(materials, quantities, timestamps):
+            if timestamp:
+                last = last_applied.get(material)
+                if timestamp < oldest or last is not None and (timestamp < last[0] or (timestamp, quantity) == last):
+                    self.stale += 1
+                    continue
+                last_applied[material] = (timestamp, quantity)
+            kept_materials.append(material)
+            kept_quantities.append(quantity)
+        return kept_materials, kept_quantities
+
+    def metrics(self):
+        return dict(self.pipeline.metrics(), decode_failures=self.failed, stale_values=self.stale)
+
+    def start(self):
+        self.pipeline.start()
+
+    def close(self):
+        """Apply what is still queued, then stop the worker."""
+        self.pipeline.close()
+
+
+def main():
+    store = FrameStore(file_path)
+    store.start()
+    subscriber = Subscriber(store, maxsize=queue_size, policy=overflow_policy, spill_path=spill_path,
+                            put_timeout=put_timeout)
+    subscriber.start()
+
+    # MQTT client setup
+    client = mqtt.Client("ClientName")  # Create new instance with a unique client name
+    client.username_pw_set(mqtt_username, mqtt_password)  # Set username and password
+    client.on_message = subscriber.on_message  # Attach the message function
+    client.connect(broker_address, port, 60)
+    client.subscribe(topic)  # Subscribe to the topic
+    client.loop_start()  # Start the loop
+
+    try:
+        input("Press Enter to stop the script...")  # Keeps the script running
+    finally:
+        client.loop_stop()  # Stops the loop
+        client.disconnect()  # Disconnect the client
+        subscriber.close()
+        store.close()
+        print(f"Ingest: {subscriber.metrics()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import os
+import time
+import struct
+import threading
+import collections
+
+POLICIES = ('block', 'drop-oldest', 'spill')
+
+# spill record: enqueue time (monotonic seconds), payload length, payload
+_RECORD = struct.Struct('<dI')
+
+
+class IngestQueue:
+    '''
+    Bounded FIFO of (enqueue time, payload) between the MQTT network thread and the workers. When `maxsize`
+    payloads are held in memory, the overflow policy decides:
+      'block'        put() waits for room (at most put_timeout seconds, then the payload is dropped); this
+                     pushes back on the broker connection, so keep put_timeout below the keepalive
+      'drop-oldest'  the oldest queued payload is dropped to make room
+      'spill'        the payload is appended to spill_path and read back in order once the memory part drained
+    '''
+    def __init__(self, maxsize=10000, policy='block', spill_path=None, put_timeout=None):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown overflow policy {policy!r}, expected one of {POLICIES}')
+        if policy == 'spill' and spill_path is None:
+            raise ValueError("the 'spill' policy needs a spill_path")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill_path = spill_path
+        self.put_timeout = put_timeout
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.spill_writer = None
+        self.spill_reader = None
+        self.spill_pending = 0
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.items) + self.spill_pending
+
+    def put(self, payload):
+        """Queue a payload; returns False when it was dropped (block policy timing out, or after close())."""
+        now = time.monotonic()
+        with self.condition:
+            if self.closed:
+                self.dropped += 1
+                return False
+            if self.spill_pending or len(self.items) >= self.maxsize:
+                if self.policy == 'spill':
+                    # once spilling, everything goes to disk until the spill is read back, to keep the order
+                    self._spill(now, payload)
+                    self.enqueued += 1
+                    self.condition.notify()
+                    return True
+                if self.policy == 'drop-oldest':
+                    self.items.popleft()
+                    self.dropped += 1
+                elif not self.condition.wait_for(lambda: len(self.items) < self.maxsize or self.closed,
+                                                 self.put_timeout) or self.closed:
+                    self.dropped += 1
+                    return False
+            self.items.append((now, payload))
+            self.enqueued += 1
+            self.condition.notify()
+        return True
+
+    def get_batch(self, max_items=1024, timeout=None):
+        """Up to max_items (enqueue time, payload) pairs, oldest first. Waits for the first one at most
+        `timeout` seconds; returns [] on timeout or once the queue is closed and empty."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self) or self.closed, timeout):
+                return []
+            batch = []
+            while self.items and len(batch) < max_items:
+                batch.append(self.items.popleft())
+            if not self.items and self.spill_pending and len(batch) < max_items:
+                batch.extend(self._unspill(max_items - len(batch)))
+            self.dequeued += len(batch)
+            # room for producers blocked in put()
+            self.condition.notify_all()
+            return batch
+
+    def oldest_age(self):
+        """Seconds the oldest payload in memory has been waiting."""
+        with self.condition:
+            return time.monotonic() - self.items[0][0] if self.items else 0.0
+
+    def close(self):
+        """Refuse new payloads and wake everyone up; what is queued can still be taken."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _spill(self, timestamp, payload):
+        if self.spill_writer is None:
+            self.spill_writer = open(self.spill_path, 'w+b')
+            self.spill_reader = open(self.spill_path, 'rb')
+        self.spill_writer.write(_RECORD.pack(timestamp, len(payload)))
+        self.spill_writer.write(payload)
+        self.spill_pending += 1
+        self.spilled += 1
+
+    def _unspill(self, count):
+        self.spill_writer.flush()
+        records = []
+        for _ in range(min(count, self.spill_pending)):
+            timestamp, length = _RECORD.unpack(self.spill_reader.read(_RECORD.size))
+            records.append((timestamp, self.spill_reader.read(length)))
+        self.spill_pending -= len(records)
+        if not self.spill_pending:
+            # everything read back: start the file over instead of letting it grow
+            self.spill_writer.seek(0)
+            self.spill_writer.truncate()
+            self.spill_reader.seek(0)
+        return records
+
+    def remove_spill(self):
+        for file in (self.spill_writer, self.spill_reader):
+            if file is not None:
+                file.close()
+        self.spill_writer = self.spill_reader = None
+        if self.spill_path is not None and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+class IngestPipeline:
+    '''
+    on_message only puts the raw payload into an IngestQueue; `workers` threads take micro-batches of up to
+    max_batch payloads and call handler(payloads). With more than one worker, batches may be applied out of
+    order, so keep one worker when later messages must win over earlier ones.
+    metrics() reports queue depth, lag (age of the oldest queued payload, and queue time of the last batch),
+    and the enqueued / processed / dropped / spilled / failed counters.
+    '''
+    def __init__(self, handler, workers=1, max_batch=1024, maxsize=10000, policy='block', spill_path=None,
+                 put_timeout=None):
+        self.handler = handler
+        self.workers = workers
+        self.max_batch = max_batch
+        self.queue = IngestQueue(maxsize, policy, spill_path, put_timeout)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed_batches = 0
+        self.batches = 0
+        self.last_batch_lag = 0.0
+
+    def on_message(self, client, userdata, message):
+        self.queue.put(message.payload)
+
+    def _run(self):
+        while True:
+            batch = self.queue.get_batch(self.max_batch)
+            if not batch:
+                return
+            try:
+                self.handler([payload for _, payload in batch])
+            except Exception as e:
+                with self.lock:
+                    self.failed_batches += 1
+                print(f"Failed to process {len(batch)} messages: {e}")
+            with self.lock:
+                self.processed += len(batch)
+                self.batches += 1
+                self.last_batch_lag = time.monotonic() - batch[0][0]
+
+    def start(self):
+        self.threads = [threading.Thread(target=self._run, name=f'ingest-worker-{i}', daemon=True)
+                        for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def close(self):
+        """Stop taking messages, process what is queued, then stop the workers."""
+        self.queue.close()
+        for thread in self.threads:
+            thread.join()
+        self.queue.remove_spill()
+
+    def metrics(self):
+        queue = self.queue
+        with self.lock:
+            return {
+                'depth': len(queue),
+                'spill_depth': queue.spill_pending,
+                'lag_seconds': queue.oldest_age(),
+                'last_batch_lag_seconds': self.last_batch_lag,
+                'enqueued': queue.enqueued,
+                'processed': self.processed,
+                'dropped': queue.dropped,
+                'spilled': queue.spilled,
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+            }
@@ -30,34 +30,25 @@
 
 
 import binascii
-import metatag_pb2
+from mqttauto.mqtt import metatag_pb2
+from mqttauto.mqtt.tagregistry import make_metatag
 
-def create_serialized_metatag(tags):
+def create_serialized_metatag(tags, verbose=False):
+    """Hex of the serialized MetaTagSequence of tag dicts (name, showName, description, type as a ValueType
+    or its name, optionally the compress_* fields), each built by tagregistry.make_metatag. To publish the
+    definitions, TagRegistry.serialized() / serialized_diff() cache the sequence instead of rebuilding it."""
     # Create a MetaTagSequence
-    metatag = metatag_pb2.MetaTagSequence()
-
-    # Iterate over each tag data in the list
-    for tag_data in tags:
-        # Add a MetaTag based on provided inputs
-        metatag_tag = metatag.tags.add()
-        metatag_tag.version = 1  # Assuming version is fixed
-        metatag_tag.name = tag_data['name']
-        metatag_tag.showName = tag_data['showName']
-        metatag_tag.description = tag_data['description']
-        metatag_tag.type = tag_data['type']
+    metatag = metatag_pb2.MetaTagSequence(tags=[make_metatag(tag_data) for tag_data in tags])
 
     # Serialize the MetaTagSequence
     serialized_data = metatag.SerializeToString()
-
-    # Optional: Print the entire MetaTagSequence and the serialized data in hexadecimal format
-    print("Serialized MetaTagSequence:")
-    print(metatag)
-    print("Hexadecimal representation of serialized data:")
-    print(binascii.hexlify(serialized_data))
     hex_data = binascii.hexlify(serialized_data).decode('utf-8')
 
-    # Print the hexadecimal data
-    print("Hexadecimal representation of serialized data:")
-    print(hex_data)
+    # Optional: Print the entire MetaTagSequence and the serialized data in hexadecimal format
+    if verbose:
+        print("Serialized MetaTagSequence:")
+        print(metatag)
+        print("Hexadecimal representation of serialized data:")
+        print(hex_data)
 
     return hex_data
@@ -1,6 +1,10 @@
-import csv
+import argparse
 import paho.mqtt.client as mqtt
-from mqttauto.mqtt.realdatatransfer import create_serialized_value_sequence
+from mqttauto.mqtt.compression import DeadbandFilter, DeadbandPublisher
+from mqttauto.mqtt.publisher import ShardedPublisher, client_id_prefix, serialize_rows
+from mqttauto.mqtt.tagregistry import TagRegistry, DEFAULT_PATH
+from mqttauto.mqtt.replay import load_replay_index, replay_delays
+from mqttauto.mqtt import metatag_pb2
 import time
 
 # MQTT broker details
@@ -11,57 +15,114 @@ topic = "/239f67e0-0b85-11ef-b05c-7df9e9869244/mltest/mltest/rtdvalue/report"
 qos = 0  # Quality of Service level 0
 retain = True  # Retain flag
 
-# CSV File path
-csv_file_path =  'C:\\Users\\shimu\\Desktop\\朱佳楠\\AI\\train_data1.csv'
+# Deadband compression: unchanged tags are not re-sent, every tag is forced out at least every 5 minutes
+compress_spec = metatag_pb2.CompressSpec(enable=True, value=0.0, maxElapse=5 * 60 * 1000)
+deadband = DeadbandFilter(compress_spec)
+deadband_publisher = DeadbandPublisher(deadband, compress_spec.maxElapse)
+
+# ValueType of every registered tag, filled from the tag registry in main()
+value_types = {}
 
 def on_connect(client, userdata, flags, rc):
     print("Connected with result code " + str(rc))
+    # publish the full state again after (re)connecting
+    deadband_publisher.reset()
 
 def on_publish(client, userdata, mid):
     print("Message Published.")
 
 def publish_message(client, topic, data, serialize_function):
-    # Call the appropriate serialization function
-    encoded_message = serialize_function(data)
-    client.publish(topic, payload=encoded_message, qos=qos, retain=retain)
+    # Only tags outside their deadband (or past maxElapse) go into the payload, not retained; a full retained
+    # snapshot goes out after connecting and every maxElapse. With shards the deltas are split over the
+    # connections (each payload with the tags hashed to it and the date)
+    return deadband_publisher.publish(client, topic, data, serialize_function, qos=qos, retain=retain)
+
+def serialize_values(rows):
+    # each value goes in the RtdValue field of its registered ValueType; the columnar encoder builds the same
+    # bytes as create_serialized_value_sequence without protobuf objects or logging
+    return serialize_rows(rows, value_types)
+
+def replay(client, index, mode='interval', interval=30, speed=1.0):
+    # deadlines are taken from a monotonic clock, so publish time does not add drift to the schedule
+    deadline = time.monotonic()
+    for (count, rows, date), delay in zip(index, replay_delays(index, mode, interval, speed)):
+        deadline += delay
+        wait = deadline - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        # Append the common date for the current count
+        data_to_publish = rows + [{'name': "date", 'strVal': date, 'quality': 8}]
+        print(f"Publishing data for count: {count}")
+        publish_message(client, topic, data_to_publish, serialize_values)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a stock CSV (count, date, warehouse name, storage) over MQTT.')
+    parser.add_argument('--csv', required=True,
+                        help='CSV file to replay: count, date, warehouse name, storage columns, or the layout of '
+                             'train_data.csv (warehouse_name, date, storage)')
+    parser.add_argument('--broker', default=broker_address)
+    parser.add_argument('--port', type=int, default=port)
+    parser.add_argument('--topic', default=topic)
+    parser.add_argument('--mode', choices=['interval', 'realtime', 'fast'], default='interval',
+                        help='interval: fixed wait between counts, realtime: follow the dates, fast: no wait')
+    parser.add_argument('--interval', type=float, default=30, help='seconds between counts in interval mode')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='simulated seconds per real second in realtime mode (86400/30 replays a day every 30 s)')
+    parser.add_argument('--no-deadband', action='store_true', help='publish every tag on every count')
+    parser.add_argument('--tags', default=DEFAULT_PATH,
+                        help='tag definitions (CSV or YAML): ValueTypes pick the value fields, CompressSpecs override '
+                             'the default deadband')
+    parser.add_argument('--qos', type=int, choices=[0, 1], default=qos)
+    parser.add_argument('--shards', type=int, default=1,
+                        help='spread the tags over this many connections per broker (consistent hash of the tag name)')
+    parser.add_argument('--extra-brokers', nargs='*', default=[], metavar='HOST:PORT',
+                        help='more brokers to shard over, besides --broker')
+    parser.add_argument('--window', type=int, default=100, help='messages in flight per connection when sharding')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global topic, qos
+    args = parse_args(argv)
+    topic = args.topic
+    qos = args.qos
+    tags = TagRegistry(args.tags)
+    value_types.update(tags.value_types())
+    if args.no_deadband:
+        deadband.default_spec = metatag_pb2.CompressSpec(enable=False)
+    else:
+        for name, spec in tags.compress_specs().items():
+            deadband.set_spec(name, spec)
+    index = load_replay_index(args.csv)
+
+    if args.shards > 1 or args.extra_brokers:
+        brokers = [(args.broker, args.port)] + [(host, int(port)) for host, port in
+                                                (address.rsplit(':', 1) for address in args.extra_brokers)]
+        publisher = ShardedPublisher([broker for broker in brokers for _ in range(args.shards)], args.topic,
+                                     client_id_prefix('mqttauto-mqttsend'), qos=args.qos, retain=retain,
+                                     window=args.window, on_connect=on_connect)
+        publisher.connect(timeout=10)
+        try:
+            replay(publisher, index, args.mode, args.interval, args.speed)
+        finally:
+            publisher.close()
+            print(publisher.stats())
+        return
 
-def main():
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_publish = on_publish
 
-    client.connect(broker_address, port, 60)
+    client.connect(args.broker, args.port, 60)
     client.loop_start()  # Start a non-blocking loop
 
     try:
-        current_count = 1
-        max_count_found = False
-        while not max_count_found:
-            with open(csv_file_path, mode='r') as file:
-                reader = csv.DictReader(file)
-                data_to_publish = []
-                date_for_current_count = ""
-                for row in reader:
-                    if int(row['count']) == current_count:
-                        data_to_publish.append({
-                            'name': row['warehouse name'],
-                            'dblVal': int(row['storage']),
-                            'quality': int(row['count']),
-                        })
-                        date_for_current_count = row['date']  # Capture the date
-                if data_to_publish:
-                    # Append the common date for the current count
-                    data_to_publish.append({'name': "date", 'strVal': date_for_current_count, 'quality': 8})
-                    print(f"Publishing data for count: {current_count}")
-                    publish_message(client, topic, data_to_publish, create_serialized_value_sequence)
-                    current_count += 1  # Increment to the next count
-                else:
-                    max_count_found = True  # Exit the loop if no data for current count
-            time.sleep(30)  # Wait for 5 seconds before the next publish
+        replay(client, index, args.mode, args.interval, args.speed)
     finally:
         client.loop_stop()  # Stop the loop
         client.disconnect()  # Disconnect from the broker
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
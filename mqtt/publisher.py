@@ -0,0 +1,247 @@
+import bisect
+import os
+import socket
+import hashlib
+import threading
+import time
+import collections
+import numpy as np
+import paho.mqtt.client as mqtt
+from mqttauto.mqtt.realdatatransfer import encode_value_sequence, row_type, row_value
+from mqttauto.mqtt.clocksync import now_ms
+
+
+def client_id_prefix(program):
+    """Client id prefix unique to this process: program name, host name and process id."""
+    return f'{program}-{socket.gethostname()}-{os.getpid()}'
+
+
+def serialize_rows(rows, types=None):
+    """Rows in the format of create_serialized_value_sequence, through the columnar encoder without logging;
+    types as in create_serialized_value_sequence."""
+    names = [row['name'] for row in rows]
+    values = [row_value(row) for row in rows]
+    qualities = [row.get('quality', 0) for row in rows]
+    # stamped like create_serialized_value_sequence: a row's own 'timeStamp', else the publish time
+    timestamp = now_ms()
+    timestamps = [row.get('timeStamp') or timestamp for row in rows]
+    return encode_value_sequence(names, values, qualities, timestamps, [row_type(row, types) for row in rows])
+
+
+class HashRing:
+    '''Consistent hash of keys onto nodes, `replicas` virtual points per node: adding or removing a node only
+    moves the keys of that node.'''
+    def __init__(self, nodes, replicas=64):
+        self.replicas = replicas
+        self.points = []
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f'{node}#{i}')
+            position = bisect.bisect(self.points, point)
+            self.points.insert(position, point)
+            self.nodes.insert(position, node)
+
+    def remove(self, node):
+        keep = [i for i, n in enumerate(self.nodes) if n != node]
+        self.points = [self.points[i] for i in keep]
+        self.nodes = [self.nodes[i] for i in keep]
+
+    def node(self, key):
+        position = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.nodes[position]
+
+
+class Shard:
+    '''
+    One broker connection of a ShardedPublisher. The session is persistent (clean_session=False, fixed
+    client id), so QoS 1 messages still unacknowledged after a disconnect are resent when paho reconnects.
+    At most `window` messages are in flight; publish() waits for a free slot (backpressure) up to
+    window_timeout seconds, then drops the message, so an unreachable broker can't block the caller for good.
+    The time from publish to on_publish (PUBACK for QoS 1) is kept per message. on_connect, when given, is
+    called like a paho on_connect callback after every successful (re)connect.
+    '''
+    def __init__(self, name, host, port, client_id, window=100, window_timeout=10.0, keepalive=60,
+                 username=None, password=None, latency_samples=10000, on_connect=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.window_timeout = window_timeout
+        self.on_connect = on_connect
+        self.slots = threading.BoundedSemaphore(window)
+        self.lock = threading.Lock()
+        self.sent_at = {}
+        self.early_acks = {}
+        self.latencies = collections.deque(maxlen=latency_samples)
+        self.connected = threading.Event()
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.connects = 0
+        self.client = mqtt.Client(client_id, clean_session=False)
+        if username is not None:
+            self.client.username_pw_set(username, password)
+        self.client.max_inflight_messages_set(window)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+
+    def _on_connect(self, client, userdata, flags, rc):
+        print(f"Shard {self.name} connected with result code {rc}, session present: {flags.get('session present')}")
+        if rc == 0:
+            self.connects += 1
+            self.connected.set()
+            if self.on_connect is not None:
+                self.on_connect(client, userdata, flags, rc)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected.clear()
+        if rc != 0:
+            print(f"Shard {self.name} lost the connection ({rc}), reconnecting")
+
+    def _on_publish(self, client, userdata, mid):
+        now = time.monotonic()
+        with self.lock:
+            sent_at = self.sent_at.pop(mid, None)
+            if sent_at is None:
+                # acknowledged before publish() got to record it (QoS 0 is "acked" once written)
+                self.early_acks[mid] = now
+                return
+            self.latencies.append(now - sent_at)
+            self.acked += 1
+        self.slots.release()
+
+    def connect(self):
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        self.client.loop_start()
+
+    def publish(self, topic, payload, qos, retain):
+        if not self.slots.acquire(timeout=self.window_timeout):
+            self.dropped += 1
+            return False
+        sent_at = time.monotonic()
+        # not under self.lock: paho holds its message mutex while calling on_publish, which takes self.lock
+        info = self.client.publish(topic, payload=payload, qos=qos, retain=retain)
+        if qos == 0 and info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # QoS 0 is not queued while disconnected, no acknowledgement will free the slot
+            self.dropped += 1
+            self.slots.release()
+            return False
+        with self.lock:
+            self.sent += 1
+            acked_at = self.early_acks.pop(info.mid, None)
+            if acked_at is None:
+                self.sent_at[info.mid] = sent_at
+            else:
+                self.latencies.append(acked_at - sent_at)
+                self.acked += 1
+        if acked_at is not None:
+            self.slots.release()
+        return True
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.sent_at)
+
+    def stats(self):
+        with self.lock:
+            latencies = np.asarray(self.latencies) * 1e3
+            in_flight = len(self.sent_at)
+        return {
+            'connected': self.connected.is_set(),
+            'connects': self.connects,
+            'sent': self.sent,
+            'acked': self.acked,
+            'in_flight': in_flight,
+            'dropped': self.dropped,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        }
+
+    def close(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while self.in_flight() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class ShardedPublisher:
+    '''
+    Spreads the tags of every publish over several MQTT connections (to one broker or several) by a
+    consistent hash of the tag name, so each tag always goes through the same connection and keeps its order.
+    Each shard gets one payload holding its tags plus the `broadcast` tags (the date goes with every part).
+    Those parts are never retained, a retained message would only hold the tags of the last shard; `retain`
+    applies to whole payloads sent with publish().
+    endpoints: [(host, port)], repeat an endpoint for several connections to the same broker.
+    client_id_prefix must be unique per process: the sessions are persistent, so two publishers sharing client
+    ids (e.g. start.py and mqttsend.py, or two hosts) would keep disconnecting each other; see client_id_prefix().
+    '''
+    def __init__(self, endpoints, topic, client_id_prefix, qos=1, retain=False, window=100, window_timeout=10.0,
+                 broadcast=('date',), replicas=64, **client_options):
+        self.topic = topic
+        self.qos = qos
+        self.retain = retain
+        self.broadcast = set(broadcast)
+        self.shards = {}
+        for i, (host, port) in enumerate(endpoints):
+            name = f'{host}:{port}/{i}'
+            self.shards[name] = Shard(name, host, port, f'{client_id_prefix}-{i}', window, window_timeout,
+                                      **client_options)
+        self.ring = HashRing(self.shards, replicas)
+        self.routes = {}
+
+    def shard_for(self, name):
+        shard = self.routes.get(name)
+        if shard is None:
+            shard = self.routes[name] = self.shards[self.ring.node(name)]
+        return shard
+
+    def connect(self, timeout=None):
+        """Connect every shard in the background; with a timeout, wait until all are connected."""
+        for shard in self.shards.values():
+            shard.connect()
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+            for shard in self.shards.values():
+                shard.connected.wait(max(0.0, deadline - time.monotonic()))
+
+    def publish(self, topic, payload, qos=None, retain=None):
+        """Publish one payload as it is, over the shard its topic hashes to."""
+        return self.shard_for(topic).publish(topic, payload, self.qos if qos is None else qos,
+                                             self.retain if retain is None else retain)
+
+    def publish_rows(self, rows, serialize_function=serialize_rows, topic=None):
+        """Split rows (create_serialized_value_sequence format) by shard and publish one payload per shard,
+        not retained."""
+        parts = {}
+        shared = []
+        for row in rows:
+            if row['name'] in self.broadcast:
+                shared.append(row)
+            else:
+                parts.setdefault(self.shard_for(row['name']), []).append(row)
+        if not parts and shared:
+            # only broadcast tags changed (e.g. the date alone): one shard carries them
+            parts[self.shard_for(shared[0]['name'])] = []
+        published = True
+        for shard, part in parts.items():
+            published &= shard.publish(topic or self.topic, serialize_function(part + shared), self.qos, False)
+        return published
+
+    def stats(self):
+        return {name: shard.stats() for name, shard in self.shards.items()}
+
+    def close(self, timeout=10.0):
+        """Wait up to `timeout` seconds for the in-flight messages to be acknowledged, then disconnect."""
+        for shard in self.shards.values():
+            shard.close(timeout)
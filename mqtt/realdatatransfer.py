@@ -23,24 +23,79 @@
 # print(binascii.hexlify(serialized_data))
 
 import binascii
+import struct
+import numpy as np
 from mqttauto.mqtt import metatag_pb2
+from mqttauto.mqtt.clocksync import now_ms
 
 
-def create_serialized_value_sequence(values):
+# RtdValue field of a value: rows may name it ('intVal', 'boolVal', 'bytVal', a non-empty 'strVal', else
+# 'dblVal'); a generic 'dblVal' / 'strVal' row takes the field of the ValueType registered for its tag
+EXPLICIT_FIELDS = ('intVal', 'boolVal', 'bytVal')
+FIELD_TYPES = {'intVal': metatag_pb2.Integer, 'boolVal': metatag_pb2.Boolean, 'bytVal': metatag_pb2.Bytes}
+
+
+def row_value(row):
+    """The value of a row in the create_serialized_value_sequence format, whichever field carries it."""
+    if row.get('strVal', '') != '':
+        return row['strVal']
+    for field in EXPLICIT_FIELDS:
+        if field in row:
+            return row[field]
+    return row.get('dblVal', 0.0)
+
+
+def row_type(row, types=None):
+    """ValueType to encode a row with: the one its field names, else the registered one of its tag (or None)."""
+    for field in EXPLICIT_FIELDS:
+        if field in row:
+            return FIELD_TYPES[field]
+    return types.get(row['name']) if types else None
+
+
+def value_field(value, value_type=None):
+    """
+    RtdValue field for a value of the given ValueType. The registered type is used when the value fits it
+    (an Integer tag holding 12.5 still goes as dblVal, nothing is rounded away); otherwise, and for
+    unregistered tags, strings go as strVal, bytes as bytVal and any number as dblVal. A Boolean tag takes
+    bools and the integers 0 and 1; any other integer goes as intVal, so a stray 5 isn't sent as True.
+    """
+    if value_type == metatag_pb2.Integer and not isinstance(value, (str, bytes)) and float(value).is_integer() \
+            and -2 ** 63 <= value < 2 ** 63:
+        return 'intVal'
+    if value_type == metatag_pb2.Boolean:
+        if isinstance(value, (bool, np.bool_)) or (isinstance(value, (int, np.integer)) and value in (0, 1)):
+            return 'boolVal'
+        if isinstance(value, (int, np.integer)) and -2 ** 63 <= value < 2 ** 63:
+            return 'intVal'
+    if isinstance(value, str):
+        return 'strVal'
+    if isinstance(value, bytes):
+        return 'bytVal'
+    return 'dblVal'
+
+
+_CONVERT = {'intVal': int, 'dblVal': float, 'boolVal': bool, 'strVal': str, 'bytVal': bytes}
+
+
+def create_serialized_value_sequence(values, types=None):
+    """types: optional {tag name: ValueType} (e.g. TagRegistry.value_types()) choosing each value's field."""
     # Create a ValueSequence
     namedvalue = metatag_pb2.ValueSequence()
+    # Values without their own 'timeStamp' are stamped with the publish time (UTC ms, server-aligned clock)
+    timestamp = now_ms()
 
     # Iterate over each value data in the list
     for value_data in values:
         # Add a Value to the sequence
         rtdvalue = namedvalue.values.add()
         rtdvalue.name = value_data['name']
-        if 'strVal' in value_data and value_data['strVal'] != "":
-            rtdvalue.value.strVal = value_data['strVal']
-        else:
-            rtdvalue.value.dblVal = value_data['dblVal']
+        value = row_value(value_data)
+        field = value_field(value, row_type(value_data, types))
+        setattr(rtdvalue.value, field, _CONVERT[field](value))
 
         rtdvalue.value.quality = value_data['quality']
+        rtdvalue.value.timeStamp = value_data.get('timeStamp') or timestamp
 
     # Serialize the ValueSequence
     serialized_data = namedvalue.SerializeToString()
@@ -54,3 +109,187 @@ def create_serialized_value_sequence(values):
     return serialized_data
 
 
+
+
+# Hand-rolled protobuf wire format for ValueSequence, so large batches skip building one message object per tag.
+# Field keys are (field_number << 3) | wire_type, see metatag.proto.
+_NAMED_VALUE_KEY = b'\x0a'  # ValueSequence.values, length-delimited
+_NAME_KEY = b'\x0a'  # NamedValue.name, length-delimited
+_VALUE_KEY = b'\x12'  # NamedValue.value, length-delimited
+_TIMESTAMP_KEY = b'\x08'  # RtdValue.timeStamp, varint
+_QUALITY_KEY = b'\x10'  # RtdValue.quality, varint
+_INT_KEY = b'\x18'  # RtdValue.intVal, varint
+_DBL_KEY = b'\x21'  # RtdValue.dblVal, 64-bit
+_BOOL_KEY = b'\x28'  # RtdValue.boolVal, varint
+_STR_KEY = b'\x32'  # RtdValue.strVal, length-delimited
+_BYTES_KEY = b'\x3a'  # RtdValue.bytVal, length-delimited
+_INTEGER = metatag_pb2.Integer
+
+
+def encode_varint(value):
+    # int64 fields encode negative numbers as 10-byte two's complement
+    if value < 0:
+        value += 1 << 64
+    if value < 0x80:
+        return bytes((value,))
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+class ValueSequenceEncoder:
+    '''
+    Columnar encoder for ValueSequence payloads: names, values, qualities and optional UTC millisecond
+    timestamps are parallel arrays, and so are the optional ValueTypes picking each value's field (see
+    value_field); without them strings are sent as strVal, everything else as dblVal, like
+    create_serialized_value_sequence. The output is byte-identical to ValueSequence.SerializeToString().
+    The encoded name field of every tag and the varints of the quality codes are cached across calls.
+    '''
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self._names = {}
+        self._qualities = {}
+
+    def _name(self, name):
+        encoded = self._names.get(name)
+        if encoded is None:
+            raw = name.encode('utf-8')
+            encoded = self._names[name] = _NAME_KEY + encode_varint(len(raw)) + raw if raw else b''
+        return encoded
+
+    def _quality(self, quality):
+        encoded = self._qualities.get(quality)
+        if encoded is None:
+            # proto3 leaves out fields holding the default value
+            encoded = self._qualities[quality] = _QUALITY_KEY + encode_varint(quality) if quality else b''
+        return encoded
+
+    def encode(self, names, values, qualities, timestamps=None, types=None):
+        if types is not None:
+            encoded_values = self._encode_typed(values, types)
+        else:
+            encoded_values = self._encode_untyped(values)
+        qualities = np.broadcast_to(np.asarray(qualities, dtype=np.int64), (len(names),)).tolist()
+        if timestamps is not None:
+            timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.int64), (len(names),)).tolist()
+
+        parts = []
+        # a publish usually stamps every tag with the same time, its varint is encoded once
+        last_timestamp, encoded_timestamp = 0, b''
+        for i, name in enumerate(names):
+            timestamp = timestamps[i] if timestamps is not None else 0
+            if timestamp != last_timestamp:
+                last_timestamp = timestamp
+                encoded_timestamp = _TIMESTAMP_KEY + encode_varint(timestamp) if timestamp else b''
+            rtd = encoded_timestamp + self._quality(qualities[i]) + encoded_values[i]
+            named = self._name(name) + _VALUE_KEY + encode_varint(len(rtd)) + rtd
+            parts.append(_NAMED_VALUE_KEY + encode_varint(len(named)))
+            parts.append(named)
+        serialized_data = b''.join(parts)
+
+        if self.verbose:
+            print("Serialized ValueSequence:")
+            print(metatag_pb2.ValueSequence.FromString(serialized_data))
+            print("Hexadecimal representation of serialized data:")
+            print(binascii.hexlify(serialized_data))
+        return serialized_data
+
+    def _encode_untyped(self, values):
+        if not isinstance(values, np.ndarray):
+            array = np.asarray(values)
+            # keep mixed lists as python objects, numpy would turn the numbers into strings
+            values = array if array.dtype.kind in 'iufb' else np.asarray(values, dtype=object)
+        if values.dtype.kind in 'iufb':
+            # all numeric: pack every double in one call and slice it per tag
+            doubles = values.astype('<f8').tobytes()
+            return [_DBL_KEY + doubles[8 * i:8 * i + 8] for i in range(len(values))]
+        return [self._encode_value(value) for value in values]
+
+    def _encode_typed(self, values, types):
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        encoded_values = []
+        for value, value_type in zip(values, types):
+            # python ints of Integer tags (stock counts) skip the checks of value_field
+            if value_type == _INTEGER and type(value) is int and 0 <= value < 1 << 63:
+                encoded_values.append(_INT_KEY + encode_varint(value))
+            else:
+                encoded_values.append(self._encode_value(value, value_type))
+        return encoded_values
+
+    @staticmethod
+    def _encode_value(value, value_type=None):
+        field = value_field(value, value_type)
+        if field == 'dblVal':
+            return _DBL_KEY + struct.pack('<d', float(value))
+        if field == 'intVal':
+            return _INT_KEY + encode_varint(int(value))
+        if field == 'strVal':
+            raw = value.encode('utf-8')
+            return _STR_KEY + encode_varint(len(raw)) + raw
+        if field == 'boolVal':
+            return _BOOL_KEY + (b'\x01' if value else b'\x00')
+        return _BYTES_KEY + encode_varint(len(value)) + value
+
+
+_default_encoder = ValueSequenceEncoder()
+
+
+def encode_value_sequence(names, values, qualities, timestamps=None, types=None):
+    """Columnar, non-logging counterpart of create_serialized_value_sequence using a shared encoder."""
+    return _default_encoder.encode(names, values, qualities, timestamps, types)
+
+
+class ValueSequenceDecoder:
+    '''
+    Decodes ValueSequence payloads back into parallel lists (names, values, qualities, timestamps); a value
+    is whichever field of the RtdValue oneof is set (None when unset). One message object is reused for
+    every payload and parsing runs in the protobuf runtime; what costs is reading the fields from python,
+    so decode_values() skips qualities and timestamps.
+    '''
+    def __init__(self):
+        self.message = metatag_pb2.ValueSequence()
+
+    def decode_values(self, payload):
+        self.message.ParseFromString(payload)
+        names = []
+        values = []
+        for named in self.message.values:
+            rtd = named.value
+            # the publishers send dblVal or intVal: a non-zero one of those is the set field (the others read
+            # as zero), only zeros and the other types need WhichOneof
+            value = rtd.dblVal or rtd.intVal
+            if value == 0:
+                field = rtd.WhichOneof('value')
+                value = getattr(rtd, field) if field is not None else None
+            names.append(named.name)
+            values.append(value)
+        return names, values
+
+    def decode_timed(self, payload):
+        """decode_values plus the timestamps (0 where a value carries none), in the same pass."""
+        self.message.ParseFromString(payload)
+        names = []
+        values = []
+        timestamps = []
+        for named in self.message.values:
+            rtd = named.value
+            value = rtd.dblVal or rtd.intVal
+            if value == 0:
+                field = rtd.WhichOneof('value')
+                value = getattr(rtd, field) if field is not None else None
+            names.append(named.name)
+            values.append(value)
+            timestamps.append(rtd.timeStamp)
+        return names, values, timestamps
+
+    def decode(self, payload):
+        names, values = self.decode_values(payload)
+        rtds = [named.value for named in self.message.values]
+        return names, values, [rtd.quality for rtd in rtds], [rtd.timeStamp for rtd in rtds]
+
+    def decode_batch(self, payloads):
+        return [self.decode(payload) for payload in payloads]
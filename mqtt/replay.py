@@ -0,0 +1,48 @@
+import csv
+from datetime import datetime
+
+
+def load_replay_index(path):
+    """Read the CSV once and group its rows by 'count'.
+    Returns [(count, rows, date)] in count order, rows in the format of create_serialized_value_sequence.
+    Takes (count, date, warehouse name, storage) columns, or the training data layout of train_data.csv
+    (warehouse_name, date, storage, ...), whose days are numbered 1, 2, ... in date order as counts."""
+    groups = {}
+    dates = {}
+    with open(path, mode='r', newline='') as file:
+        reader = csv.DictReader(file)
+        columns = reader.fieldnames or []
+        if {'count', 'date', 'warehouse name', 'storage'} <= set(columns):
+            rows = [(int(row['count']), row['warehouse name'], row['storage'], row['date']) for row in reader]
+        elif {'warehouse_name', 'date', 'storage'} <= set(columns):
+            rows = [(row['date'], row['warehouse_name'], row['storage']) for row in reader]
+            counts = {date: count for count, date in enumerate(sorted({row[0] for row in rows},
+                                                                      key=datetime.fromisoformat), 1)}
+            rows = [(counts[date], name, storage, date) for date, name, storage in rows]
+        else:
+            raise ValueError(f'{path}: expected the columns count, date, warehouse name, storage or '
+                             f'warehouse_name, date, storage, got {columns}')
+    for count, name, storage, date in rows:
+        groups.setdefault(count, []).append({
+            'name': name,
+            'intVal': int(float(storage)),  # stock counts: a varint instead of an 8-byte double
+            'quality': count,
+        })
+        dates[count] = date  # Capture the date
+    return [(count, groups[count], dates[count]) for count in sorted(groups)]
+
+
+def replay_delays(index, mode, interval, speed):
+    """Seconds to wait before publishing each group: 'interval' waits a fixed time between groups,
+    'realtime' waits the time between their dates divided by speed, 'fast' does not wait at all."""
+    previous_date = None
+    for position, (_, _, date) in enumerate(index):
+        if mode == 'realtime':
+            current_date = datetime.fromisoformat(date)
+            delay = 0.0 if previous_date is None else max((current_date - previous_date).total_seconds() / speed, 0.0)
+            previous_date = current_date
+        elif mode == 'interval' and position > 0:
+            delay = interval
+        else:
+            delay = 0.0
+        yield delay
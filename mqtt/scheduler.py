@@ -0,0 +1,112 @@
+import time
+import threading
+
+MISSED_TICK_POLICIES = ('skip', 'catch-up', 'delay')
+
+
+class PeriodicTask:
+    '''
+    Calls `function` every `interval` seconds on its own thread, so a slow task never holds up the others.
+    Ticks are on a fixed grid (start + k * interval). When a run ends after the next tick, `missed` decides:
+      'skip'      drop the missed ticks and wait for the next one on the grid
+      'catch-up'  run again right away, once per missed tick, until back on the grid
+      'delay'     restart the grid `interval` seconds after the late run ended
+    A run longer than `deadline` seconds (default: the interval) counts as an overrun; python threads can't
+    be interrupted, so give blocking calls inside the task their own timeouts below the deadline.
+    Exceptions are counted and printed, the task keeps its schedule.
+    '''
+    def __init__(self, name, function, interval, deadline=None, missed='skip', initial_delay=0.0):
+        if missed not in MISSED_TICK_POLICIES:
+            raise ValueError(f'unknown missed-tick policy {missed!r}, expected one of {MISSED_TICK_POLICIES}')
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.deadline = deadline if deadline is not None else interval
+        self.missed = missed
+        self.initial_delay = initial_delay
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def run(self, stop):
+        """Run until the `stop` event is set; the wait between ticks ends as soon as it is."""
+        next_run = time.monotonic() + self.initial_delay
+        while not stop.wait(max(0.0, next_run - time.monotonic())):
+            started = time.monotonic()
+            try:
+                self.function()
+            except Exception as e:
+                self.failures += 1
+                print(f"Task {self.name} failed: {e}")
+            finished = time.monotonic()
+            self.runs += 1
+            self.last_duration = finished - started
+            self.max_duration = max(self.max_duration, self.last_duration)
+            if self.last_duration > self.deadline:
+                self.overruns += 1
+                print(f"Task {self.name} took {self.last_duration:.2f}s, deadline {self.deadline:.2f}s")
+
+            next_run += self.interval
+            if next_run <= finished:
+                if self.missed == 'skip':
+                    missed_ticks = int((finished - next_run) // self.interval) + 1
+                    self.skipped += missed_ticks
+                    next_run += missed_ticks * self.interval
+                elif self.missed == 'delay':
+                    next_run = finished + self.interval
+
+    def stats(self):
+        return {'runs': self.runs, 'failures': self.failures, 'overruns': self.overruns, 'skipped': self.skipped,
+                'last_duration': self.last_duration, 'max_duration': self.max_duration}
+
+
+class ServiceRunner:
+    '''
+    Runs PeriodicTasks side by side, one thread each, until stop() (or Ctrl+C in run_forever()).
+    Hooks added with on_stop() run after every task has returned, e.g. to flush sinks.
+    '''
+    def __init__(self, tasks=()):
+        self.tasks = list(tasks)
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.stop_hooks = []
+
+    def add(self, task):
+        self.tasks.append(task)
+        return task
+
+    def on_stop(self, hook):
+        self.stop_hooks.append(hook)
+
+    def start(self):
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=task.run, args=(self.stop_event,), name=task.name, daemon=True)
+                        for task in self.tasks]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Signal every task and wait for the running calls to finish, then run the stop hooks."""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        for hook in self.stop_hooks:
+            hook()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self.stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            for task in self.tasks:
+                print(f"{task.name}: {task.stats()}")
+
+    def stats(self):
+        return {task.name: task.stats() for task in self.tasks}
@@ -0,0 +1,176 @@
+import os
+import csv
+import math
+import time
+import struct
+import threading
+import numpy as np
+import pandas as pd
+
+# Row layout of the polled values, the same as train_data.csv
+COLUMNS = ['warehouse_name', 'date', 'storage', 'next_day_storage']
+NUMERIC_COLUMNS = ['storage', 'next_day_storage']
+
+
+class Sink:
+    '''
+    Buffers rows in memory and hands them to _write in batches: when flush_rows rows are buffered, when
+    flush_interval seconds passed since the last flush (checked on write), on flush() and on close().
+    Writes may come from several threads. Subclasses implement _write(rows).
+    '''
+    def __init__(self, path, flush_rows=1000, flush_interval=60.0):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, row):
+        self.write_many([row])
+
+    def write_many(self, rows):
+        with self.lock:
+            self.buffer.extend(rows)
+            if len(self.buffer) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    def _flush(self):
+        if self.buffer:
+            self._write(self.buffer)
+            self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def _write(self, rows):
+        raise NotImplementedError
+
+
+class BufferedCsvSink(Sink):
+    """Appends each batch to a CSV file with a single open; the header is written when the file is new or empty."""
+
+    def _write(self, rows):
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            if write_header:
+                writer.writerow(COLUMNS)
+            writer.writerows(rows)
+
+
+def to_frame(rows):
+    """Rows as a DataFrame with numeric storage columns; 'Error' / 'No Storage Data' become NaN."""
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    for column in NUMERIC_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(np.float64)
+    return frame
+
+
+class ParquetSink(Sink):
+    """
+    Writes every batch as one Parquet file into the directory `path` (part-<time ns>.parquet), renamed into
+    place when complete, so the directory is a readable dataset at any time: pd.read_parquet(path).
+    Needs pyarrow.
+    """
+
+    def __init__(self, path, flush_rows=10000, flush_interval=300.0):
+        super().__init__(path, flush_rows, flush_interval)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError('ParquetSink requires pyarrow (pip install pyarrow)') from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        os.makedirs(path, exist_ok=True)
+
+    def _write(self, rows):
+        table = self.pa.Table.from_pandas(to_frame(rows), preserve_index=False)
+        part = os.path.join(self.path, f'part-{time.time_ns()}.parquet')
+        self.pq.write_table(table, part + '.tmp')
+        os.replace(part + '.tmp', part)
+
+
+# Binary log: file magic, then per row '<HH' name/date lengths, name and date (utf-8), storage and
+# next_day_storage as float64 (NaN when missing or not numeric)
+BINLOG_MAGIC = b'MQTTAUTO-BINLOG1\n'
+_LENGTHS = struct.Struct('<HH')
+_VALUES = struct.Struct('<dd')
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class BinaryLogSink(Sink):
+    """Append-only binary log of rows, one write per batch; storage values are kept as float64, so a failed read
+    ('Error') comes back as NaN instead of turning the column into strings as in the CSV."""
+
+    def _write(self, rows):
+        chunks = []
+        for name, date, storage, next_day_storage in rows:
+            name, date = str(name).encode('utf-8'), str(date).encode('utf-8')
+            chunks.append(_LENGTHS.pack(len(name), len(date)) + name + date
+                          + _VALUES.pack(_as_float(storage), _as_float(next_day_storage)))
+        with open(self.path, mode='ab') as file:
+            if file.tell() == 0:
+                file.write(BINLOG_MAGIC)
+            file.write(b''.join(chunks))
+
+
+def read_binlog(path):
+    """Read a BinaryLogSink file back as a DataFrame with COLUMNS. A torn record at the end is ignored."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(BINLOG_MAGIC):
+        raise ValueError(f'{path} is not a binary log')
+    names, dates, values = [], [], []
+    offset = len(BINLOG_MAGIC)
+    while offset + _LENGTHS.size <= len(data):
+        name_length, date_length = _LENGTHS.unpack_from(data, offset)
+        start = offset + _LENGTHS.size
+        end = start + name_length + date_length + _VALUES.size
+        if end > len(data):
+            break
+        names.append(data[start:start + name_length].decode('utf-8'))
+        dates.append(data[start + name_length:start + name_length + date_length].decode('utf-8'))
+        values.append(_VALUES.unpack_from(data, end - _VALUES.size))
+        offset = end
+    values = np.array(values, dtype=np.float64).reshape(-1, 2)
+    return pd.DataFrame({'warehouse_name': names, 'date': dates,
+                         'storage': values[:, 0], 'next_day_storage': values[:, 1]})
+
+
+def make_sink(path, **kwargs):
+    """Sink by target: '*.binlog' binary log, '*.parquet' or an existing directory Parquet, CSV otherwise."""
+    if path.endswith('.binlog'):
+        return BinaryLogSink(path, **kwargs)
+    if path.endswith('.parquet') or os.path.isdir(path):
+        return ParquetSink(path, **kwargs)
+    return BufferedCsvSink(path, **kwargs)
+
+
+def read_sink(path):
+    """Read what any of the sinks wrote (or any CSV / Parquet / Excel file) into a DataFrame."""
+    if path.endswith('.binlog'):
+        return read_binlog(path)
+    if path.endswith('.parquet') or os.path.isdir(path):
+        return pd.read_parquet(path)
+    if path.endswith(('.xls', '.xlsx')):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
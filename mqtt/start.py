@@ -1,24 +1,19 @@
-import csv
 import os
 from datetime import datetime
-from mqttauto.mqtt.akskg import SignRequest
-import time
-import csv
+from mqttauto.mqtt.aioakskg import attribute_path
+from mqttauto.mqtt.batchreader import BatchReader
+from mqttauto.mqtt.sinks import make_sink
+from mqttauto.mqtt.valuestore import ValueStore
+from mqttauto.mqtt.tagregistry import TagRegistry, DEFAULT_PATH
+from mqttauto.mqtt.clocksync import default_clock
 import paho.mqtt.client as mqtt
-from mqttauto.mqtt.realdatatransfer import create_serialized_value_sequence
+from mqttauto.mqtt.replay import load_replay_index
+from mqttauto.mqtt.compression import DeadbandFilter, DeadbandPublisher
+from mqttauto.mqtt.publisher import ShardedPublisher, client_id_prefix, serialize_rows
+from mqttauto.mqtt import metatag_pb2
+from mqttauto.mqtt.scheduler import PeriodicTask, ServiceRunner
 import time
 
-attribute_names = [
-    'SC01', 'SC10', 'SC12', 'SC14', 'SC15', 'SC16', 'SC17', 'SC18', 'SC19', 'SC02', 'SC20', 'SC21', 'SC22',
-    'SC23', 'SC24', 'SC25', 'SC26', 'SC27', 'SC28', 'SC29', 'SC03', 'SC30', 'SC31', 'SC32', 'SC34', 'SC35',
-    'SC36', 'SC37', 'SC38', 'SC39', 'SC04', 'SC40', 'SC41', 'SC43', 'SC44', 'SC46', 'SC47', 'SC48', 'SC49',
-    'SC05', 'SC51', 'SC52', 'SC53', 'SC54', 'SC55', 'SC56', 'SC57', 'SC58', 'SC06', 'SC60', 'SC61', 'SC63',
-    'SC66', 'SC68', 'SC07', 'SC08', 'SC09'
-]
-
-# Store for holding previous day's values
-values_store = {}
-
 # MQTT broker details
 broker_address = "47.236.10.165"
 port = 32566  # Default MQTT port
@@ -27,127 +22,184 @@ topic = "/239f67e0-0b85-11ef-b05c-7df9e9869244/mltest/mltest/rtdvalue/report"
 qos = 0  # Quality of Service level 0
 retain = True  # Retain flag
 
-# CSV File path
-csv_file_path =  'C:\\Users\\shimu\\Desktop\\朱佳楠\\AI\\train_data1.csv'
-
-def on_connect(client, userdata, flags, rc):
-    print("Connected with result code " + str(rc))
+# Deadband compression: unchanged tags are not re-sent, every tag is forced out at least every 5 minutes
+compress_spec = metatag_pb2.CompressSpec(enable=True, value=0.0, maxElapse=5 * 60 * 1000)
+
+# Files, each overridable by an environment variable (read when main() builds the Gateway):
+# tag definitions, CSV or YAML (MQTTAUTO_TAGS)
+tags_path = DEFAULT_PATH
+# storage per tag and day, persisted so yesterday's values survive a restart (MQTTAUTO_VALUE_STORE)
+value_store_path = 'values_store.npz'
+# completed (warehouse_name, date, storage, next_day_storage) rows, written in batches; *.parquet (directory)
+# or *.binlog select the other sinks (MQTTAUTO_SINK)
+sink_path = 'output_data.csv'
+# CSV to replay, see replay.load_replay_index for the layouts it takes (MQTTAUTO_REPLAY_CSV)
+csv_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'train_data.csv')
+
+# Task intervals in seconds: each runs on its own thread, a slow SupOS response doesn't delay publishing
+publish_interval = 7.0
+poll_interval = 7.0
+write_interval = 60.0
+# Topic for the tag definitions (MetaTagSequence, retained); None leaves the metadata unpublished
+metadata_topic = None
+metadata_interval = 60.0
+# Clock sync with the server (GatewayCoordinate / ServerCoordinate, see mqtt/clocksync.py) before stamping
+# values; None keeps the local clock
+clock_request_topic = None
+clock_response_topic = None
+clock_interval = 300.0
+# Connections to publish over; above 1 the tags are spread over them by consistent hash, at QoS 1
+shards = 1
 
 def on_publish(client, userdata, mid):
     print("Message Published.")
 
-def publish_message(client, topic, data, serialize_function):
-    # Call the appropriate serialization function
-    encoded_message = serialize_function(data)
-    client.publish(topic, payload=encoded_message, qos=qos, retain=retain)
 
-
-def fetch_all_data(date):
-    sign_request = SignRequest()
-    endpoint = "/open-api/supos/oodm/v2/attribute/current"
-    inputs = [f"system.Collect Template.mltest.system.{name}" for name in attribute_names]
-    data = {"inputs": inputs}
-    try:
-        response = sign_request.post(endpoint, data)
-        response.encoding = 'utf-8'
-        response_data = response.json()
-        return [(name, date, response_data['data'].get(f"system.Collect Template.mltest.system.{name}", {}).get('value', 'No Storage Data')) for name in attribute_names]
-    except Exception as e:
-        print(f"Failed to fetch data: {e}")
-        return [(name, date, 'Error') for name in attribute_names]
-
-def fetch_date_with_retry(max_retries=3):
-    endpoint = "/open-api/supos/oodm/v2/attribute/current"
-    retries = 0
-    inputs = [f"system.Collect Template.mltest.system.date"]
-    data = {"inputs": inputs}
-    sign_request = SignRequest()
-    while retries < max_retries:
-        try:
-            response = sign_request.post(endpoint, data)
-            if response.status_code == 200:
-                response_data = response.json()
-                date_value = response_data['data'].get('system.Collect Template.mltest.system.date', {}).get('value', None)
-                if date_value:
-                    return datetime.strptime(date_value, "%Y-%m-%d").strftime("%Y-%m-%d")
-            retries += 1
-            time.sleep(10)  # wait 10 seconds before retrying
-        except Exception as e:
-            print(f"Attempt {retries + 1} failed: {e}")
-            retries += 1
-    return '1111-11-11'  # return this only if all retries fail
-
-def write_to_csv(attribute, data):
-    file_path = 'output_data.csv'
-    write_header = not os.path.exists(file_path)
-    with open(file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        if write_header:
-            writer.writerow(['Attribute', 'Date', 'Storage', 'Next Day Storage'])
-        writer.writerow(data)
-
-def update_values_store(results_array, date):
-    global values_store
-    for attribute, _, value in results_array:
-        if attribute in values_store:
-            # Write current and next day storage
-            write_to_csv(attribute, values_store[attribute] + [value])
-        # Update the store with current data
-        values_store[attribute] = [attribute, date, value]
+class Gateway:
+    '''
+    What the tasks of start.py share, created by main() rather than on import: the tag registry (every tag but
+    the date is a warehouse attribute to poll), the value store and sink the poller writes to, the SupOS batch
+    reader (its adapted chunk size carries over between cycles) and the deadband publisher.
+    '''
+    def __init__(self, tags_file=None, value_store_file=None, sink_file=None, replay_file=None):
+        self.tags = TagRegistry(tags_file or os.getenv('MQTTAUTO_TAGS', tags_path))
+        self.attribute_names = [name for name in self.tags.names() if name != 'date']
+        self.value_types = self.tags.value_types()
+        self.values_store = ValueStore.open(value_store_file or os.getenv('MQTTAUTO_VALUE_STORE', value_store_path))
+        self.sink = make_sink(sink_file or os.getenv('MQTTAUTO_SINK', sink_path))
+        self.batch_reader = BatchReader()
+        self.deadband_publisher = DeadbandPublisher(DeadbandFilter(compress_spec, self.tags.compress_specs()),
+                                                    compress_spec.maxElapse)
+        self.replay_file = replay_file or os.getenv('MQTTAUTO_REPLAY_CSV', csv_file_path)
+
+    def on_connect(self, client, userdata, flags, rc):
+        print("Connected with result code " + str(rc))
+        # publish the full state again after (re)connecting
+        self.deadband_publisher.reset()
+        self.tags.reset_sent()
+        if clock_response_topic is not None:
+            client.subscribe(clock_response_topic)
+
+    def publish_message(self, client, topic, data, serialize_function):
+        # Only tags outside their deadband (or past maxElapse) go into the payload, not retained; a full
+        # retained snapshot goes out after connecting and every maxElapse. With shards the deltas are split
+        # over the connections (each payload with the tags hashed to it and the date)
+        return self.deadband_publisher.publish(client, topic, data, serialize_function, qos=qos, retain=retain)
+
+    def serialize_values(self, rows):
+        # each value goes in the RtdValue field of its registered ValueType; the columnar encoder builds the
+        # same bytes as create_serialized_value_sequence without protobuf objects or logging
+        return serialize_rows(rows, self.value_types)
+
+    def fetch_all_data(self, retries=3):
+        """Date and current value of every attribute from one batch read. Returns (date, results),
+        date is '1111-11-11' when no valid date could be read."""
+        inputs = [attribute_path(name) for name in self.attribute_names] + [attribute_path('date')]
+        for attempt in range(retries):
+            values = self.batch_reader.read_sync(inputs)
+            try:
+                date = datetime.strptime(values[attribute_path('date')], "%Y-%m-%d").strftime("%Y-%m-%d")
+                return date, [(name, date, values[attribute_path(name)]) for name in self.attribute_names]
+            except (TypeError, ValueError) as e:
+                print(f"Attempt {attempt + 1} failed: {e}")
+                if attempt < retries - 1:
+                    time.sleep(10)  # wait 10 seconds before retrying
+        return '1111-11-11', []
+
+    def update_values_store(self, results_array, date):
+        """ Record the day's values; the rows completed with the previous day's storage go to the sink. """
+        names = [result[0] for result in results_array]
+        values = [result[2] for result in results_array]
+        self.sink.write_many(self.values_store.update(date, names, values))
+
+    def publish_metadata(self, client):
+        """Send the MetaTags added or changed since the last send; after a (re)connect that is all of them."""
+        names = self.tags.pending()
+        if not names:
+            return
+        client.publish(metadata_topic, self.tags.sequence(names).SerializeToString(), qos=1, retain=True)
+        self.tags.mark_sent(names)
+        print(f"Published metadata of {len(names)} tags")
+
+    def poll_supos(self):
+        # one attempt per tick; a failed date is retried on the next tick instead of sleeping here
+        current_date, results_array = self.fetch_all_data(retries=1)
+        if current_date != '1111-11-11':
+            self.update_values_store(results_array, current_date)
+        else:
+            print("Failed to fetch valid date, skipping this cycle.")
+
+    def close(self):
+        self.sink.close()
+        self.values_store.close()
+        self.batch_reader.close()
+
+
+class ReplayPublisher:
+    """Publishes the next count of the replay CSV on every call, starting over after the last one."""
+
+    def __init__(self, gateway, client, index):
+        self.gateway = gateway
+        self.client = client
+        self.index = index
+        self.position = 0
+
+    def __call__(self):
+        current_count, rows, date_for_current_count = self.index[self.position]
+        self.position = (self.position + 1) % len(self.index)
+        # Append the common date for the current count
+        data_to_publish = rows + [{'name': "date", 'strVal': date_for_current_count, 'quality': 8}]
+        print(f"Publishing data for count: {current_count}")
+        self.gateway.publish_message(self.client, topic, data_to_publish, self.gateway.serialize_values)
+
+
+def build_runner(gateway, client):
+    """Publisher, SupOS poller and sink writer as independent periodic tasks, plus the clock sync and metadata
+    publisher when their topics are set."""
+    runner = ServiceRunner()
+    # the CSV is read once, every pass replays the same index
+    runner.add(PeriodicTask('publisher', ReplayPublisher(gateway, client, load_replay_index(gateway.replay_file)),
+                            publish_interval, missed='skip'))
+    if clock_request_topic is not None:
+        # a ShardedPublisher syncs over its first connection
+        paho_client = client if isinstance(client, mqtt.Client) else next(iter(client.shards.values())).client
+        request = default_clock.attach(paho_client, clock_request_topic, clock_response_topic)
+        runner.add(PeriodicTask('clock', request, clock_interval, missed='skip'))
+    if metadata_topic is not None:
+        runner.add(PeriodicTask('metadata', lambda: gateway.publish_metadata(client), metadata_interval,
+                                missed='skip'))
+    runner.add(PeriodicTask('poller', gateway.poll_supos, poll_interval, missed='skip', initial_delay=2.0))
+    runner.add(PeriodicTask('writer', gateway.sink.flush, write_interval, missed='delay'))
+    runner.on_stop(gateway.close)
+    return runner
 
 
 def main():
+    gateway = Gateway()
+    if shards > 1:
+        # every shard reconnect resets the deadband and the sent metadata, like on_connect of the single client
+        publisher = ShardedPublisher([(broker_address, port)] * shards, topic, client_id_prefix('mqttauto-start'),
+                                     qos=1, retain=retain, on_connect=gateway.on_connect)
+        publisher.connect(timeout=10)
+        try:
+            build_runner(gateway, publisher).run_forever()
+        finally:
+            publisher.close()
+        return
+
     client = mqtt.Client()
-    client.on_connect = on_connect
+    client.on_connect = gateway.on_connect
     client.on_publish = on_publish
 
     client.connect(broker_address, port, 60)
     client.loop_start()  # Start a non-blocking loop
 
     try:
-        while True:
-            current_count = 1
-            max_count_found = False
-            while not max_count_found:
-                with open(csv_file_path, mode='r') as file:
-                    reader = csv.DictReader(file)
-                    data_to_publish = []
-                    date_for_current_count = ""
-                    for row in reader:
-                        if int(row['count']) == current_count:
-                            data_to_publish.append({
-                                'name': row['warehouse name'],
-                                'dblVal': int(row['storage']),
-                                'quality': int(row['count']),
-                            })
-                            date_for_current_count = row['date']  # Capture the date
-                    if data_to_publish:
-                        # Append the common date for the current count
-                        data_to_publish.append({'name': "date", 'strVal': date_for_current_count, 'quality': 8})
-                        print(f"Publishing data for count: {current_count}")
-                        publish_message(client, topic, data_to_publish, create_serialized_value_sequence)
-                        current_count += 1  # Increment to the next count
-                    else:
-                        max_count_found = True  # Exit the loop if no data for current count
-
-                    time.sleep(2)  # Wait for 5 seconds before the next publish
-                    current_date = fetch_date_with_retry()
-                    if current_date != '1111-11-11':
-                        results_array = fetch_all_data(current_date)
-                        update_values_store(results_array, current_date)
-                    else:
-                        print("Failed to fetch valid date, skipping this cycle.")
-                    time.sleep(5)
-
+        build_runner(gateway, client).run_forever()
     finally:
         client.loop_stop()  # Stop the loop
         client.disconnect()  # Disconnect from the broker
 
 
-
-
-
-
 if __name__ == '__main__':
     main()
-
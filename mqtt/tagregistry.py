@@ -0,0 +1,186 @@
+import csv
+import os
+from mqttauto.mqtt import metatag_pb2
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tags.csv')
+
+FIELDS = ['id', 'name', 'showName', 'description', 'type', 'unit',
+          'compress_enable', 'compress_value', 'compress_max_elapse']
+
+
+def read_definitions(path):
+    """Tag definitions as a list of dicts with the FIELDS keys, from a CSV file or a YAML file
+    (a list of mappings, or a mapping with a 'tags' list)."""
+    if path.endswith(('.yaml', '.yml')):
+        # PyYAML is only needed for YAML tag files
+        import yaml
+        with open(path) as file:
+            definitions = yaml.safe_load(file) or []
+        if isinstance(definitions, dict):
+            definitions = definitions.get('tags', [])
+        return [{key: '' if value is None else value for key, value in definition.items()}
+                for definition in definitions]
+    with open(path, newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def make_metatag(definition):
+    """MetaTag of a definition dict; empty optional fields keep the protobuf defaults, the CompressSpec is only
+    set when compress_enable is given."""
+    tag = metatag_pb2.MetaTag(version=1, name=definition['name'])
+    tag.showName = str(definition.get('showName') or definition['name'])
+    tag.description = str(definition.get('description') or '')
+    value_type = definition.get('type') or 'Double'
+    tag.type = value_type if isinstance(value_type, int) else metatag_pb2.ValueType.Value(value_type)
+    tag.unit = str(definition.get('unit') or '')
+    enable = definition.get('compress_enable', '')
+    if enable != '':
+        tag.compress.enable = enable if isinstance(enable, bool) else str(enable).lower() in ('1', 'true', 'yes')
+        tag.compress.value = float(definition.get('compress_value') or 0.0)
+        tag.compress.maxElapse = int(definition.get('compress_max_elapse') or 0)
+    return tag
+
+
+class TagRegistry:
+    '''
+    The tag definitions (mqtt/tags.csv by default, or a YAML file), loaded once and shared by the pollers and
+    publishers. Every tag has a stable integer id: ids come from the file, a new tag gets the one above the
+    highest in use and save() writes them back.
+    Unlike metadatatransfer.create_serialized_metatag, which builds every MetaTag with the same make_metatag,
+    the MetaTagSequence is built once and its serialized form cached. A tag whose definition changes on
+    reload() gets its version bumped; pending() and serialized_diff() only cover the MetaTags added or changed
+    since mark_sent(), so only those are re-sent.
+    '''
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.tags = {}
+        self.ids = {}
+        self.removed = []
+        self.sent = {}
+        self.encoded = {}
+        self._serialized = None
+        self.reload()
+
+    def reload(self):
+        """Read the file again; returns the names of the tags that were added or changed."""
+        definitions = read_definitions(self.path)
+        ids = dict(self.ids)
+        for definition in definitions:
+            if str(definition.get('id', '')).strip() != '':
+                tag_id = int(definition['id'])
+                owner = next((name for name, i in ids.items() if i == tag_id and name != definition['name']), None)
+                if owner is not None:
+                    raise ValueError(f"{self.path}: id {tag_id} of {definition['name']!r} belongs to {owner!r}")
+                ids[definition['name']] = tag_id
+        next_id = max(ids.values(), default=0) + 1
+        tags = {}
+        changed = []
+        for definition in definitions:
+            name = definition['name']
+            if name in tags:
+                raise ValueError(f'{self.path}: tag {name!r} is defined twice')
+            if name not in ids:
+                ids[name] = next_id
+                next_id += 1
+            tag = make_metatag(definition)
+            previous = self.tags.get(name)
+            if previous is not None:
+                tag.version = previous.version
+                if tag != previous:
+                    tag.version += 1
+                    changed.append(name)
+            else:
+                changed.append(name)
+            tags[name] = tag
+        self.removed = [name for name in self.tags if name not in tags]
+        self.tags = tags
+        self.ids = ids
+        self.encoded = {name: tag.SerializeToString() for name, tag in tags.items()}
+        self._serialized = None
+        return changed
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, name):
+        return name in self.tags
+
+    def __getitem__(self, name):
+        return self.tags[name]
+
+    def names(self):
+        """Tag names in file order."""
+        return list(self.tags)
+
+    def tag_id(self, name):
+        return self.ids[name]
+
+    def value_type(self, name):
+        return self.tags[name].type
+
+    def value_types(self):
+        """{name: ValueType}, e.g. for create_serialized_value_sequence(rows, types=...)."""
+        return {name: tag.type for name, tag in self.tags.items()}
+
+    def compress_specs(self):
+        """{name: CompressSpec} of the tags that define one, e.g. for DeadbandFilter(specs=...)."""
+        return {name: tag.compress for name, tag in self.tags.items() if tag.HasField('compress')}
+
+    def sequence(self, names=None):
+        return metatag_pb2.MetaTagSequence(tags=[self.tags[name] for name in (self.tags if names is None else names)])
+
+    def serialized(self):
+        """The whole MetaTagSequence, serialized once per reload."""
+        if self._serialized is None:
+            self._serialized = self.sequence().SerializeToString()
+        return self._serialized
+
+    def pending(self):
+        """Names of the tags added or changed since they were last marked sent."""
+        return [name for name, encoded in self.encoded.items() if self.sent.get(name) != encoded]
+
+    def serialized_diff(self):
+        """MetaTagSequence of the pending tags only, or None when every tag was sent as it is."""
+        pending = self.pending()
+        return self.sequence(pending).SerializeToString() if pending else None
+
+    def mark_sent(self, names=None):
+        for name in self.tags if names is None else names:
+            self.sent[name] = self.encoded[name]
+
+    def reset_sent(self):
+        """Consider nothing sent, e.g. after a reconnect, so the next diff is the whole sequence."""
+        self.sent.clear()
+
+    def definitions(self):
+        """The tags as definition dicts (FIELDS keys), with their ids."""
+        rows = []
+        for name, tag in self.tags.items():
+            compressed = tag.HasField('compress')
+            rows.append({
+                'id': self.ids[name],
+                'name': name,
+                'showName': tag.showName,
+                'description': tag.description,
+                'type': metatag_pb2.ValueType.Name(tag.type),
+                'unit': tag.unit,
+                'compress_enable': tag.compress.enable if compressed else '',
+                'compress_value': tag.compress.value if compressed else '',
+                'compress_max_elapse': tag.compress.maxElapse if compressed else '',
+            })
+        return rows
+
+    def save(self, path=None):
+        """Write the definitions with their ids, in the format of the file name (to a temporary name, renamed
+        over the file)."""
+        path = path or self.path
+        temporary = path + '.tmp'
+        with open(temporary, 'w', newline='') as file:
+            if path.endswith(('.yaml', '.yml')):
+                import yaml
+                yaml.safe_dump({'tags': self.definitions()}, file, sort_keys=False, allow_unicode=True)
+            else:
+                writer = csv.DictWriter(file, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(self.definitions())
+        os.replace(temporary, path)
@@ -0,0 +1,177 @@
+import csv
+import os
+import numpy as np
+import pandas as pd
+from mqttauto.mqtt.sinks import COLUMNS
+
+
+def to_float(values):
+    """Values as float64; 'Error', 'No Storage Data' and anything else not numeric become NaN."""
+    return pd.to_numeric(pd.Series(list(values), dtype=object), errors='coerce').to_numpy(np.float64)
+
+
+class ValueStore:
+    '''
+    Polled storage values in a float64 matrix of tag id x calendar day (column 0 is `origin`, the earliest
+    day seen); missing values are NaN. Tags and days are added in amortized O(1) by doubling the capacity.
+    The training row of a tag for day d is (d, value[d], value[d + 1]), so pairing is a shift by one column:
+    update() returns the rows its new or changed values complete, training_rows() all of them at once.
+    With a path, the store is persisted incrementally: each update appends only the values it changed to a
+    log next to the npz snapshot (path + '.log', fsynced), and every `compact_every` logged values the
+    snapshot is rewritten and the log emptied. open() loads the snapshot and replays the log, so the
+    pairing survives a restart.
+    '''
+    def __init__(self, path=None, tag_capacity=64, day_capacity=64, compact_every=10000):
+        self.path = path
+        self.compact_every = compact_every
+        self.logged = 0
+        self.tags = []
+        self.tag_ids = {}
+        self.origin = None
+        self.n_days = 0
+        self.values = np.full((tag_capacity, day_capacity), np.nan)
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        store = cls(path, **kwargs)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                values = data['values']
+                store.tags = data['tags'].tolist()
+                store.origin = data['origin'][0] if len(data['origin']) else None
+            store.tag_ids = {tag: i for i, tag in enumerate(store.tags)}
+            store.values = np.full((max(store.values.shape[0], 2 * values.shape[0]),
+                                    max(store.values.shape[1], 2 * values.shape[1])), np.nan)
+            store.values[:values.shape[0], :values.shape[1]] = values
+            store.n_days = values.shape[1]
+        store._replay()
+        return store
+
+    @property
+    def log_path(self):
+        return self.path + '.log'
+
+    def _replay(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, newline='') as file:
+            # a line without its newline was cut short by a crash mid-write
+            for date, name, value in csv.reader(line for line in file if line.endswith('\n')):
+                self.values[self.tag_id(name), self.day_index(date)] = float(value)
+                self.logged += 1
+
+    def __len__(self):
+        return len(self.tags)
+
+    def _reserve(self, n_tags, n_days, shift=0):
+        # shift moves the existing days right, for a day before the origin
+        rows, columns = self.values.shape
+        if n_tags <= rows and n_days <= columns and shift == 0:
+            return
+        while rows < n_tags:
+            rows *= 2
+        while columns < n_days:
+            columns *= 2
+        values = np.full((rows, columns), np.nan)
+        values[:len(self.tags), shift:shift + self.n_days] = self.values[:len(self.tags), :self.n_days]
+        self.values = values
+
+    def tag_id(self, name):
+        tag_id = self.tag_ids.get(name)
+        if tag_id is None:
+            tag_id = self.tag_ids[name] = len(self.tags)
+            self.tags.append(name)
+            self._reserve(len(self.tags), self.n_days)
+        return tag_id
+
+    def day_index(self, date):
+        day = np.datetime64(date, 'D')
+        if self.origin is None:
+            self.origin = day
+        offset = int((day - self.origin).astype(np.int64))
+        if offset < 0:
+            self._reserve(len(self.tags), self.n_days - offset, shift=-offset)
+            self.n_days -= offset
+            self.origin = day
+            offset = 0
+        elif offset >= self.n_days:
+            self._reserve(len(self.tags), offset + 1)
+            self.n_days = offset + 1
+        return offset
+
+    def day(self, index):
+        return str(self.origin + np.timedelta64(index, 'D'))
+
+    def update(self, date, names, values):
+        """Record the values of `names` for `date` (a non-numeric value leaves the stored one untouched).
+        Returns the [name, day, storage, next_day_storage] rows completed by the values this update set or
+        changed: with the day before as (day before, previous, value), with the day after as (date, value,
+        next). A date seen before (a replay wrapping around) gives its rows again when its values differ;
+        re-reading the same values gives none."""
+        column = self.day_index(date)
+        ids = np.fromiter((self.tag_id(name) for name in names), dtype=np.int64, count=len(names))
+        values = to_float(values)
+        stored = self.values[ids, column]
+        changed = ~np.isnan(values) & (np.isnan(stored) | (values != stored))
+        self.values[ids[changed], column] = values[changed]
+        rows = []
+        if column > 0:
+            previous = self.values[ids, column - 1]
+            previous_day = self.day(column - 1)
+            rows += [[self.tags[ids[i]], previous_day, previous[i], values[i]]
+                     for i in np.flatnonzero(changed & ~np.isnan(previous))]
+        if column + 1 < self.n_days:
+            following = self.values[ids, column + 1]
+            day = self.day(column)
+            rows += [[self.tags[ids[i]], day, values[i], following[i]]
+                     for i in np.flatnonzero(changed & ~np.isnan(following))]
+        if self.path is not None and changed.any():
+            self._log(column, ids[changed], values[changed])
+        return rows
+
+    def _log(self, column, ids, values):
+        day = self.day(column)
+        with open(self.log_path, 'a', newline='') as file:
+            csv.writer(file).writerows([day, self.tags[i], repr(float(value))] for i, value in zip(ids, values))
+            file.flush()
+            os.fsync(file.fileno())
+        self.logged += len(ids)
+        if self.logged >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Write the snapshot and empty the log."""
+        self.save()
+
+    def close(self):
+        if self.path is not None and self.logged:
+            self.compact()
+
+    def training_rows(self):
+        """Every complete (day, day + 1) pair as a DataFrame with the train_data.csv columns."""
+        if self.n_days < 2:
+            return pd.DataFrame(columns=COLUMNS)
+        current = self.values[:len(self.tags), :self.n_days - 1]
+        following = self.values[:len(self.tags), 1:self.n_days]
+        tag_ids, days = np.nonzero(~np.isnan(current) & ~np.isnan(following))
+        return pd.DataFrame({
+            'warehouse_name': np.asarray(self.tags, dtype=object)[tag_ids],
+            'date': np.datetime_as_string(self.origin + days.astype('timedelta64[D]'), unit='D'),
+            'storage': current[tag_ids, days],
+            'next_day_storage': following[tag_ids, days],
+        })
+
+    def save(self, path=None):
+        path = path or self.path
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.savez(file, tags=np.asarray(self.tags, dtype=str),
+                     origin=np.asarray([] if self.origin is None else [self.origin], dtype='datetime64[D]'),
+                     values=self.values[:len(self.tags), :self.n_days])
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+        if path == self.path:
+            # everything logged is in the snapshot now; a crash before this only replays it again
+            open(self.log_path, 'w').close()
+            self.logged = 0
@@ -1,87 +1,82 @@
-import csv
-import time
 import os
+import asyncio
 from datetime import datetime
-from mqttauto.mqtt.akskg import SignRequest
-import concurrent.futures
-from functools import partial
+from mqttauto.mqtt.aioakskg import AsyncSignRequest, attribute_path
+from mqttauto.mqtt.batchreader import BatchReader
+from mqttauto.mqtt.sinks import make_sink
+from mqttauto.mqtt.valuestore import ValueStore
+from mqttauto.mqtt.tagregistry import TagRegistry, DEFAULT_PATH
 
-attribute_names = ['SC01', 'SC10', 'SC12', 'SC14', 'SC15', 'SC16', 'SC17', 'SC18', 'SC19', 'SC02', 'SC20', 'SC21', 'SC22',
-                   'SC23', 'SC24', 'SC25', 'SC26', 'SC27', 'SC28', 'SC29', 'SC03', 'SC30', 'SC31', 'SC32', 'SC34', 'SC35',
-                   'SC36', 'SC37', 'SC38', 'SC39', 'SC04', 'SC40', 'SC41', 'SC43', 'SC44', 'SC46', 'SC47', 'SC48', 'SC49',
-                   'SC05', 'SC51', 'SC52', 'SC53', 'SC54', 'SC55', 'SC56', 'SC57', 'SC58', 'SC06', 'SC60', 'SC61', 'SC63',
-                   'SC66', 'SC68', 'SC07', 'SC08', 'SC09']
+# Files, each overridable by an environment variable (read when main() opens them):
+# tag definitions, CSV or YAML (MQTTAUTO_TAGS); every tag but the date is a warehouse attribute to poll
+tags_path = DEFAULT_PATH
+# storage per tag and day, persisted so yesterday's values survive a restart (MQTTAUTO_VALUE_STORE)
+value_store_path = 'values_store.npz'
+# (warehouse_name, date, storage, next_day_storage) rows are buffered and written in batches;
+# the target picks the format: output_data.csv, *.parquet (directory) or *.binlog (MQTTAUTO_SINK)
+sink_path = 'output_data.csv'
 
 
-values_store = {}
-last_known_date = None
+class Poller:
+    '''Records the polled values of `attribute_names` per day in `values_store`; the training rows they
+    complete go to `sink`.'''
+    def __init__(self, attribute_names, values_store, sink):
+        self.attribute_names = list(attribute_names)
+        self.values_store = values_store
+        self.sink = sink
+        self.last_known_date = None
 
-def fetch_data(attribute_name, date, retries=3):
-    sign_request = SignRequest()
-    data = {"inputs": [f"system.Collect Template.mltest.system.{attribute_name}"]}
-    endpoint = "/open-api/supos/oodm/v2/attribute/current"
-    for attempt in range(retries):
+    @classmethod
+    def open(cls):
+        """Poller over the files named by the environment (or the defaults above)."""
+        tags = TagRegistry(os.getenv('MQTTAUTO_TAGS', tags_path))
+        return cls([name for name in tags.names() if name != 'date'],
+                   ValueStore.open(os.getenv('MQTTAUTO_VALUE_STORE', value_store_path)),
+                   make_sink(os.getenv('MQTTAUTO_SINK', sink_path)))
+
+    def update_values_store(self, results_array, date):
+        """ Record the day's values; the rows completed with the previous day's storage go to the sink. """
+        names = [result[0] for result in results_array]
+        values = [result[2] for result in results_array]
+        self.sink.write_many(self.values_store.update(date, names, values))
+
+    async def poll_once(self, reader):
+        """One cycle: read the date and every attribute in chunked batch reads (see BatchReader), the date
+        riding in the same batch as the attributes, and record the values on that day. Returns the date, or
+        None when it was not valid and the cycle was skipped."""
+        values = await reader.read([attribute_path(name) for name in self.attribute_names]
+                                   + [attribute_path('date')])
+        date_value = values[attribute_path('date')]
         try:
-            response = sign_request.post(endpoint, data)
-            response.encoding = 'utf-8'
-            response_data = response.json()
-            value = response_data['data'].get(f'system.Collect Template.mltest.system.{attribute_name}', {}).get('value', 'No Storage Data')
-            return [attribute_name, date, value]
-        except Exception as e:
-            print(f"Error on attempt {attempt + 1} for {attribute_name}: {e}")
-            if attempt == retries - 1:
-                return [attribute_name, date, 'Error']
+            self.last_known_date = datetime.strptime(date_value, "%Y-%m-%d")
+        except (TypeError, ValueError) as e:
+            # the values can't be placed on a day without a valid date
+            print(f"Failed to fetch date: {e}")
+            print("Failed to fetch valid date, skipping this cycle.")
+            return None
+        results_array = [[name, date_value, values[attribute_path(name)]] for name in self.attribute_names]
+        self.update_values_store(results_array, date_value)
+        return date_value
 
-def write_to_csv(attribute, data):
-    """ Write to CSV immediately after fetching data """
-    file_path = 'output_data.csv'
-    with open(file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        if not os.path.exists(file_path):
-            writer.writerow(['warehouse_name', 'date', 'storage', 'next_day_storage'])
-        writer.writerow(data)
+    async def poll_forever(self, interval=30, concurrency=8):
+        """poll_once every interval seconds on one asyncio client."""
+        async with AsyncSignRequest(limit=concurrency) as client:
+            reader = BatchReader(client, concurrency=concurrency)
+            while True:
+                await self.poll_once(reader)
+                await asyncio.sleep(interval)
 
-def update_values_store(results_array, date):
-    """ Update the stored values with new data and write to CSV. """
-    global values_store
-    for result in results_array:
-        attribute, _, value = result
-        if attribute in values_store:
-            # Write previous day's data with current day as next_day_storage
-            write_to_csv(attribute, values_store[attribute] + [value])
-            values_store[attribute] = result  # Update the current day's data
-        else:
-            # Store the data initially without next_day_storage
-            values_store[attribute] = result
+    def close(self):
+        self.sink.close()
+        self.values_store.close()
 
-def fetch_date():
-    global last_known_date
-    sign_request = SignRequest()
-    data = {"inputs": ["system.Collect Template.mltest.system.date"]}
-    endpoint = "/open-api/supos/oodm/v2/attribute/current"
-    try:
-        response = sign_request.post(endpoint, data)
-        response.encoding = 'utf-8'
-        response_data = response.json()
-        date_value = response_data['data'].get('system.Collect Template.mltest.system.date', {}).get('value', '1111-11-11')
-        current_date = datetime.strptime(date_value, "%Y-%m-%d")
-        last_known_date = current_date
-        return date_value
-    except Exception as e:
-        print(f"Failed to fetch date: {e}")
-        return '1111-11-11'
 
 def main():
-    while True:
-        current_date_str = fetch_date()
-        results_array = []
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            fetch_with_date = partial(fetch_data, date=current_date_str)
-            results = executor.map(fetch_with_date, attribute_names)
-            results_array.extend(results)
-
-        update_values_store(results_array, current_date_str)
-        time.sleep(30)
+    poller = Poller.open()
+    try:
+        asyncio.run(poller.poll_forever())
+    finally:
+        poller.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,100 @@
+"""
+Local stand-in for the SupOS open-api, for the tests and for exercising the pollers without a real SupOS.
+Serves POST .../open-api/supos/oodm/v2/attribute/current, checks the HMAC signature of every request and
+answers with a deterministic value per attribute ('system.Collect Template.mltest.system.date' returns a date).
+
+    python -m mqttauto.tests.mock_supos --port 8080 --latency-ms 20
+    SDK_ADDRESS=http://127.0.0.1:8080/ python -m mqttauto.mqtt.yibu
+
+It can also be started in-process with start_mock_supos() (see the tests and benchmarks/bench_supos.py).
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import zlib
+from aiohttp import web
+from mqttauto.mqtt import akskg
+
+CURRENT_URI = "/open-api/supos/oodm/v2/attribute/current"
+DATE_ATTRIBUTE = "system.Collect Template.mltest.system.date"
+
+
+class MockSupOS:
+    def __init__(self, latency_ms=0.0, error_rate=0.0, max_inputs=None, date='2023-11-08', seed=0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.max_inputs = max_inputs
+        self.date = date
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @staticmethod
+    def expected_authorization(method, uri, content_type, query=''):
+        sign_str = method + "\n" + uri + "\n" + content_type + "\n" + query + "\n" + "\n"
+        signature = hmac.new(akskg.app_sk.encode('utf-8'), sign_str.encode('utf-8'), hashlib.sha256).hexdigest()
+        return "Sign " + akskg.app_ak + "-" + signature
+
+    def value(self, attribute):
+        if attribute == DATE_ATTRIBUTE:
+            return self.date
+        return zlib.crc32(attribute.encode('utf-8')) % 50000
+
+    async def current(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000)
+            authorization = self.expected_authorization(request.method, CURRENT_URI,
+                                                        request.headers.get('Content-Type', ''))
+            if request.headers.get('Authorization') != authorization:
+                self.rejected += 1
+                return web.json_response({'code': 401, 'message': 'bad signature'}, status=401)
+            if self.error_rate and self.random.random() < self.error_rate:
+                return web.json_response({'code': 500, 'message': 'injected error'}, status=500)
+            inputs = json.loads(await request.read())['inputs']
+            if self.max_inputs is not None and len(inputs) > self.max_inputs:
+                return web.json_response({'code': 413, 'message': 'too many inputs'}, status=413)
+            return web.json_response({'code': 200, 'data': {name: {'value': self.value(name)} for name in inputs}})
+        finally:
+            self.in_flight -= 1
+
+    def app(self):
+        app = web.Application()
+        # SignRequest joins 'http://host/' with '/open-api/...', so also accept the double slash
+        app.router.add_post(CURRENT_URI, self.current)
+        app.router.add_post('/' + CURRENT_URI, self.current)
+        return app
+
+
+async def start_mock_supos(mock, host='127.0.0.1', port=0):
+    """Start the mock on an asyncio loop; returns (runner, base_url). Stop it with `await runner.cleanup()`."""
+    runner = web.AppRunner(mock.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://{host}:{port}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-inputs', type=int, default=None)
+    args = parser.parse_args()
+    mock = MockSupOS(args.latency_ms, args.error_rate, args.max_inputs)
+    web.run_app(mock.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+AsyncSignRequest against the in-process mock SupOS (tests/mock_supos.py), which checks the signature of
+every request. Run `python -m pytest` in the checkout; conftest.py makes it importable as mqttauto.
+"""
+import asyncio
+import aiohttp
+import pytest
+from mqttauto.tests.mock_supos import DATE_ATTRIBUTE, MockSupOS, start_mock_supos
+from mqttauto.mqtt import akskg
+from mqttauto.mqtt.aioakskg import AsyncSignRequest, attribute_path, current_uri
+from mqttauto.mqtt.akskg import Signer
+
+
+def run_with_mock(monkeypatch, mock, body):
+    async def main():
+        runner, base_url = await start_mock_supos(mock)
+        monkeypatch.setattr(akskg, 'supos_url', base_url)
+        try:
+            return await body()
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def test_signed_requests_are_accepted(monkeypatch):
+    mock = MockSupOS()
+    attributes = [attribute_path(f'SC{i:03d}') for i in range(20)] + [DATE_ATTRIBUTE]
+
+    async def body():
+        async with AsyncSignRequest(limit=4) as client:
+            return await client.fetch_current(attributes, concurrency=4)
+
+    values = run_with_mock(monkeypatch, mock, body)
+    assert mock.rejected == 0
+    assert values == {attribute: mock.value(attribute) for attribute in attributes}
+    assert mock.max_in_flight <= 4
+
+
+def test_wrong_secret_is_rejected(monkeypatch):
+    mock = MockSupOS()
+
+    async def body():
+        async with AsyncSignRequest(signer=Signer(akskg.app_ak, 'not the secret')) as client:
+            with pytest.raises(aiohttp.ClientResponseError) as error:
+                await client.post(current_uri, {"inputs": [DATE_ATTRIBUTE]})
+            return error.value.status
+
+    assert run_with_mock(monkeypatch, mock, body) == 401
+    assert mock.rejected == 1
+
+
+def test_close_leaves_a_passed_session_open(monkeypatch):
+    async def body():
+        async with aiohttp.ClientSession() as session:
+            async with AsyncSignRequest(session=session) as client:
+                response = await client.post(current_uri, {"inputs": [DATE_ATTRIBUTE]})
+            assert not session.closed
+            own = AsyncSignRequest()
+            await own.open()
+            await own.close()
+            return response, own.session.closed
+
+    response, own_closed = run_with_mock(monkeypatch, MockSupOS(date='2024-06-05'), body)
+    assert response['data'][DATE_ATTRIBUTE]['value'] == '2024-06-05'
+    assert own_closed
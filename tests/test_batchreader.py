@@ -0,0 +1,69 @@
+"""
+BatchReader failure handling and read_sync() against the in-process mock SupOS, or a client that fails.
+"""
+import asyncio
+import threading
+import aiohttp
+from mqttauto.tests.mock_supos import MockSupOS, start_mock_supos
+from mqttauto.mqtt import akskg
+from mqttauto.mqtt.aioakskg import attribute_path
+from mqttauto.mqtt.batchreader import BatchReader
+
+ATTRIBUTES = [attribute_path(f'SC{i:03d}') for i in range(64)]
+
+
+class UnreachableClient:
+    def __init__(self, error):
+        self.error = error
+        self.requests = 0
+
+    async def post(self, uri, body):
+        self.requests += 1
+        raise self.error
+
+
+def test_transport_error_fails_the_read_without_splitting():
+    for error in (aiohttp.ClientConnectionError('refused'), asyncio.TimeoutError()):
+        client = UnreachableClient(error)
+        reader = BatchReader(client, chunk_size=8, concurrency=4)
+        values = asyncio.run(reader.read(ATTRIBUTES))
+        assert values == {attribute: 'Error' for attribute in ATTRIBUTES}
+        # at most one request per chunk, no retries or halves
+        assert client.requests <= len(ATTRIBUTES) // 8
+        assert reader.chunk_size == 8
+
+
+def test_size_limit_is_split_until_accepted(monkeypatch):
+    mock = MockSupOS(max_inputs=5)
+
+    async def main():
+        runner, base_url = await start_mock_supos(mock)
+        monkeypatch.setattr(akskg, 'supos_url', base_url)
+        try:
+            return await BatchReader(chunk_size=32, concurrency=4).read(ATTRIBUTES)
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(main()) == {attribute: mock.value(attribute) for attribute in ATTRIBUTES}
+
+
+def test_read_sync_keeps_one_loop_and_client(monkeypatch):
+    mock = MockSupOS()
+    loop = asyncio.new_event_loop()
+    runner, base_url = loop.run_until_complete(start_mock_supos(mock))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(akskg, 'supos_url', base_url)
+    reader = BatchReader(concurrency=4)
+    try:
+        assert reader.read_sync(ATTRIBUTES) == {attribute: mock.value(attribute) for attribute in ATTRIBUTES}
+        first_loop, first_client, first_session = reader.loop, reader.sync_client, reader.sync_client.session
+        reader.read_sync(ATTRIBUTES)
+        assert (reader.loop, reader.sync_client, reader.sync_client.session) == (first_loop, first_client,
+                                                                                  first_session)
+    finally:
+        reader.close()
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+    assert first_loop.is_closed() and first_session.closed
@@ -0,0 +1,20 @@
+"""
+Subscriber.fresh(): which timestamped values reach the store.
+"""
+from mqttauto.mqtt.getdata import Subscriber
+
+
+def test_same_millisecond_keeps_a_new_value():
+    subscriber = Subscriber(store=None)
+    assert subscriber.fresh(['SC01'], [5], [1000]) == (['SC01'], [5])
+    assert subscriber.fresh(['SC01'], [6], [1000]) == (['SC01'], [6])
+    assert subscriber.stale == 0
+
+
+def test_redelivery_and_older_values_are_dropped():
+    subscriber = Subscriber(store=None)
+    subscriber.fresh(['SC01', 'SC02'], [5, 7], [1000, 1000])
+    # a redelivery of SC01 and an older SC02
+    assert subscriber.fresh(['SC01', 'SC02'], [5, 8], [1000, 999]) == ([], [])
+    assert subscriber.stale == 2
+    assert subscriber.fresh(['SC01', 'SC02'], [5, 8], [1001, None]) == (['SC01', 'SC02'], [5, 8])
@@ -0,0 +1,34 @@
+"""
+load_replay_index() on both CSV layouts it takes.
+"""
+import os
+import pytest
+from mqttauto.mqtt.mqttsend import load_replay_index
+
+TRAIN_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'train_data.csv')
+
+
+def test_count_layout(tmp_path):
+    path = tmp_path / 'replay.csv'
+    path.write_text('count,date,warehouse name,storage\n'
+                    '2,2024-06-06,SC01,5\n1,2024-06-05,SC01,3\n1,2024-06-05,SC02,4\n')
+    assert load_replay_index(str(path)) == [
+        (1, [{'name': 'SC01', 'intVal': 3, 'quality': 1}, {'name': 'SC02', 'intVal': 4, 'quality': 1}], '2024-06-05'),
+        (2, [{'name': 'SC01', 'intVal': 5, 'quality': 2}], '2024-06-06'),
+    ]
+
+
+def test_bundled_training_data():
+    index = load_replay_index(TRAIN_DATA)
+    counts = [count for count, _, _ in index]
+    dates = [date for _, _, date in index]
+    assert counts == list(range(1, len(index) + 1))
+    assert dates == sorted(dates) and dates[0] == '2023-08-01'
+    assert all(row['quality'] == count for count, rows, _ in index for row in rows)
+
+
+def test_unknown_layout(tmp_path):
+    path = tmp_path / 'other.csv'
+    path.write_text('material_name,date,storage\nfoil,2023-08-01,197\n')
+    with pytest.raises(ValueError, match='expected the columns'):
+        load_replay_index(str(path))
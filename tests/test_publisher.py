@@ -0,0 +1,31 @@
+"""
+ShardedPublisher.publish_rows routing, with the shards' publish replaced (no broker needed).
+"""
+from mqttauto.mqtt.publisher import ShardedPublisher
+
+
+def sharded(count=3):
+    publisher = ShardedPublisher([('127.0.0.1', 1883)] * count, 'state', 'test-publisher')
+    sent = []
+    for shard in publisher.shards.values():
+        shard.publish = lambda topic, payload, qos, retain, shard=shard: sent.append((shard, payload, retain)) or True
+    return publisher, sent
+
+
+def names(payload):
+    return sorted(row['name'] for row in payload)
+
+
+def test_broadcast_tags_go_with_every_part():
+    publisher, sent = sharded()
+    rows = [{'name': f'SC{i:02d}', 'intVal': i, 'quality': 0} for i in range(30)]
+    rows.append({'name': 'date', 'strVal': '2024-06-05', 'quality': 0})
+    assert publisher.publish_rows(rows, serialize_function=list)
+    assert all('date' in names(payload) and not retain for _, payload, retain in sent)
+    assert sum(len(payload) - 1 for _, payload, _ in sent) == 30
+
+
+def test_broadcast_tags_alone_are_published():
+    publisher, sent = sharded()
+    assert publisher.publish_rows([{'name': 'date', 'strVal': '2024-06-06', 'quality': 0}], serialize_function=list)
+    assert [names(payload) for _, payload, _ in sent] == [['date']]
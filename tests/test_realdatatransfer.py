@@ -0,0 +1,22 @@
+"""
+Field selection of value_field() and the round trip of typed values through both encoders.
+"""
+import numpy as np
+import pytest
+from mqttauto.mqtt import metatag_pb2
+from mqttauto.mqtt.realdatatransfer import ValueSequenceDecoder, encode_value_sequence, value_field
+
+
+@pytest.mark.parametrize('value, field', [
+    (True, 'boolVal'), (np.bool_(False), 'boolVal'), (0, 'boolVal'), (np.int64(1), 'boolVal'),
+    (5, 'intVal'), (np.int32(-3), 'intVal'), (2 ** 70, 'dblVal'), (0.5, 'dblVal'), ('on', 'strVal'),
+])
+def test_boolean_tag_fields(value, field):
+    assert value_field(value, metatag_pb2.Boolean) == field
+
+
+def test_boolean_tag_keeps_other_integers():
+    values = ValueSequenceDecoder().decode(
+        encode_value_sequence(['a', 'b', 'c'], [5, 1, True], [0, 0, 0], types=[metatag_pb2.Boolean] * 3))[1]
+    assert values == [5, True, True]
+    assert type(values[0]) is int
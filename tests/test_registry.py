@@ -0,0 +1,44 @@
+"""
+ModelRegistry round trips: a warm load must behave like a cold one and stay isolated from later training.
+"""
+import numpy as np
+import torch
+from mqttauto.model.models import LSTMModel
+from mqttauto.model.registry import ModelRegistry
+
+PARAMS = {'hidden_dim': 4, 'epochs': 1}
+
+
+def train(model, seed):
+    rng = np.random.default_rng(seed)
+    model.train(rng.random((16, 5, 3), dtype=np.float32), rng.random((16, 1), dtype=np.float32))
+
+
+def test_warm_load_is_a_copy(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model = LSTMModel(3, 1, device='cpu')
+    model.set_params(**PARAMS)
+    key = registry.key('task', 'lstm', 'grid', registry.param_hash(PARAMS), 'data')
+    registry.save(key, model, PARAMS)
+    saved = {name: tensor.clone() for name, tensor in model.model.state_dict().items()}
+    train(model, 0)
+
+    loaded = registry.load(key, LSTMModel(3, 1, device='cpu'))
+    optimized = {id(parameter) for group in loaded.optimizer.param_groups for parameter in group['params']}
+    assert all(id(parameter) in optimized for parameter in loaded.model.parameters())
+    train(loaded, 1)
+
+    again = registry.load(key, LSTMModel(3, 1, device='cpu'))
+    assert again.model is not loaded.model
+    for name, tensor in again.model.state_dict().items():
+        assert torch.equal(tensor, saved[name])
+
+
+def test_cold_load_matches_warm_load(tmp_path):
+    model = LSTMModel(3, 1, device='cpu')
+    model.set_params(**PARAMS)
+    key = ModelRegistry.key('task', 'lstm', 'grid', 'hash', 'data')
+    ModelRegistry(str(tmp_path)).save(key, model, PARAMS)
+    cold = ModelRegistry(str(tmp_path)).load(key, LSTMModel(3, 1, device='cpu'))
+    for name, tensor in model.model.state_dict().items():
+        assert torch.equal(cold.model.state_dict()[name], tensor)
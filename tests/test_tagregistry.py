@@ -0,0 +1,10 @@
+"""
+TagRegistry and metadatatransfer.create_serialized_metatag build the same MetaTags.
+"""
+from mqttauto.mqtt.metadatatransfer import create_serialized_metatag
+from mqttauto.mqtt.tagregistry import TagRegistry
+
+
+def test_metadatatransfer_matches_the_registry():
+    registry = TagRegistry()
+    assert bytes.fromhex(create_serialized_metatag(registry.definitions())) == registry.serialized()
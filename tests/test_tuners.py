@@ -0,0 +1,21 @@
+"""
+SuccessiveHalvingTuner argument checks and termination.
+"""
+import numpy as np
+import pytest
+from AutoMachineLearning import SuccessiveHalvingTuner
+from model.models import LSTMModel
+
+
+@pytest.mark.parametrize('arguments', [{'eta': 1}, {'eta': 0.5}, {'min_epochs': 0}])
+def test_budget_that_never_grows_is_rejected(arguments):
+    with pytest.raises(ValueError):
+        SuccessiveHalvingTuner(**arguments)
+
+
+def test_fractional_eta_ends():
+    rng = np.random.default_rng(0)
+    X, y = rng.random((24, 4, 3), dtype=np.float32), rng.random((24, 1), dtype=np.float32)
+    tuner = SuccessiveHalvingTuner(num_folds=2, min_epochs=1, eta=1.5, random_state=0)
+    tuner.optimize(LSTMModel(3, 1, device='cpu'), {'hidden_dim': [2, 4], 'epochs': [3]}, X, y)
+    assert tuner.best_params['hidden_dim'] in (2, 4)
@@ -0,0 +1,45 @@
+"""
+ValueStore pairing and its incremental persistence (snapshot plus append log).
+"""
+import os
+import numpy as np
+from mqttauto.mqtt.valuestore import ValueStore
+
+
+def test_next_day_completes_rows():
+    store = ValueStore()
+    assert store.update('2024-06-05', ['a', 'b'], [1, 'Error']) == []
+    assert store.update('2024-06-06', ['a', 'b'], [2, 5]) == [['a', '2024-06-05', 1.0, 2.0]]
+    # the same values again complete nothing new
+    assert store.update('2024-06-06', ['a', 'b'], [2, 5]) == []
+
+
+def test_overwritten_day_gives_its_rows_again():
+    store = ValueStore()
+    for day, value in (('2024-06-05', 1), ('2024-06-06', 2), ('2024-06-07', 3)):
+        store.update(day, ['a'], [value])
+    # a replay wrapping around to 2024-06-06 with other values pairs them with both neighbours
+    assert store.update('2024-06-06', ['a'], [20]) == [['a', '2024-06-05', 1.0, 20.0],
+                                                      ['a', '2024-06-06', 20.0, 3.0]]
+
+
+def test_log_is_replayed_and_compacted(tmp_path):
+    path = str(tmp_path / 'values_store.npz')
+    store = ValueStore.open(path, compact_every=5)
+    store.update('2024-06-05', ['a', 'b'], [1, 2])
+    store.update('2024-06-05', ['a', 'b'], [1, 2])
+    assert not os.path.exists(path)
+    with open(store.log_path) as file:
+        assert len(file.readlines()) == 2
+
+    reopened = ValueStore.open(path, compact_every=5)
+    assert reopened.update('2024-06-06', ['a', 'b'], [3, 4]) == [['a', '2024-06-05', 1.0, 3.0],
+                                                                 ['b', '2024-06-05', 2.0, 4.0]]
+    reopened.update('2024-06-07', ['a'], [5])
+    # the fifth logged value wrote the snapshot and emptied the log
+    assert os.path.exists(path) and os.path.getsize(reopened.log_path) == 0
+
+    with open(reopened.log_path, 'a') as file:
+        file.write('2024-06-07,b,6.0\n2024-06-08,a,7')
+    final = ValueStore.open(path)
+    np.testing.assert_array_equal(final.values[:2, :final.n_days], [[1, 3, 5], [2, 4, 6]])
@@ -0,0 +1,73 @@
+"""
+One poll cycle of yibu.py (date and attributes in chunked batch reads, values recorded per day) against the
+in-process mock SupOS.
+"""
+import asyncio
+import numpy as np
+import pytest
+from mqttauto.tests.mock_supos import MockSupOS, start_mock_supos
+from mqttauto.mqtt import akskg
+from mqttauto.mqtt.aioakskg import AsyncSignRequest, attribute_path
+from mqttauto.mqtt.batchreader import BatchReader
+from mqttauto.mqtt.tagregistry import TagRegistry
+from mqttauto.mqtt.valuestore import ValueStore
+from mqttauto.mqtt.yibu import Poller
+
+
+class ListSink(list):
+    def write_many(self, rows):
+        self.extend(rows)
+
+
+@pytest.fixture
+def yibu():
+    poller = Poller([name for name in TagRegistry().names() if name != 'date'], ValueStore(), ListSink())
+    poller.written = poller.sink
+    return poller
+
+
+def poll(monkeypatch, yibu, mock, cycles=1):
+    async def main():
+        runner, base_url = await start_mock_supos(mock)
+        monkeypatch.setattr(akskg, 'supos_url', base_url)
+        try:
+            async with AsyncSignRequest(limit=4) as client:
+                reader = BatchReader(client, chunk_size=16, concurrency=4)
+                return [await yibu.poll_once(reader) for _ in range(cycles)]
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def test_poll_once_records_every_attribute(monkeypatch, yibu):
+    mock = MockSupOS(date='2023-11-08')
+    assert poll(monkeypatch, yibu, mock) == ['2023-11-08']
+    assert mock.rejected == 0
+    store = yibu.values_store
+    column = store.day_index('2023-11-08')
+    stored = store.values[[store.tag_id(name) for name in yibu.attribute_names], column]
+    expected = [mock.value(attribute_path(name)) for name in yibu.attribute_names]
+    np.testing.assert_array_equal(stored, expected)
+
+
+def test_next_day_completes_training_rows(monkeypatch, yibu):
+    poll(monkeypatch, yibu, MockSupOS(date='2023-11-08'))
+    assert yibu.written == []
+    poll(monkeypatch, yibu, MockSupOS(date='2023-11-09'))
+    assert sorted(row[0] for row in yibu.written) == sorted(yibu.attribute_names)
+    assert {row[1] for row in yibu.written} == {'2023-11-08'}
+
+
+def test_request_size_limit_still_reads_every_attribute(monkeypatch, yibu):
+    mock = MockSupOS(max_inputs=5)
+    poll(monkeypatch, yibu, mock)
+    assert mock.requests > 1
+    store = yibu.values_store
+    column = store.day_index(mock.date)
+    assert not np.isnan(store.values[[store.tag_id(name) for name in yibu.attribute_names], column]).any()
+
+
+def test_invalid_date_skips_the_cycle(monkeypatch, yibu):
+    assert poll(monkeypatch, yibu, MockSupOS(date='not a date')) == [None]
+    assert len(yibu.values_store) == 0
+    assert yibu.written == []
@@ -5,6 +5,36 @@ import os
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.preprocessing import StandardScaler,MinMaxScaler
 
+
+class TimeSeriesWindows:
+    '''
+    Sliding windows of all groups stacked in one contiguous array.
+    data is (n_windows, look_back, n_features) float32, label is (n_windows, predict_time_stamp) or None,
+    and the windows of groups[i] are data[offsets[i]:offsets[i + 1]].
+    '''
+    def __init__(self, data, label, offsets, groups):
+        self.data = data
+        self.label = label
+        self.offsets = offsets
+        self.groups = groups
+
+    def __len__(self):
+        return len(self.data)
+
+    def group_slice(self, name):
+        i = self.groups.index(name)
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def to_dicts(self):
+        """Per-group views in the legacy (data_dict, label_dict) format returned by transform."""
+        data_dict = {}
+        label_dict = {}
+        for i, name in enumerate(self.groups):
+            data_dict[name] = self.data[self.offsets[i]:self.offsets[i + 1]]
+            if self.label is not None:
+                label_dict[name] = self.label[self.offsets[i]:self.offsets[i + 1]]
+        return data_dict, label_dict if self.label is not None else None
+
 class TimeSeriesPreprocessor(BaseEstimator, TransformerMixin):
     def __init__(self, config,feature_scaler=None, label_scaler=None, look_back=1,predict_time_stamp=1):
         self.look_back = look_back
@@ -46,6 +76,11 @@ class TimeSeriesPreprocessor(BaseEstimator, TransformerMixin):
 
 
     def transform(self, X):
+        # Now group by if necessary and create lagged features
+        time_series_data = self._create_time_series_data(self._scale(X))
+        return time_series_data
+
+    def _scale(self, X):
         features_to_scale = X.drop(columns=[self.label_col] if not self.group_col else [self.label_col,self.group_col] , errors='ignore')
         self.features = features_to_scale.columns
         scaled_features = pd.DataFrame(self.feature_scaler.transform(features_to_scale),
@@ -57,52 +92,61 @@ class TimeSeriesPreprocessor(BaseEstimator, TransformerMixin):
 
         if self.group_col and self.group_col in X.columns:
             scaled_features[self.group_col] = X[self.group_col]
+        return scaled_features
 
-        # Now group by if necessary and create lagged features
-        time_series_data = self._create_time_series_data(scaled_features)
-        return time_series_data
     def _create_time_series_data(self, dataframe):
-        data_dict = {}
-        label_dict = {}
+        """Compatibility adapter: per-group dicts of windows/labels built from the vectorized engine."""
+        return self._create_windows(dataframe).to_dicts()
+
+    def transform_windows(self, X):
+        """Same as transform, but returns the contiguous TimeSeriesWindows instead of per-group dicts."""
+        return self._create_windows(self._scale(X))
+
+    def _create_windows(self, dataframe):
         has_label = self.label_col in dataframe.columns
         if self.include_label:
             self.features = list(self.features)
+        self.num_features = len(self.features)
+        values = dataframe[list(self.features)].to_numpy(dtype=np.float32)
+        labels = dataframe[self.label_col].to_numpy(dtype=np.float32) if has_label else None
+
         if self.group_col:
-            for name, group in dataframe.groupby(self.group_col):
-                data = []
-                label = []
-                for start_index in range(len(group) - self.look_back-self.predict_time_stamp+1):
-                    if has_label:
-                        subset = group.iloc[start_index:start_index + self.look_back][self.features]
-                        sublabel = group[self.label_col].iloc[
-                                   start_index + self.look_back-1:start_index + self.look_back-1 + self.predict_time_stamp
-                                   ].reset_index(drop=True).values
-                        label.append(sublabel)
-                    else:
-                        subset = group.iloc[start_index:start_index + self.look_back][self.features]
-                    data.append(subset)
-
-                data_dict[name] = data
-                if has_label:
-                    label_dict[name] = label
-        else:
-            data = []
-            label = []
-            for start_index in range(len(dataframe) - self.look_back-self.predict_time_stamp+1):
-                if has_label:
-                    subset = dataframe.iloc[start_index:start_index + self.look_back][self.features]
-                    sublabel = dataframe[self.label_col].iloc[
-                               start_index + self.look_back:start_index + self.look_back + self.predict_time_stamp
-                               ].reset_index(drop=True).values
-                    label.append(sublabel)
-                else:
-                    subset = dataframe.iloc[start_index:start_index + self.look_back][self.features]
-                data.append(subset)
-            data_dict['no group'] = data
+            codes, groups = pd.factorize(dataframe[self.group_col], sort=True)
+            # Stable sort keeps the original row order inside every group, like groupby does
+            order = np.argsort(codes, kind='stable')
+            order = order[codes[order] >= 0]
+            values = values[order]
             if has_label:
-                label_dict['no group'] = label
-        self.num_features = len(self.features)
-        return data_dict, label_dict if has_label else None
+                labels = labels[order]
+            group_sizes = np.bincount(codes[order], minlength=len(groups))
+            groups = list(groups)
+            # grouped labels are aligned with the last row of the window (label is already the next step)
+            label_shift = self.look_back - 1
+        else:
+            groups = ['no group']
+            group_sizes = np.array([len(values)])
+            label_shift = self.look_back
+
+        group_starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+        n_windows = np.maximum(group_sizes - self.look_back - self.predict_time_stamp + 1, 0)
+        offsets = np.concatenate(([0], np.cumsum(n_windows))).astype(np.int64)
+
+        # Global start row of every window: group start + position inside the group
+        starts = np.repeat(group_starts - offsets[:-1], n_windows) + np.arange(offsets[-1])
+
+        if len(values) >= self.look_back:
+            # (rows - look_back + 1, n_features, look_back) strided view, no copy until the gather below
+            view = np.lib.stride_tricks.sliding_window_view(values, self.look_back, axis=0)
+            data = np.ascontiguousarray(view[starts].transpose(0, 2, 1))
+        else:
+            data = np.empty((0, self.look_back, self.num_features), dtype=np.float32)
+
+        if has_label:
+            label_index = starts[:, None] + label_shift + np.arange(self.predict_time_stamp)
+            label = np.ascontiguousarray(labels[label_index])
+        else:
+            label = None
+        return TimeSeriesWindows(data, label, offsets, groups)
 
     def inverse_transform_labels(self, y_scaled):
         """Reverse the scaling of the label data."""
@@ -119,4 +163,58 @@ class TimeSeriesPreprocessor(BaseEstimator, TransformerMixin):
     def load_scalers(self, feature_scaler_path, label_scaler_path=None):
         self.feature_scaler = joblib.load(feature_scaler_path)
         if label_scaler_path:
-            self.label_scaler = joblib.load(label_scaler_path)
\ No newline at end of file
+            self.label_scaler = joblib.load(label_scaler_path)
+
+class StreamingWindowBuffer:
+    '''
+    Ring buffer holding the last look_back scaled feature rows of every group, so new rows can be
+    appended as they arrive and the latest window of all groups is read in one batch.
+    '''
+    def __init__(self, preprocessor):
+        self.preprocessor = preprocessor
+        self.look_back = preprocessor.look_back
+        self.group_col = preprocessor.group_col
+        self.groups = []
+        self.group_index = {}
+        self.buffer = np.zeros((0, self.look_back, 0), dtype=np.float32)
+        self.position = np.zeros(0, dtype=np.int64)
+        self.filled = np.zeros(0, dtype=np.int64)
+
+    def _add_groups(self, names, num_features):
+        new = [name for name in pd.unique(names) if name not in self.group_index]
+        if not new:
+            return
+        for name in new:
+            self.group_index[name] = len(self.groups)
+            self.groups.append(name)
+        buffer = np.zeros((len(self.groups), self.look_back, num_features), dtype=np.float32)
+        if len(self.buffer):
+            buffer[:len(self.buffer)] = self.buffer
+        self.buffer = buffer
+        self.position = np.concatenate((self.position, np.zeros(len(new), dtype=np.int64)))
+        self.filled = np.concatenate((self.filled, np.zeros(len(new), dtype=np.int64)))
+
+    def append(self, dataframe):
+        """Scale the new rows and push them into the buffer of their group, in row order."""
+        if len(dataframe) == 0:
+            return
+        scaled = self.preprocessor._scale(dataframe)
+        values = scaled[list(self.preprocessor.features)].to_numpy(dtype=np.float32)
+        names = scaled[self.group_col].to_numpy() if self.group_col else np.full(len(scaled), 'no group', dtype=object)
+        self._add_groups(names, values.shape[1])
+        rows = np.array([self.group_index[name] for name in names], dtype=np.int64)
+        # Rows of the same group are written in successive passes to keep their order
+        rank = pd.Series(rows).groupby(rows).cumcount().to_numpy()
+        for r in range(rank.max() + 1):
+            mask = rank == r
+            g = rows[mask]
+            self.buffer[g, self.position[g] % self.look_back] = values[mask]
+            self.position[g] += 1
+        self.filled = np.minimum(self.filled + np.bincount(rows, minlength=len(self.groups)), self.look_back)
+
+    def windows(self):
+        """Latest window of every group with at least look_back rows, as (groups, (n, look_back, n_features))."""
+        ready = np.flatnonzero(self.filled >= self.look_back)
+        # oldest row sits at position % look_back
+        index = (self.position[ready, None] + np.arange(self.look_back)) % self.look_back
+        return [self.groups[i] for i in ready], self.buffer[ready[:, None], index]